@@ -0,0 +1,109 @@
+# accounts.py
+# Sign-up, login and one-time codes without any UI.
+#
+# Like reservations.py, nothing here touches Streamlit: app.py passes in what
+# it knows about the request (client address, whether SMTP is configured)
+# and renders the (ok, message) results. Connections are taken through
+# ``connect`` (default: db.get_conn) only around the SQL, never while a
+# password is being hashed, so a slow hash doesn't hold a pooled connection.
+import secrets
+import sqlite3
+
+import otp_codes
+from db import get_conn
+from mailer import enqueue_email
+from passwords import HashingBusy, hashing_pool
+from rate_limit import get_limiter
+
+# (capacity, seconds to refill it) per identity and per client address
+RATE_LIMITS = {
+    "login": ((5, 300), (30, 300)),
+    "reset": ((3, 900), (10, 900)),
+    "verify": ((5, 300), (20, 300)),
+}
+VERIFICATION_TTL = 30     # minutes
+
+
+def rate_limited(conn, kind: str, identity: str, client: str = "", persistent: bool = False) -> bool:
+    """True if this identity (or this client) has used up its attempts for now.
+
+    With no client address only the per-identity limit applies: lumping every
+    unknown caller into one bucket would let anyone lock everyone out.
+    """
+    (user_cap, user_secs), (client_cap, client_secs) = RATE_LIMITS[kind]
+    checks = [(get_limiter(f"{kind}-user", user_cap, user_secs, persistent), identity.strip().lower())]
+    if client:
+        checks.append((get_limiter(f"{kind}-client", client_cap, client_secs, persistent), client))
+    return not all(limiter.allow(key, conn) for limiter, key in checks)
+
+
+def issue_code(conn, username: str, purpose: str, ttl_minutes: int = 15) -> str:
+    code = f"{100000 + secrets.randbelow(900000)}"
+    otp_codes.store_code(conn, username, purpose, code, ttl_minutes)
+    return code
+
+
+def signup(username: str, password: str, email: str, send_email: bool = True,
+           connect=get_conn, pool=hashing_pool):
+    """Create an unverified user and issue its verification code -> (ok, message).
+
+    With send_email the code is also queued in the outbox; the caller wakes
+    the mail worker.
+    """
+    if not username or not password or not email:
+        return False, "Username, password and email are required."
+    with connect() as conn:
+        if conn.execute("SELECT 1 FROM users WHERE username=?", (username,)).fetchone():
+            return False, "Username already exists."
+    try:
+        hashed = pool.hash(password)
+    except HashingBusy as e:
+        return False, str(e)
+    with connect() as conn:
+        try:
+            conn.execute("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, ?)",
+                         (username, hashed, email, 0))
+        except sqlite3.IntegrityError:
+            return False, "Username already exists."
+        conn.commit()
+        code = issue_code(conn, username, "email_verification", ttl_minutes=VERIFICATION_TTL)
+        if not send_email:
+            return True, "Account created."
+        enqueue_email(conn, email, "Verify your ERailTicket account",
+                      f"Hello {username},\n\nYour verification code is: {code}\n"
+                      f"It expires in {VERIFICATION_TTL} minutes.")
+        conn.commit()
+    return True, "Account created. Verification code sent to email."
+
+
+def login(identifier: str, password: str, client: str = "", persistent_limits: bool = False,
+          connect=get_conn, pool=hashing_pool):
+    """-> (True, "Admin" | "User", username) or (False, message, None)."""
+    with connect() as conn:
+        if rate_limited(conn, "login", identifier, client, persistent_limits):
+            return False, "Too many login attempts. Please wait a few minutes and try again.", None
+        row = conn.execute("SELECT username, password, email_verified FROM users WHERE username=? OR email=?",
+                           (identifier, identifier)).fetchone()
+    if not row:
+        return False, "Invalid username or password.", None
+    real_username, stored_hash, email_verified = row
+    try:
+        valid, upgraded_hash = pool.verify_and_rehash(stored_hash, password)
+    except HashingBusy as e:
+        return False, str(e), None
+    if not valid:
+        return False, "Invalid username or password.", None
+    with connect() as conn:
+        if upgraded_hash:
+            # hash predates the current scheme/cost: swap it while we have the password
+            conn.execute("UPDATE users SET password=? WHERE username=? AND password=?",
+                         (upgraded_hash, real_username, stored_hash))
+            conn.execute("UPDATE employees SET password=? WHERE employee_id=? AND password=?",
+                         (upgraded_hash, real_username, stored_hash))
+            conn.commit()
+        if email_verified == 0:
+            return False, "Email not verified. Please verify your email before logging in.", None
+        erow = conn.execute("SELECT designation FROM employees WHERE employee_id=?", (real_username,)).fetchone()
+    if erow and erow[0] == "Admin":
+        return True, "Admin", real_username
+    return True, "User", real_username
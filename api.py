@@ -0,0 +1,322 @@
+# api.py
+# JSON/HTTP API for partners and kiosks, next to the Streamlit UI.
+#
+# A plain ASGI 3 application with no framework underneath; run it with any
+# ASGI server, e.g.
+#
+#   ERAIL_API_KEYS="kiosk-key=kiosk1" uvicorn api:app --port 8000
+#
+# Every operation is a reservations.py call on a pooled connection (db.py), made
+# on a small thread pool so SQLite never blocks the event loop. Availability
+# requests that arrive within BATCH_WINDOW of each other go to the database
+# together: one thread hop and one GROUP BY for the whole batch, with duplicate
+# runs asked only once.
+#
+#   GET    /health
+#   GET    /trains?number=12001            search by number / name
+#   GET    /trains?from=NDLS&to=BPL&date=2025-01-31
+#   GET    /availability?train=12001&date=2025-01-31
+#   GET    /seats?train=12001&date=2025-01-31
+#   POST   /bookings        {"train_number", "departure_date", "name", "age", "gender", "seat_type",
+#                            "board_at"?, "alight_at"?, "waitlist"?}
+#   DELETE /bookings/<pnr>
+#   GET    /metrics         Prometheus text (instrumentation.py; empty unless ERAIL_METRICS=1)
+#
+# Reads are open. Bookings and cancellations need an X-API-Key header; each
+# key in ERAIL_API_KEYS ("key=account,key2=account2") books as its account
+# and can only cancel that account's PNRs.
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import parse_qs, unquote
+
+import instrumentation
+import reservations
+from db import DB_PATH, POOL_SIZE, get_pool
+from invalidation import sync
+
+BATCH_WINDOW = 0.002      # seconds an availability request waits for company
+MAX_BATCH = 256
+MAX_BODY = 16 * 1024
+STRING_FIELDS = ("departure_date", "name", "gender", "seat_type", "board_at", "alight_at")
+
+log = logging.getLogger(__name__)
+ROUTES = ("/health", "/metrics", "/trains", "/availability", "/seats", "/bookings")
+
+STATUS_CODES = {
+    reservations.BOOKED: 201,
+    reservations.WAITLISTED: 202,
+    reservations.CANCELLED: 200,
+    reservations.SOLD_OUT: 409,
+    reservations.NO_RUN: 404,
+    reservations.NOT_FOUND: 404,
+    reservations.INVALID: 400,
+    reservations.BUSY: 503,
+}
+REASONS = {200: b"OK", 201: b"Created", 202: b"Accepted", 400: b"Bad Request", 401: b"Unauthorized",
+           404: b"Not Found", 405: b"Method Not Allowed", 409: b"Conflict", 413: b"Payload Too Large",
+           500: b"Internal Server Error", 503: b"Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_api_keys(text: str) -> dict:
+    """'key=account,key2=account2' -> {key: account}."""
+    keys = {}
+    for item in (text or "").split(","):
+        key, _, account = item.strip().partition("=")
+        if key and account:
+            keys[key] = account
+    return keys
+
+
+def _date(value, field="date") -> str:
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise HTTPError(400, f"{field} must be YYYY-MM-DD.")
+
+
+class AvailabilityBatcher:
+    """Coalesces concurrent availability lookups into one free_seats_many() call."""
+
+    def __init__(self, api, window: float = BATCH_WINDOW, max_batch: int = MAX_BATCH):
+        self.api = api
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}     # run -> [futures]
+        self._timer = None
+        self._tasks = set()    # in-flight _answer tasks; the loop only keeps weak references
+        self.batches = 0
+        self.requests = 0
+
+    async def get(self, run):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(run, []).append(future)
+        self.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            self.batches += 1
+            task = asyncio.get_running_loop().create_task(self._answer(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Availability batch failed", exc_info=task.exception())
+
+    async def _answer(self, pending):
+        try:
+            counts = await self.api.call(reservations.free_seats_many, list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for run, futures in pending.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(counts.get(run))
+
+
+class BookingAPI:
+    def __init__(self, path: str = None, api_keys: dict = None, workers: int = POOL_SIZE):
+        self.path = path or os.environ.get("ERAIL_DB", DB_PATH)
+        self.api_keys = parse_api_keys(os.environ.get("ERAIL_API_KEYS", "")) if api_keys is None else api_keys
+        self.workers = workers
+        self._executor = None
+        self.availability = AvailabilityBatcher(self)
+
+    # ---- plumbing ----
+    def startup(self):
+        reservations.init(self.path)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="api-db")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _in_thread(self, fn, args):
+        with get_pool(self.path).connection() as conn:
+            # other processes' writes (the Streamlit UI) reach our caches
+            sync(conn)
+            return fn(conn, *args)
+
+    async def call(self, fn, *args):
+        if self._executor is None:
+            self.startup()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._in_thread, fn, args)
+
+    def account(self, headers) -> str:
+        supplied = headers.get(b"x-api-key", b"").decode("latin-1")
+        for key, account in self.api_keys.items():
+            if secrets.compare_digest(key, supplied):
+                return account
+        raise HTTPError(401, "A valid X-API-Key header is required.")
+
+    # ---- ASGI ----
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        path = scope["path"].rstrip("/") or "/"
+        route = "/bookings/<pnr>" if path.startswith("/bookings/") else path if path in ROUTES else "other"
+        try:
+            with instrumentation.span(f"api {scope['method']} {route}"):
+                status, payload = await self.handle(scope, receive)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception:
+            # still a JSON answer for the client; the details go to the server log only
+            log.exception("Unhandled error for %s %s", scope["method"], scope["path"])
+            status, payload = 500, {"error": "Internal server error."}
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), b"text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), b"application/json"
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await asyncio.get_running_loop().run_in_executor(None, self.startup)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _body(self, receive) -> dict:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY:
+                raise HTTPError(413, "Request body too large.")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        try:
+            data = json.loads(b"".join(chunks) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON.")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object.")
+        return data
+
+    async def handle(self, scope, receive):
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        query = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        headers = dict(scope.get("headers") or [])
+        if path == "/health" and method == "GET":
+            return 200, {"status": "ok", "availability_batches": self.availability.batches,
+                         "availability_requests": self.availability.requests}
+        if path == "/metrics" and method == "GET":
+            return 200, instrumentation.prometheus_text()
+        if path == "/trains" and method == "GET":
+            return 200, {"trains": await self.search(query)}
+        if path == "/availability" and method == "GET":
+            return await self.free_seats(query)
+        if path == "/seats" and method == "GET":
+            return await self.seats(query)
+        if path == "/bookings" and method == "POST":
+            account = self.account(headers)
+            return await self.book(account, await self._body(receive))
+        if path.startswith("/bookings/") and method == "DELETE":
+            account = self.account(headers)
+            result = await self.call(reservations.cancel_pnr, account, unquote(path[len("/bookings/"):]))
+            return STATUS_CODES[result.status], dataclasses.asdict(result)
+        if path in ROUTES:
+            raise HTTPError(405, f"{method} is not allowed on {path}.")
+        raise HTTPError(404, f"No route for {path}.")
+
+    # ---- operations ----
+    def _run(self, query):
+        train = query.get("train", "").strip()
+        if not train or "date" not in query:
+            raise HTTPError(400, "train and date are required.")
+        return train, _date(query["date"])
+
+    async def search(self, query):
+        if query.get("number"):
+            rows = await self.call(reservations.search_train_number, query["number"])
+        elif query.get("from") and query.get("to"):
+            day = _date(query["date"]) if query.get("date") else None
+            rows = await self.call(reservations.search_route, query["from"], query["to"], day)
+        else:
+            raise HTTPError(400, "Give number, or from and to (and optionally date).")
+        return [dict(zip(("train_number", "train_name", "departure_date", "from", "to"), row)) for row in rows]
+
+    async def free_seats(self, query):
+        train, day = self._run(query)
+        free = await self.availability.get((train, day))
+        if free is None:
+            raise HTTPError(404, f"No such Train {train} on {day}.")
+        return 200, {"train_number": train, "departure_date": day, "free": free}
+
+    async def seats(self, query):
+        train, day = self._run(query)
+        rows = await self.call(reservations.seat_map, train, day)
+        if not rows:
+            raise HTTPError(404, f"No such Train {train} on {day}.")
+        keys = [h.lower() for h in reservations.SEAT_HEADERS]
+        return 200, {"train_number": train, "departure_date": day, "seats": [dict(zip(keys, row)) for row in rows]}
+
+    async def book(self, account, data):
+        missing = [f for f in ("train_number", "departure_date", "name", "age", "gender", "seat_type") if f not in data]
+        if missing:
+            raise HTTPError(400, f"Missing fields: {', '.join(missing)}.")
+        wrong = [f for f in STRING_FIELDS if data.get(f) is not None and not isinstance(data[f], str)]
+        if wrong:
+            raise HTTPError(400, f"These fields must be strings: {', '.join(wrong)}.")
+        train = data["train_number"]
+        if isinstance(train, bool) or not isinstance(train, (str, int)):
+            raise HTTPError(400, "train_number must be a string or number.")
+        if not isinstance(data.get("waitlist", True), bool):
+            raise HTTPError(400, "waitlist must be true or false.")
+        # same rules as the Book Ticket form, checked before any database work
+        if data["seat_type"] not in reservations.SEAT_TYPES:
+            raise HTTPError(400, f"seat_type must be one of {', '.join(reservations.SEAT_TYPES)}.")
+        passenger = (data["name"].strip(), data["age"], data["gender"])
+        problem = reservations.passenger_error(passenger)
+        if problem:
+            raise HTTPError(400, problem)
+        result = await self.call(
+            reservations.book, account, str(train).strip(), _date(data["departure_date"], "departure_date"),
+            passenger, data["seat_type"], data.get("board_at") or "", data.get("alight_at") or "",
+            data.get("waitlist", True))
+        return STATUS_CODES[result.status], dataclasses.asdict(result)
+
+
+app = BookingAPI()
@@ -2,22 +2,28 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
-from datetime import date, datetime, timedelta
-import hashlib
-import binascii
-import secrets
-import smtplib
-from email.message import EmailMessage
-import random
+from datetime import date, datetime
 import time
-from PIL import Image
-import base64
-import io
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-import os
+from contextlib import contextmanager
+
+from assets import fragment, image_bytes, img_tag
+from db import get_conn
+import instrumentation
+from instrumentation import span, timed
+from mailer import enqueue_email, get_mailer, outbox_counts
+from invalidation import sync, sync_due
+from rate_limit import all_limiters
+from passwords import hashing_pool, HashingBusy, configure as configure_password_hashing
+from train_listing import PAGE_SIZE, listing_cache
+import journey_planner
+import accounts
+import otp_codes
+import reservations
+from reservations import parse_passengers, to_date_text
+from train_stops import parse_stops
+from timetable_import import import_timetable
+from bookings import bookings_for_pnr
+from waitlist import waitlist_for_pnr
 
 # ---------------------------
 # MUST be the very first Streamlit command
@@ -33,7 +39,8 @@ ACCENT = "#fcb040"   # orange accent
 BG = "#f7f9fc"
 CARD = "#ffffff"
 
-st.markdown(f"""
+# rendered once per process; only the finished string is sent on each rerun
+st.markdown(fragment("theme-css", lambda: f"""
 <style>
 :root {{
   --primary: {PRIMARY};
@@ -92,7 +99,7 @@ div[data-baseweb="input"] > div, .stTextInput, .stNumberInput, .stSelectbox, .st
     background: #fff6f3;
 }}
 </style>
-""", unsafe_allow_html=True)
+"""), unsafe_allow_html=True)
 
 # =========================
 # Sidebar branding (logo + title)
@@ -100,30 +107,20 @@ div[data-baseweb="input"] > div, .stTextInput, .stNumberInput, .stSelectbox, .st
 # Expect logo.png to be in same folder as app.py
 LOGO_FILENAME = "logo.png"
 
-try:
-    logo_image = Image.open(LOGO_FILENAME)
-    st.sidebar.image(logo_image, width=80)
+# loaded, scaled to 2x display size and encoded once per process (see assets.py)
+logo_bytes = image_bytes(LOGO_FILENAME, max_width=160)
+if logo_bytes:
+    st.sidebar.image(logo_bytes, width=80)
     st.sidebar.markdown("<h4 style='text-align:center;margin-top:6px;margin-bottom:6px'>ERailTicket</h4>", unsafe_allow_html=True)
-except Exception:
+else:
     # if logo missing, don't break app
     st.sidebar.write(" ")
 
 # =========================
 # Center header (H2 style) with logo above title
 # =========================
-def img_to_base64_str(img_path):
-    try:
-        with open(img_path, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except Exception:
-        return None
-
-logo_b64 = img_to_base64_str(LOGO_FILENAME)
-if logo_b64:
-    logo_html = f'<img src="data:image/png;base64,{logo_b64}" width="80" style="display:block;margin-left:auto;margin-right:auto;" />'
-else:
-    logo_html = ""
+logo_html = img_tag(LOGO_FILENAME, width=80, max_width=160,
+                    style="display:block;margin-left:auto;margin-right:auto;")
 
 st.markdown(f"""
 <div class="header-container">
@@ -134,189 +131,235 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # =========================
-# Database setup
+# Instrumentation (opt-in)
 # =========================
-conn = sqlite3.connect('railway_system.db', check_same_thread=False)
-c = conn.cursor()
+# [metrics] enabled = true in secrets.toml (or ERAIL_METRICS=1) times the hot paths, tabs and SQL
+# statements; results are in Admin Panel -> Performance. Set before the pool opens its connections.
+# a [metrics] section without "enabled" leaves the environment's choice alone
+if "metrics" in st.secrets and "enabled" in st.secrets["metrics"]:
+    instrumentation.configure(st.secrets["metrics"]["enabled"])
 
+# =========================
+# Database setup
+# =========================
+# Every data-access function checks a connection out of the shared pool
+# (see db.py) instead of sharing one global cursor across sessions.
 def create_DB_if_Not_available():
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                (username TEXT PRIMARY KEY, password TEXT, email TEXT, email_verified INTEGER DEFAULT 0)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS employees
-                (employee_id TEXT PRIMARY KEY, password TEXT, designation TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS trains
-                (train_number TEXT, train_name TEXT, departure_date TEXT, starting_destination TEXT, ending_destination TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS email_codes
-                (username TEXT, code TEXT, purpose TEXT, expiry_ts INTEGER)''')
-    conn.commit()
+    # migrations + cache warm-up run on the first rerun in this process; after that this is a set lookup
+    reservations.init()
 
 create_DB_if_Not_available()
 
-# Ensure users table has email & email_verified (safe migration)
-try:
-    cols = [r[1] for r in c.execute("PRAGMA table_info(users)")]
-    if "email" not in cols or "email_verified" not in cols:
-        # Recreate table to ensure columns exist could be heavy; try ALTER
-        if "email" not in cols:
-            try:
-                c.execute("ALTER TABLE users ADD COLUMN email TEXT")
-            except sqlite3.OperationalError:
-                pass
-        if "email_verified" not in cols:
-            try:
-                c.execute("ALTER TABLE users ADD COLUMN email_verified INTEGER DEFAULT 0")
-            except sqlite3.OperationalError:
-                pass
-        conn.commit()
-except Exception:
-    # ignore if users not present
-    pass
+# writes made by other server processes reach this process's caches here
+if sync_due():
+    with get_conn() as conn:
+        sync(conn)
 
 # =========================
-# Password utilities (PBKDF2)
+# Password utilities (on the shared hashing pool)
 # =========================
-def hash_password(password: str, iterations: int = 100_000) -> str:
-    salt = secrets.token_bytes(16)
-    hash_bytes = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
-    return f"{binascii.hexlify(salt).decode()}${binascii.hexlify(hash_bytes).decode()}"
+# optional [passwords] section in secrets.toml, e.g. scheme = "pbkdf2-sha256", i = 300000
+# or scheme = "scrypt", n = 16384; existing hashes are upgraded on their next login
+if "passwords" in st.secrets:
+    configure_password_hashing(**dict(st.secrets["passwords"]))
 
-def verify_password(stored: str, provided_password: str) -> bool:
-    try:
-        salt_hex, hash_hex = stored.split("$")
-        salt = binascii.unhexlify(salt_hex)
-        stored_hash = binascii.unhexlify(hash_hex)
-        test_hash = hashlib.pbkdf2_hmac('sha256', provided_password.encode(), salt, 100_000)
-        return secrets.compare_digest(stored_hash, test_hash)
-    except Exception:
-        return False
+def hash_password(password: str) -> str:
+    return hashing_pool.hash(password)
+
+# =========================
+# Rate limits (checked before any hashing or code lookup)
+# =========================
+# limits per identity and per client address are in accounts.RATE_LIMITS
+# [rate_limit] persistent = true in secrets.toml keeps buckets in SQLite (shared by all processes)
+RATE_LIMIT_PERSISTENT = bool("rate_limit" in st.secrets and st.secrets["rate_limit"].get("persistent", False))
+# [rate_limit] trusted_proxies = ["10.0.0.5"]: only requests arriving from one of these addresses
+# may name the client in X-Forwarded-For / X-Real-Ip; anyone else could put a new value in each request
+TRUSTED_PROXIES = frozenset(st.secrets["rate_limit"].get("trusted_proxies", ())) if "rate_limit" in st.secrets else frozenset()
+
+def client_address() -> str:
+    """The connecting peer's address ("" if unknown; only the per-identity limit applies then)."""
+    peer = st.context.ip_address or ""
+    if not peer or peer not in TRUSTED_PROXIES:
+        return peer
+    headers = st.context.headers
+    # rightmost hop our proxies didn't add themselves; anything left of it is what the client sent
+    for hop in reversed(headers.get("X-Forwarded-For", "").split(",")):
+        hop = hop.strip()
+        if hop and hop not in TRUSTED_PROXIES:
+            return hop
+    return headers.get("X-Real-Ip", "").strip() or peer
+
+def rate_limited(kind: str, identity: str) -> bool:
+    """True if this identity (or this client) has used up its attempts for now."""
+    with get_conn() as conn:
+        return accounts.rate_limited(conn, kind, identity, client_address(), RATE_LIMIT_PERSISTENT)
 
 # =========================
 # Seat / train utilities
 # =========================
-def to_date_text(d: date) -> str:
-    if isinstance(d, date):
-        return d.isoformat()
-    return str(d)
-
-def categorize_seat(seat_number: int) -> str:
-    if (seat_number % 10) in [0, 4, 5, 9]:
-        return "Window"
-    elif (seat_number % 10) in [2, 3, 6, 7]:
-        return "Aisle"
-    else:
-        return "Middle"
-
-def create_seat_table(train_number: str):
-    # safe table name: remove spaces / dangerous chars
-    tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
-    c.execute(f'''
-        CREATE TABLE IF NOT EXISTS seats_{tname} (
-            seat_number INTEGER PRIMARY KEY,
-            seat_type TEXT,
-            booked INTEGER,
-            passenger_name TEXT,
-            passenger_age INTEGER,
-            passenger_gender TEXT
-        )
-    ''')
-    try:
-        cur = c.execute(f"SELECT COUNT(*) FROM seats_{tname}")
-        count = cur.fetchone()[0]
-    except sqlite3.OperationalError:
-        count = 0
-    if count == 0:
-        rows = []
-        for i in range(1, 51):
-            rows.append((i, categorize_seat(i), 0, "", None, ""))
-        c.executemany(
-            f"INSERT INTO seats_{tname} (seat_number, seat_type, booked, passenger_name, passenger_age, passenger_gender) VALUES (?,?,?,?,?,?)",
-            rows
-        )
-        conn.commit()
+def add_train(train_number, train_name, departure_date, starting_destination, ending_destination,
+              departure_time=None, travel_minutes=None, stops=()):
+    with get_conn() as conn:
+        reservations.add_train(conn, train_number, train_name, departure_date, starting_destination,
+                               ending_destination, departure_time, travel_minutes, stops)
 
-def add_train(train_number, train_name, departure_date, starting_destination, ending_destination):
-    departure_text = to_date_text(departure_date)
-    c.execute("INSERT INTO trains (train_number, train_name, departure_date, starting_destination, ending_destination) VALUES (?, ?, ?, ?, ?)",
-              (train_number, train_name, departure_text, starting_destination, ending_destination))
-    conn.commit()
-    create_seat_table(train_number)
+@timed()
+def import_timetable_file(upload):
+    status = st.empty()
+
+    def progress(report):
+        status.info(f"⏳ {report.rows:,} rows read, {report.imported:,} runs imported "
+                    f"({report.rows_per_second:,.0f} rows/s)")
+
+    try:
+        with get_conn() as conn:
+            report = import_timetable(conn, upload, progress=progress)
+    except (ValueError, sqlite3.Error) as e:
+        status.error(f"⚠️ Import stopped: {e}")
+        return
+    status.success(f"✅ Imported {report.imported:,} runs ({report.seats:,} seats) from {report.rows:,} rows "
+                   f"in {report.seconds:.1f}s ({report.rows_per_second:,.0f} rows/s).")
+    if report.duplicates:
+        st.info(f"{report.duplicates:,} runs already existed and were skipped.")
+    if report.invalid:
+        st.warning(f"{report.invalid:,} rows were rejected.")
+        st.code("\n".join(report.errors))
 
 def delete_train(train_number, departure_date):
     departure_text = to_date_text(departure_date)
-    train_query = c.execute(
-        "SELECT * FROM trains WHERE train_number = ? AND departure_date = ?",
-        (train_number, departure_text))
-    train_data = train_query.fetchone()
-    if train_data:
-        c.execute("DELETE FROM trains WHERE train_number = ? AND departure_date = ?",
-                  (train_number, departure_text))
-        tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
-        c.execute(f"DROP TABLE IF EXISTS seats_{tname}")
-        conn.commit()
+    with get_conn() as conn:
+        deleted = reservations.delete_train(conn, train_number, departure_text)
+    if deleted:
         st.success(f"✅ Train {train_number} on {departure_text} has been deleted.")
     else:
         st.error(f"❌ No such Train {train_number} on {departure_text}.")
 
-def allocate_next_available_seat(train_number, seat_type):
-    tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
-    try:
-        seat_query = c.execute(
-            f"SELECT seat_number FROM seats_{tname} WHERE booked=0 AND seat_type=? ORDER BY seat_number ASC",
-            (seat_type,))
-        result = seat_query.fetchone()
-        if result:
-            return result[0]
-    except sqlite3.OperationalError:
-        return None
-    return None
-
-def book_ticket(train_number, passenger_name, passenger_age, passenger_gender, seat_type):
-    train_query = c.execute(
-        "SELECT * FROM trains WHERE train_number = ?", (train_number,))
-    train_data = train_query.fetchone()
-    if not train_data:
-        st.error(f"❌ No such Train with Number {train_number}.")
-        return
-    seat_number = allocate_next_available_seat(train_number, seat_type)
-    if seat_number:
-        tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
-        c.execute(
-            f"UPDATE seats_{tname} SET booked=1, seat_type=?, passenger_name=?, passenger_age=?, passenger_gender=? WHERE seat_number=?",
-            (seat_type, passenger_name, int(passenger_age), passenger_gender, seat_number)
-        )
-        conn.commit()
-        st.success(f"🎉 Successfully booked seat {seat_number} ({seat_type}) for **{passenger_name}**.")
+@timed()
+def book_ticket(train_number, departure_date, passenger_name, passenger_age, passenger_gender, seat_type,
+                board_at="", alight_at="", waitlist=True):
+    with get_conn() as conn:
+        result = reservations.book(conn, st.session_state.auth["username"], train_number, departure_date,
+                                   (passenger_name, passenger_age, passenger_gender), seat_type,
+                                   board_at, alight_at, waitlist)
+    if result.status == reservations.BOOKED:
+        journey = f" from {result.from_station} to {result.to_station}" if result.from_station else ""
+        st.success(f"🎉 Successfully booked seat {result.seat_number} ({seat_type}){journey} for **{passenger_name}**. "
+                   f"PNR: **{result.pnr}**")
         st.balloons()
+    elif result.status == reservations.WAITLISTED:
+        st.warning(f"🕒 No {seat_type} seats left. **{passenger_name}** is on the waiting list as "
+                   f"**{result.tier} {result.queue_no}**, PNR: **{result.pnr}**. You'll get the next seat that is cancelled.")
+    elif result.status == reservations.BUSY:
+        st.error(f"⏳ {result.error}")
+    elif result.status == reservations.SOLD_OUT:
+        st.error(f"😞 {result.error or 'No available seats of this type in this train.'}")
     else:
-        st.error("😞 No available seats of this type in this train.")
-
-def cancel_tickets(train_number, seat_number):
-    train_query = c.execute(
-        "SELECT * FROM trains WHERE train_number = ?", (train_number,))
-    train_data = train_query.fetchone()
-    if train_data:
-        tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
-        c.execute(
-            f"UPDATE seats_{tname} SET booked=0, passenger_name='', passenger_age=NULL, passenger_gender='' WHERE seat_number=?",
-            (int(seat_number),)
-        )
-        conn.commit()
-        st.success(f"✅ Seat {seat_number} on Train {train_number} is now **cancelled & available**.")
+        st.error(f"❌ {result.error}")
+
+def book_group(train_number, departure_date, passengers, preferences=None):
+    """Book seats for every passenger in one transaction: all of them or none."""
+    preferences = preferences or {}
+    with get_conn() as conn:
+        result = reservations.book_group(conn, st.session_state.auth["username"], train_number, departure_date,
+                                         passengers, keep_together=preferences.get("keep_together", True))
+    if result.status == reservations.BOOKED:
+        st.success(f"🎉 Booked {len(result.seats)} seats on train {train_number}. PNR: **{result.pnr}**")
+        st.dataframe(pd.DataFrame(result.seats, columns=["Passenger", "Seat"]), use_container_width=True)
+        st.balloons()
+    elif result.status == reservations.SOLD_OUT:
+        st.error(f"😞 Not enough free seats for all {len(passengers)} passengers; nothing was booked.")
+    elif result.status == reservations.BUSY:
+        st.error(f"⏳ {result.error}")
     else:
-        st.error(f"❌ No such Train with Number {train_number}.")
+        st.error(f"❌ {result.error}")
 
-def view_seats_df(train_number):
-    tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
-    try:
-        seat_query = c.execute(
-            f"SELECT seat_number AS Seat, seat_type AS Type, booked AS Booked, passenger_name AS Name, passenger_age AS Age, passenger_gender AS Gender FROM seats_{tname} ORDER BY seat_number ASC")
-        rows = seat_query.fetchall()
-        df = pd.DataFrame(rows, columns=["Seat", "Type", "Booked", "Name", "Age", "Gender"])
-        df["Booked"] = df["Booked"].map({0: "No", 1: "Yes"})
-        return df
-    except sqlite3.OperationalError:
-        st.error("⚠️ Seat table not found. Make sure the train exists and seats are initialized.")
+def cancel_tickets(train_number, departure_date, seat_number, board_at=""):
+    departure_text = to_date_text(departure_date)
+    with get_conn() as conn:
+        result = reservations.cancel(conn, train_number, departure_text, seat_number, board_at)
+    if result.status == reservations.CANCELLED:
+        st.success(f"✅ Seat {seat_number} on Train {train_number} ({departure_text}) is now **cancelled & available**.")
+        for pnr, name in result.promoted:
+            st.info(f"🎟️ Seat {seat_number} went to waitlisted passenger **{name}** (PNR {pnr}).")
+    elif result.status == reservations.NOT_FOUND:
+        st.warning(result.error)
+    else:
+        st.error(f"❌ {result.error}")
+
+def cancel_pnr(pnr: str):
+    """Cancel every ticket and waitlist entry of a PNR in one transaction."""
+    with get_conn() as conn:
+        result = reservations.cancel_pnr(conn, st.session_state.auth["username"], pnr)
+    if result.status != reservations.CANCELLED:
+        st.warning(result.error)
+        return
+    left = result.left_waitlist
+    st.success(f"✅ PNR {pnr.strip()} cancelled: {result.released} seat(s) released, {left} waitlist entr{'y' if left == 1 else 'ies'} removed.")
+    for promoted_pnr, name in result.promoted:
+        st.info(f"🎟️ A released seat went to waitlisted passenger **{name}** (PNR {promoted_pnr}).")
+
+WAITLIST_HEADERS = ["PNR", "Train Number", "Departure Date", "Tier", "Number", "Name", "Age", "Gender",
+                    "Status", "Seat", "Requested At", "Updated At"]
+
+BOOKING_HEADERS = ["PNR", "Train Number", "Departure Date", "Seat", "Type", "Name", "Age", "Gender",
+                   "From", "To", "Status", "Booked At", "Updated At"]
+
+
+def bookings_df(rows, columns=BOOKING_HEADERS):
+    df = pd.DataFrame(rows, columns=columns)
+    for col in (columns[-2], columns[-1]):
+        df[col] = [datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") for ts in df[col]]
+    return df
+
+
+def view_seats_df(train_number, departure_date):
+    with get_conn() as conn:
+        rows = reservations.seat_map(conn, train_number, departure_date)
+    if not rows:
+        st.error("⚠️ No seats found. Make sure the train runs on that date.")
         return pd.DataFrame()
+    return pd.DataFrame(rows, columns=reservations.SEAT_HEADERS)
+
+
+TRAIN_HEADERS = ["Train Number", "Train Name", "Departure Date", "From", "To"]
+
+
+def train_listing(key: str):
+    """Date filter + paged train table. Nothing is read until the user presses Show Trains."""
+    with st.form(f"{key}_filter"):
+        fcol1, fcol2 = st.columns(2)
+        with fcol1:
+            date_from = st.date_input("From date", value=None, key=f"{key}_from")
+        with fcol2:
+            date_to = st.date_input("To date", value=None, key=f"{key}_to")
+        show = st.form_submit_button("📋 Show Trains")
+    if show:
+        # cursors[-1] is where the current page starts; going back pops it
+        st.session_state[f"{key}_listing"] = {
+            "range": (to_date_text(date_from) if date_from else None, to_date_text(date_to) if date_to else None),
+            "cursors": [None],
+        }
+    listing = st.session_state.get(f"{key}_listing")
+    if listing is None:
+        st.caption("Choose a date range (or leave it empty for all trains) and press Show Trains.")
+        return
+    with get_conn() as conn:
+        rows, next_after = listing_cache.page(conn, *listing["range"], after=listing["cursors"][-1])
+        total = listing_cache.count(conn, *listing["range"])
+    if not rows:
+        st.info("No trains available.")
+        return
+    cursors = listing["cursors"]
+    start = (len(cursors) - 1) * PAGE_SIZE
+    st.dataframe(pd.DataFrame(rows, columns=TRAIN_HEADERS), use_container_width=True)
+    pcol1, pcol2, pcol3 = st.columns([1, 2, 1])
+    with pcol1:
+        st.button("⬅️ Previous", key=f"{key}_prev", disabled=len(cursors) == 1, on_click=cursors.pop)
+    with pcol2:
+        st.caption(f"Trains {start + 1}–{start + len(rows)} of {total}")
+    with pcol3:
+        st.button("Next ➡️", key=f"{key}_next", disabled=next_after is None,
+                  on_click=cursors.append, args=(next_after,))
 
 # ======================
 # Email (SMTP) Utilities
@@ -324,54 +367,32 @@ def view_seats_df(train_number):
 def smtp_configured():
     return "smtp" in st.secrets and all(k in st.secrets["smtp"] for k in ("host","port","user","password","sender"))
 
+@timed()
 def send_email(to_email: str, subject: str, body: str) -> bool:
+    # queued in the outbox; the background mail worker does the SMTP part
     if not smtp_configured():
         return False
     try:
-        cfg = st.secrets["smtp"]
-        host = cfg["host"]
-        port = int(cfg["port"])
-        user = cfg["user"]
-        password = cfg["password"]
-        sender = cfg["sender"]
-        msg = EmailMessage()
-        msg["Subject"] = subject
-        msg["From"] = sender
-        msg["To"] = to_email
-        msg.set_content(body)
-        server = smtplib.SMTP(host, port, timeout=10)
-        server.starttls()
-        server.login(user, password)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
+        with get_conn() as conn:
+            enqueue_email(conn, to_email, subject, body)
+            conn.commit()
+    except sqlite3.Error as e:
         st.error(f"Email sending failed: {e}")
         return False
+    get_mailer(dict(st.secrets["smtp"])).notify()
+    return True
 
 def generate_and_store_code(username: str, purpose: str, ttl_minutes: int = 15) -> str:
-    code = f"{random.randint(100000, 999999)}"
-    expiry = int((datetime.utcnow() + timedelta(minutes=ttl_minutes)).timestamp())
-    c.execute("INSERT INTO email_codes (username, code, purpose, expiry_ts) VALUES (?, ?, ?, ?)",
-              (username, code, purpose, expiry))
-    conn.commit()
-    return code
+    with get_conn() as conn:
+        return accounts.issue_code(conn, username, purpose, ttl_minutes)
 
 def verify_code(username: str, code: str, purpose: str) -> bool:
-    now_ts = int(datetime.utcnow().timestamp())
-    cur = c.execute("SELECT code, expiry_ts FROM email_codes WHERE username=? AND purpose=? ORDER BY expiry_ts DESC LIMIT 1",
-                    (username, purpose))
-    row = cur.fetchone()
-    if not row:
-        return False
-    stored_code, expiry_ts = row
-    if now_ts > expiry_ts:
-        return False
-    return secrets.compare_digest(stored_code, code)
+    with get_conn() as conn:
+        return otp_codes.check_code(conn, username, purpose, code.strip())
 
 def clear_codes(username: str, purpose: str):
-    c.execute("DELETE FROM email_codes WHERE username=? AND purpose=?", (username, purpose))
-    conn.commit()
+    with get_conn() as conn:
+        otp_codes.clear_codes(conn, username, purpose)
 
 # ======================
 # Auth state
@@ -382,8 +403,12 @@ if "auth" not in st.session_state:
 # ======================
 # First-run admin creation (if no admin exists)
 # ======================
-c.execute("SELECT * FROM employees WHERE designation='Admin'")
-admin_exists = c.fetchone() is not None
+# an Admin is never removed from the app, so once one is seen this session stops asking
+if not st.session_state.get("admin_exists"):
+    with get_conn() as conn:
+        st.session_state.admin_exists = conn.execute(
+            "SELECT 1 FROM employees WHERE designation='Admin' LIMIT 1").fetchone() is not None
+admin_exists = st.session_state.admin_exists
 
 if not admin_exists:
     st.info("⚠️ No Admin account found. Create the first Admin account.")
@@ -394,15 +419,24 @@ if not admin_exists:
         fa_submit = st.form_submit_button("Create Admin Account")
     if fa_submit:
         if fa_user and fa_pass and fa_email:
-            hashed = hash_password(fa_pass)
             try:
-                c.execute("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, ?)", (fa_user, hashed, fa_email, 1))
-            except sqlite3.IntegrityError:
+                hashed = hash_password(fa_pass)
+            except HashingBusy as e:
+                st.error(f"⏳ {e}")
+                st.stop()
+            with get_conn() as conn:
+                try:
+                    conn.execute("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, ?)", (fa_user, hashed, fa_email, 1))
+                except sqlite3.IntegrityError:
+                    created = False
+                else:
+                    conn.execute("INSERT INTO employees (employee_id, password, designation) VALUES (?, ?, ?)",
+                                 (fa_user, hashed, "Admin"))
+                    conn.commit()
+                    created = True
+            if not created:
                 st.error("Username already exists in users. Choose another username.")
             else:
-                c.execute("INSERT INTO employees (employee_id, password, designation) VALUES (?, ?, ?)",
-                          (fa_user, hashed, "Admin"))
-                conn.commit()
                 st.success(f"✅ Admin account '{fa_user}' created. Please login below.")
                 # update query params to trigger a reload (safe method)
                 st.session_state['refresh'] = int(time.time())
@@ -413,46 +447,26 @@ if not admin_exists:
 # Auth helper functions (signup/login/password reset)
 # ======================
 def signup_user_with_email(username: str, password: str, email: str) -> (bool, str):
-    if not username or not password or not email:
-        return False, "Username, password and email are required."
-    cur = c.execute("SELECT username FROM users WHERE username=?", (username,))
-    if cur.fetchone():
-        return False, "Username already exists."
-    hashed = hash_password(password)
-    c.execute("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, ?)", (username, hashed, email, 0))
-    conn.commit()
-    code = generate_and_store_code(username, "email_verification", ttl_minutes=30)
-    if smtp_configured():
-        subject = "Verify your ERailTicket account"
-        body = f"Hello {username},\n\nYour verification code is: {code}\nIt expires in 30 minutes."
-        ok = send_email(email, subject, body)
-        if ok:
-            return True, "Account created. Verification code sent to email."
-        else:
-            return True, "Account created but failed to send verification email (check SMTP settings)."
-    else:
+    mail = smtp_configured()
+    ok, message = accounts.signup(username, password, email, send_email=mail)
+    if not ok:
+        return False, message
+    if not mail:
         return False, "Email service is not configured. Contact admin."
+    get_mailer(dict(st.secrets["smtp"])).notify()
+    return True, message
 
 
+@timed()
 def login_user(identifier: str, password: str):
-    cur = c.execute("SELECT username, password, email_verified FROM users WHERE username=? OR email=?", (identifier, identifier))
-    row = cur.fetchone()
-    if not row:
-        return False, "Invalid username or password.", None
-    real_username, stored_hash, email_verified = row
-    if not verify_password(stored_hash, password):
-        return False, "Invalid username or password.", None
-    if email_verified == 0:
-        return False, "Email not verified. Please verify your email before logging in.", None
-    cur2 = c.execute("SELECT designation FROM employees WHERE employee_id=?", (real_username,))
-    erow = cur2.fetchone()
-    if erow and erow[0] == "Admin":
-        return True, "Admin", real_username
-    return True, "User", real_username
+    return accounts.login(identifier, password, client_address(), RATE_LIMIT_PERSISTENT)
 
 def request_password_reset(username_or_email: str):
-    cur = c.execute("SELECT username, email FROM users WHERE username=? OR email=?", (username_or_email, username_or_email))
-    row = cur.fetchone()
+    if rate_limited("reset", username_or_email):
+        return False, "Too many reset requests. Please wait a while and try again."
+    with get_conn() as conn:
+        cur = conn.execute("SELECT username, email FROM users WHERE username=? OR email=?", (username_or_email, username_or_email))
+        row = cur.fetchone()
     if not row:
         return False, "No account found with that username/email."
     username, email = row
@@ -471,20 +485,24 @@ def request_password_reset(username_or_email: str):
 def perform_password_reset(username: str, code: str, new_password: str):
     if not verify_code(username, code, "password_reset"):
         return False, "Invalid or expired code."
-    hashed = hash_password(new_password)
-    c.execute("UPDATE users SET password=? WHERE username=?", (hashed, username))
-    conn.commit()
-    clear_codes(username, "password_reset")
-    cur = c.execute("SELECT * FROM employees WHERE employee_id=?", (username,))
-    if cur.fetchone():
-        c.execute("UPDATE employees SET password=? WHERE employee_id=?", (hashed, username))
+    try:
+        hashed = hash_password(new_password)
+    except HashingBusy as e:
+        return False, str(e)
+    with get_conn() as conn:
+        conn.execute("UPDATE users SET password=? WHERE username=?", (hashed, username))
+        conn.execute("UPDATE employees SET password=? WHERE employee_id=?", (hashed, username))
         conn.commit()
+    clear_codes(username, "password_reset")
     return True, "Password updated successfully."
 
 def verify_email_code(username: str, code: str):
+    if rate_limited("verify", username):
+        return False
     if verify_code(username, code, "email_verification"):
-        c.execute("UPDATE users SET email_verified=1 WHERE username=?", (username,))
-        conn.commit()
+        with get_conn() as conn:
+            conn.execute("UPDATE users SET email_verified=1 WHERE username=?", (username,))
+            conn.commit()
         clear_codes(username, "email_verification")
         return True
     return False
@@ -578,7 +596,7 @@ role = st.session_state.auth["role"]
 is_admin = role == "Admin"
 
 # Ordered tabs: Admin tabs (if admin) then user tabs
-base_tabs = ["🏠 Home", "🎫 Book Ticket", "❌ Cancel Ticket", "🔍 Search Trains", "🚆 View Trains", "🪑 View Seats", "🔑 Reset Password"]
+base_tabs = ["🏠 Home", "🎫 Book Ticket", "❌ Cancel Ticket", "🧾 My Bookings", "🔍 Search Trains", "🚆 View Trains", "🪑 View Seats", "🔑 Reset Password"]
 if is_admin:
     tabs = ["➕ Add Train", "📋 View Trains (Admin)", "❌ Delete Train", "🛠️ Admin Panel"] + base_tabs
 else:
@@ -589,11 +607,17 @@ tab_objs = st.tabs(tabs)
 # build mapping to use safe indexing
 tab_map = {name: tab_objs[i] for i, name in enumerate(tabs)}
 
+@contextmanager
+def tab_body(name):
+    # each tab's body is timed as "tab <name>" when instrumentation is on
+    with tab_map[name], span(f"tab {name}"):
+        yield
+
 # ----------------
 # Admin tabs
 # ----------------
 if is_admin:
-    with tab_map["➕ Add Train"]:
+    with tab_body("➕ Add Train"):
         st.markdown("<div class='app-card'>", unsafe_allow_html=True)
         st.markdown("### ➕ Add New Train")
         with st.form("new_train_details"):
@@ -602,35 +626,40 @@ if is_admin:
                 train_number = st.text_input("Train Number")
                 departure_date = st.date_input("Date of Departure", value=date.today())
                 starting_destination = st.text_input("Starting Destination")
+                departure_time = st.time_input("Departure Time", value=None)
             with c2:
                 train_name = st.text_input("Train Name")
                 ending_destination = st.text_input("Ending Destination")
+                travel_minutes = st.number_input("Travel Time (minutes, optional)", min_value=0, max_value=7 * 24 * 60, value=0, step=15)
+            stops_text = st.text_area("Intermediate Stops (optional, one per line: `Station` or `Station, minutes after departure`)")
             submitted = st.form_submit_button("✅ Add Train")
         if submitted:
             if all([train_number, train_name, starting_destination, ending_destination]):
                 try:
-                    add_train(train_number, train_name, departure_date, starting_destination, ending_destination)
+                    add_train(train_number, train_name, departure_date, starting_destination, ending_destination,
+                              departure_time, travel_minutes, parse_stops(stops_text))
                     st.success("✅ Train Added Successfully!")
                     st.balloons()
-                except sqlite3.IntegrityError as e:
+                except (sqlite3.IntegrityError, ValueError) as e:
                     st.error(f"⚠️ Could not add train: {e}")
             else:
                 st.error("Please fill all required fields.")
+        with st.expander("📥 Bulk import timetable (CSV / Parquet)"):
+            st.caption("Columns: train_number, train_name, departure_date (YYYY-MM-DD), starting_destination, "
+                       "ending_destination; optional departure_time (HH:MM), travel_minutes and stops "
+                       "(\"Agra; Gwalior, 180\", quoted). Runs that already exist are skipped.")
+            upload = st.file_uploader("Timetable file", type=["csv", "parquet"], key="timetable_upload")
+            if upload is not None and st.button("📥 Import", key="timetable_import"):
+                import_timetable_file(upload)
         st.markdown("</div>", unsafe_allow_html=True)
 
-    with tab_map["📋 View Trains (Admin)"]:
+    with tab_body("📋 View Trains (Admin)"):
         st.markdown("<div class='app-card'>", unsafe_allow_html=True)
         st.markdown("### 📋 All Trains (Admin)")
-        train_query = c.execute("SELECT * FROM trains ORDER BY departure_date ASC, train_number ASC")
-        trains = train_query.fetchall()
-        if trains:
-            df = pd.DataFrame(trains, columns=["Train Number", "Train Name", "Departure Date", "From", "To"])
-            st.dataframe(df, use_container_width=True)
-        else:
-            st.info("No trains available.")
+        train_listing("admin_trains")
         st.markdown("</div>", unsafe_allow_html=True)
 
-    with tab_map["❌ Delete Train"]:
+    with tab_body("❌ Delete Train"):
         st.markdown("<div class='app-card'>", unsafe_allow_html=True)
         st.markdown("### ❌ Delete Train")
         with st.form("delete_form"):
@@ -647,7 +676,7 @@ if is_admin:
                 st.error("Enter a train number.")
         st.markdown("</div>", unsafe_allow_html=True)
 
-    with tab_map["🛠️ Admin Panel"]:
+    with tab_body("🛠️ Admin Panel"):
         st.markdown("<div class='app-card'>", unsafe_allow_html=True)
         st.markdown("### 🛠️ Admin Panel")
         st.info("Create additional Admin user (only admins can do this).")
@@ -658,24 +687,59 @@ if is_admin:
             create_admin_btn = st.form_submit_button("Create Admin")
         if create_admin_btn:
             if a_user and a_pass and a_email:
-                cur = c.execute("SELECT username FROM users WHERE username=?", (a_user,))
-                if cur.fetchone():
+                with get_conn() as conn:
+                    exists = conn.execute("SELECT username FROM users WHERE username=?", (a_user,)).fetchone()
+                if exists:
                     st.error("User already exists. Choose different username.")
                 else:
-                    hashed = hash_password(a_pass)
-                    c.execute("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, ?)", (a_user, hashed, a_email, 1))
-                    c.execute("INSERT INTO employees (employee_id, password, designation) VALUES (?, ?, ?)",
-                              (a_user, hashed, "Admin"))
-                    conn.commit()
-                    st.success(f"✅ Admin '{a_user}' created.")
+                    try:
+                        hashed = hash_password(a_pass)
+                    except HashingBusy as e:
+                        st.error(f"⏳ {e}")
+                    else:
+                        with get_conn() as conn:
+                            conn.execute("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, ?)", (a_user, hashed, a_email, 1))
+                            conn.execute("INSERT INTO employees (employee_id, password, designation) VALUES (?, ?, ?)",
+                                         (a_user, hashed, "Admin"))
+                            conn.commit()
+                        st.success(f"✅ Admin '{a_user}' created.")
             else:
                 st.error("Enter username, password and email.")
+
+        with st.expander("🔐 Password hashing pool"):
+            st.json(hashing_pool.stats())
+        with st.expander("🚦 Rate limits"):
+            st.json([limiter.stats() for limiter in all_limiters()])
+        with st.expander("📧 Email outbox"):
+            with get_conn() as conn:
+                st.json(outbox_counts(conn))
+            if smtp_configured():
+                st.json(get_mailer(dict(st.secrets["smtp"])).stats())
+        with st.expander("📈 Performance"):
+            if not instrumentation.is_enabled():
+                st.info("Instrumentation is off. Set `[metrics] enabled = true` in secrets.toml "
+                        "(or ERAIL_METRICS=1) and restart to time functions, tabs and SQL statements.")
+            else:
+                functions = instrumentation.function_stats()
+                statements = instrumentation.sql_stats(limit=25)
+                st.markdown("**Functions and tabs** (this process)")
+                if functions:
+                    st.dataframe(pd.DataFrame(functions), use_container_width=True)
+                st.markdown("**Slowest SQL statements** (total time)")
+                if statements:
+                    st.dataframe(pd.DataFrame(statements), use_container_width=True)
+                mcol1, mcol2 = st.columns(2)
+                with mcol1:
+                    st.download_button("⬇️ Prometheus metrics", instrumentation.prometheus_text(),
+                                       file_name="erail_metrics.prom", mime="text/plain")
+                with mcol2:
+                    st.button("♻️ Reset", key="metrics_reset", on_click=instrumentation.reset)
         st.markdown("</div>", unsafe_allow_html=True)
 
 # ----------------
 # Base tabs (for all users)
 # ----------------
-with tab_map["🏠 Home"]:
+with tab_body("🏠 Home"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
 
     c1, c2 = st.columns([1.2, 1])
@@ -702,14 +766,14 @@ with tab_map["🏠 Home"]:
 
     # ---- RIGHT: Live hero image ----
     with c2:
-        try:
-            hero_img = Image.open("hero_train.jpg")   # put this image next to app.py
+        hero_img = image_bytes("hero_train.jpg", max_width=1400)   # put this image next to app.py
+        if hero_img:
             st.image(
                 hero_img,
                 caption="Plan, book, and manage journeys with ERailTicket.",
                 use_container_width=True,
             )
-        except Exception:
+        else:
             st.markdown(
                 "<p style='color: grey; font-size: 13px;'>"
                 "Add <code>hero_train.jpg</code> in the project root (same folder as <code>app.py</code>) "
@@ -752,40 +816,68 @@ with tab_map["🏠 Home"]:
 
 
 
-with tab_map["🎫 Book Ticket"]:
+with tab_body("🎫 Book Ticket"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
     st.markdown("### 🎫 Book Ticket")
     with st.form("booking_form", clear_on_submit=False):
         bcol1, bcol2, bcol3 = st.columns(3)
         with bcol1:
             b_train_no = st.text_input("Train Number")
+            b_date = st.date_input("Departure Date", value=date.today(), key="b_date")
             b_seat_type = st.selectbox("Seat Type", ["Aisle", "Middle", "Window"], index=0)
         with bcol2:
             b_name = st.text_input("Passenger Name")
             b_age = st.number_input("Age", min_value=1, max_value=120, value=25)
         with bcol3:
             b_gender = st.selectbox("Gender", ["Male", "Female", "Other"])
+            b_board = st.text_input("Boarding Station (optional)", key="b_board")
+            b_alight = st.text_input("Alighting Station (optional)", key="b_alight")
         book_btn = st.form_submit_button("✅ Confirm Booking")
     if book_btn:
         if b_train_no and b_name:
-            book_ticket(b_train_no, b_name, b_age, b_gender, b_seat_type)
+            book_ticket(b_train_no, b_date, b_name, b_age, b_gender, b_seat_type, b_board, b_alight)
         else:
             st.error("Please enter Train Number and Passenger Name.")
+
+    with st.expander("👨‍👩‍👧‍👦 Group Booking"):
+        with st.form("group_booking_form"):
+            gcol1, gcol2 = st.columns(2)
+            with gcol1:
+                g_train_no = st.text_input("Train Number", key="g_train_no")
+            with gcol2:
+                g_date = st.date_input("Departure Date", value=date.today(), key="g_date")
+            g_passengers = st.text_area("Passengers (one per line: Name, Age, Gender[, Seat Type])",
+                                        placeholder="Asha, 34, Female, Window\nRavi, 36, Male\nMeera, 8, Female, Window")
+            g_together = st.checkbox("Keep the group together", value=True)
+            group_btn = st.form_submit_button("✅ Book Group")
+        if group_btn:
+            try:
+                passengers = parse_passengers(g_passengers)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                if g_train_no:
+                    book_group(g_train_no, g_date, passengers, {"keep_together": g_together})
+                else:
+                    st.error("Please enter Train Number.")
     st.markdown("</div>", unsafe_allow_html=True)
 
-with tab_map["❌ Cancel Ticket"]:
+with tab_body("❌ Cancel Ticket"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
     st.markdown("### ❌ Cancel Ticket")
     with st.form("cancel_form"):
-        ccol1, ccol2 = st.columns(2)
+        ccol1, ccol2, ccol3 = st.columns(3)
         with ccol1:
             c_train_no = st.text_input("Train Number")
         with ccol2:
+            c_date = st.date_input("Departure Date", value=date.today(), key="c_date")
+        with ccol3:
             c_seat_no = st.number_input("Seat Number", min_value=1, max_value=50, value=1, step=1)
+        c_board = st.text_input("Boarding Station (only for part-route tickets)", key="c_board")
         cancel_btn = st.form_submit_button("❌ Cancel Seat")
     if cancel_btn:
         if c_train_no and c_seat_no:
-            cancel_tickets(c_train_no, c_seat_no)
+            cancel_tickets(c_train_no, c_date, c_seat_no, c_board)
         else:
             st.error("Enter Train Number and Seat Number.")
     st.markdown("</div>", unsafe_allow_html=True)
@@ -794,85 +886,145 @@ with tab_map["❌ Cancel Ticket"]:
 # Train Search Utilities  (ADD THIS)
 # ======================
 
-def search_train_by_train_number(train_no: str):
-    cur = c.execute(
-        "SELECT train_number, train_name, departure_date, starting_destination, ending_destination "
-        "FROM trains WHERE train_number LIKE ?",
-        (f"%{train_no}%",)
-    )
-    return cur.fetchall()
-
-
-def search_trains_by_destinations(src: str, dest: str, dep_date=None):
-    if dep_date:
-        cur = c.execute(
-            "SELECT train_number, train_name, departure_date, starting_destination, ending_destination "
-            "FROM trains WHERE starting_destination LIKE ? AND ending_destination LIKE ? AND departure_date=?",
-            (f"%{src}%", f"%{dest}%", dep_date.isoformat())
-        )
-    else:
-        cur = c.execute(
-            "SELECT train_number, train_name, departure_date, starting_destination, ending_destination "
-            "FROM trains WHERE starting_destination LIKE ? AND ending_destination LIKE ?",
-            (f"%{src}%", f"%{dest}%")
-        )
-    return cur.fetchall()
+@timed()
+def search_train_by_train_number(train_no: str, substring: bool = False):
+    with get_conn() as conn:
+        return reservations.search_train_number(conn, train_no, substring)
+
+
+@timed()
+def search_trains_by_destinations(src: str, dest: str, dep_date=None, substring: bool = False):
+    with get_conn() as conn:
+        return reservations.search_route(conn, src, dest, dep_date, substring)
+
 
+@timed()
+def plan_journeys(src: str, dest: str, dep_date, max_changes: int = 2):
+    with get_conn() as conn:
+        return reservations.plan_journeys(conn, src, dest, dep_date, max_changes)
 
-with tab_map["🔍 Search Trains"]:
+
+with tab_body("🔍 Search Trains"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
     st.markdown("### 🔍 Search Trains")
     with st.form("search_train_form"):
         s1, s2, s3 = st.columns([1,1,1])
         with s1:
-            search_train_no = st.text_input("Train Number (optional)")
+            search_train_no = st.text_input("Train Number or Name (optional)")
         with s2:
             s_from = st.text_input("From (optional)")
         with s3:
             s_to = st.text_input("To (optional)")
         s_date = st.date_input("Departure Date (optional)", value=None)
+        s_anywhere = st.checkbox("Also match text anywhere in the name (slower)", value=False)
         search_btn = st.form_submit_button("🔎 Search")
     if search_btn:
         results = []
         if search_train_no:
-            results = search_train_by_train_number(search_train_no)
+            results = search_train_by_train_number(search_train_no, substring=s_anywhere)
         elif s_from and s_to:
-            results = search_trains_by_destinations(s_from, s_to, s_date if s_date is not None else None)
+            results = search_trains_by_destinations(s_from, s_to, s_date if s_date is not None else None,
+                                                    substring=s_anywhere)
         if results:
             df = pd.DataFrame(results, columns=["Train Number", "Train Name", "Departure Date", "From", "To"])
             st.dataframe(df, use_container_width=True)
         else:
             st.warning("No trains found with given criteria.")
+
+    st.markdown("#### 🔀 Plan a journey with connections")
+    with st.form("journey_plan_form"):
+        j1, j2, j3, j4 = st.columns([1, 1, 1, 1])
+        with j1:
+            j_from = st.text_input("From", key="j_from")
+        with j2:
+            j_to = st.text_input("To", key="j_to")
+        with j3:
+            j_date = st.date_input("Travel Date", value=date.today(), key="j_date")
+        with j4:
+            j_changes = st.number_input("Max changes", min_value=0, max_value=4, value=2, step=1)
+        plan_btn = st.form_submit_button("🗺️ Find Journeys")
+    if plan_btn:
+        if j_from and j_to:
+            journeys = plan_journeys(j_from, j_to, j_date, int(j_changes))
+            if journeys:
+                for i, journey in enumerate(journeys, start=1):
+                    changes = len(journey) - 1
+                    st.markdown(f"**Option {i}** — {changes} change{'s' if changes != 1 else ''}")
+                    st.dataframe(pd.DataFrame(journey_planner.journey_rows(journey)), use_container_width=True)
+            else:
+                st.warning(f"No journeys found within {journey_planner.SEARCH_HORIZON_DAYS} days of that date.")
+        else:
+            st.error("Enter both From and To stations.")
     st.markdown("</div>", unsafe_allow_html=True)
 
-with tab_map["🚆 View Trains"]:
+with tab_body("🚆 View Trains"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
     st.markdown("### 🚆 View Trains")
-    train_query = c.execute("SELECT * FROM trains ORDER BY departure_date ASC, train_number ASC")
-    trains = train_query.fetchall()
-    if trains:
-        df = pd.DataFrame(trains, columns=["Train Number", "Train Name", "Departure Date", "From", "To"])
-        st.dataframe(df, use_container_width=True)
-    else:
-        st.info("No trains available.")
+    train_listing("trains")
     st.markdown("</div>", unsafe_allow_html=True)
 
-with tab_map["🪑 View Seats"]:
+with tab_body("🪑 View Seats"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
     st.markdown("### 🪑 View Seats")
     with st.form("view_seats_form"):
-        v_train_no = st.text_input("Train Number")
+        vcol1, vcol2 = st.columns(2)
+        with vcol1:
+            v_train_no = st.text_input("Train Number")
+        with vcol2:
+            v_date = st.date_input("Departure Date", value=date.today(), key="v_date")
         v_btn = st.form_submit_button("📋 Show Seats")
     if v_btn:
         if v_train_no:
-            df = view_seats_df(v_train_no)
+            df = view_seats_df(v_train_no, v_date)
             if not df.empty:
                 st.dataframe(df, use_container_width=True, height=520)
         else:
             st.error("Enter a Train Number.")
     st.markdown("</div>", unsafe_allow_html=True)
 
-with tab_map["🔑 Reset Password"]:
+with tab_body("🧾 My Bookings"):
+    st.markdown("<div class='app-card'>", unsafe_allow_html=True)
+    st.markdown("### 🧾 PNR Status")
+    with st.form("pnr_form"):
+        p_pnr = st.text_input("PNR Number")
+        pnr_btn = st.form_submit_button("🔎 Check Status")
+    if pnr_btn:
+        if p_pnr:
+            with get_conn() as conn:
+                rows = bookings_for_pnr(conn, p_pnr)
+                waiting = waitlist_for_pnr(conn, p_pnr)
+            if rows:
+                st.dataframe(bookings_df(rows), use_container_width=True)
+            if waiting:
+                st.dataframe(bookings_df(waiting, WAITLIST_HEADERS), use_container_width=True)
+            if not rows and not waiting:
+                st.warning("No booking found for that PNR.")
+        else:
+            st.error("Enter a PNR Number.")
+
+    st.markdown("### 🧾 My Bookings")
+    # cached per account until a booking or waitlist change is published
+    with get_conn() as conn:
+        rows, waiting = reservations.user_bookings(conn, st.session_state.auth["username"])
+    if rows:
+        st.dataframe(bookings_df(rows), use_container_width=True)
+    else:
+        st.info("You have no bookings yet.")
+    if waiting:
+        st.markdown("#### 🕒 Waiting List / RAC")
+        st.dataframe(bookings_df(waiting, WAITLIST_HEADERS), use_container_width=True)
+
+    with st.form("cancel_pnr_form"):
+        x_pnr = st.text_input("PNR to cancel (all passengers)")
+        x_btn = st.form_submit_button("❌ Cancel PNR")
+    if x_btn:
+        if x_pnr:
+            cancel_pnr(x_pnr)
+        else:
+            st.error("Enter a PNR Number.")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+with tab_body("🔑 Reset Password"):
     st.markdown("<div class='app-card'>", unsafe_allow_html=True)
     st.markdown("### 🔑 Reset Password")
     with st.form("reset_password_form"):
@@ -889,8 +1041,8 @@ with tab_map["🔑 Reset Password"]:
         else:
             # if user entered email, resolve to username
             if "@" in rp_user:
-                cur = c.execute("SELECT username FROM users WHERE email=?", (rp_user,))
-                row = cur.fetchone()
+                with get_conn() as conn:
+                    row = conn.execute("SELECT username FROM users WHERE email=?", (rp_user,)).fetchone()
                 if row:
                     rp_user_resolved = row[0]
                 else:
@@ -908,4 +1060,4 @@ with tab_map["🔑 Reset Password"]:
 st.markdown("---")
 st.caption("Theme: IRCTC-inspired. Email features require SMTP in Streamlit secrets (see sidebar note).")
 
-# (do not close DB connection for app lifetime)
+# (pooled DB connections stay open for the app lifetime)
@@ -0,0 +1,101 @@
+# assets.py
+# Process-wide cache for static images and HTML fragments.
+#
+# Streamlit re-runs app.py on every click, which used to re-open logo.png
+# twice (sidebar + base64 header) and hero_train.jpg on every interaction.
+# Here each asset is loaded, resized and encoded once per process and kept
+# under (path, variant) together with the file's mtime and size; editing the
+# file on disk changes the stamp and the next call reloads it. Fragments
+# (CSS, header HTML) are rendered once per key.
+import base64
+import io
+import mimetypes
+import os
+import threading
+
+try:
+    from PIL import Image
+except ImportError:   # resizing is skipped, images are served as stored
+    Image = None
+
+_cache = {}            # (abs path, variant) -> ((mtime_ns, size), value)
+_fragments = {}        # key -> html
+_lock = threading.Lock()
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _cached(path, variant, build):
+    stamp = _stamp(path)
+    if stamp is None:
+        return None
+    key = (os.path.abspath(path), variant)
+    with _lock:
+        hit = _cache.get(key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    try:
+        value = build(path)
+    except Exception:
+        # unreadable / not an image: behave like a missing file
+        return None
+    with _lock:
+        _cache[key] = (stamp, value)
+    return value
+
+
+def _resized(path, max_width):
+    with open(path, "rb") as f:
+        data = f.read()
+    if Image is None or not max_width:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        if img.width <= max_width:
+            return data
+        fmt = img.format or "PNG"
+        img.thumbnail((max_width, max_width * img.height // img.width))
+        out = io.BytesIO()
+        img.save(out, format=fmt, **({"quality": 85, "optimize": True} if fmt == "JPEG" else {"optimize": True}))
+        return out.getvalue()
+
+
+def image_bytes(path: str, max_width: int = None):
+    """File contents, scaled down to ``max_width`` pixels if wider; None if missing."""
+    return _cached(path, ("bytes", max_width), lambda p: _resized(p, max_width))
+
+
+def image_data_uri(path: str, max_width: int = None):
+    def build(p):
+        mime = mimetypes.guess_type(p)[0] or "image/png"
+        return f"data:{mime};base64,{base64.b64encode(_resized(p, max_width)).decode()}"
+    return _cached(path, ("uri", max_width), build)
+
+
+def img_tag(path: str, width: int, style: str = "", max_width: int = None) -> str:
+    """Pre-rendered <img> with the image inlined; '' if the file is missing."""
+    def build(p):
+        uri = image_data_uri(p, max_width)
+        return f'<img src="{uri}" width="{width}" style="{style}" />'
+    return _cached(path, ("img", width, style, max_width), build) or ""
+
+
+def fragment(key, render) -> str:
+    """``render()`` once per process for ``key``, then the stored string."""
+    html = _fragments.get(key)
+    if html is None:
+        html = render()
+        with _lock:
+            _fragments[key] = html
+    return html
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _fragments.clear()
@@ -0,0 +1,59 @@
+# Per-rerun cost of the header/sidebar/home images, before and after assets.py.
+#
+# "uncached" repeats what every rerun used to do: read logo.png and base64 it
+# for the header, open it again for the sidebar (PIL, if installed) and open
+# hero_train.jpg. "cached" makes the same calls through assets.py. Also
+# reports the size of the header HTML sent to the browser on each rerun.
+#
+#   python -m benchmarks.bench_assets --reruns 200
+import argparse
+import base64
+import json
+import time
+
+import assets
+
+LOGO = "logo.png"
+HERO = "hero_train.jpg"
+
+
+def uncached_rerun():
+    with open(LOGO, "rb") as f:
+        logo_html = f'<img src="data:image/png;base64,{base64.b64encode(f.read()).decode()}" width="80" />'
+    if assets.Image is not None:
+        assets.Image.open(LOGO).load()
+        assets.Image.open(HERO).load()
+    else:
+        with open(LOGO, "rb") as f:
+            f.read()
+        with open(HERO, "rb") as f:
+            f.read()
+    return logo_html
+
+
+def cached_rerun():
+    logo_html = assets.img_tag(LOGO, width=80, max_width=160)
+    assets.image_bytes(LOGO, max_width=160)
+    assets.image_bytes(HERO, max_width=1400)
+    return logo_html
+
+
+def timed(fn, reruns):
+    fn()   # first call fills the cache / page cache
+    started = time.perf_counter()
+    for _ in range(reruns):
+        html = fn()
+    return {"ms_per_rerun": (time.perf_counter() - started) / reruns * 1000, "header_html_bytes": len(html)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static asset cost per Streamlit rerun")
+    parser.add_argument("--reruns", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps({"pil_installed": assets.Image is not None,
+                      "uncached": timed(uncached_rerun, args.reruns),
+                      "cached": timed(cached_rerun, args.reruns)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Per-rerun cost of schema bootstrap, before and after migrations.py.
+#
+# "before" repeats what app.py did at the top of every rerun: every
+# create_*_schema / migration step, the PRAGMA table_info(users) check and the
+# first-run Admin lookup. "after" is ensure_schema() once the process has
+# migrated, plus the Admin lookup only until an admin has been seen. A SQLite
+# trace callback counts the statements each rerun sends. Also times the
+# one-off cost of migrating a fresh and an unversioned database.
+#
+#   python -m benchmarks.bench_bootstrap --reruns 200
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import migrations
+from db import get_pool
+
+
+def old_rerun(conn, state):
+    for _, _, step in migrations.MIGRATIONS:
+        step(conn)
+    conn.execute("SELECT * FROM employees WHERE designation='Admin'").fetchone()
+
+
+def new_rerun(conn, state, path):
+    migrations.ensure_schema(path)
+    if not state.get("admin_exists"):
+        state["admin_exists"] = conn.execute(
+            "SELECT 1 FROM employees WHERE designation='Admin' LIMIT 1").fetchone() is not None
+
+
+def measure(rerun, conn, reruns):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    state = {}
+    times = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        rerun(conn, state)
+        times.append(time.perf_counter() - started)
+    conn.set_trace_callback(None)
+    times.sort()
+    return {"p50_ms": statistics.median(times) * 1000, "p99_ms": times[int(len(times) * 0.99) - 1] * 1000,
+            "statements_per_rerun": len(statements) / reruns}
+
+
+def first_start(path):
+    migrations.forget(path)
+    started = time.perf_counter()
+    applied = migrations.ensure_schema(path)
+    return {"elapsed_ms": (time.perf_counter() - started) * 1000, "applied": len(applied)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema bootstrap cost per Streamlit rerun")
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--db", default="railway_system.db", help="copied, never modified")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = os.path.join(tmp, "fresh.db")
+        existing = os.path.join(tmp, "existing.db")
+        shutil.copy(args.db, existing)
+        report = {"reruns": args.reruns,
+                  "first_start_fresh": first_start(fresh),
+                  "first_start_unversioned": first_start(existing)}
+        with get_pool(existing).connection() as conn:
+            conn.execute("INSERT INTO employees (employee_id, password, designation) VALUES ('bench', 'x', 'Admin')")
+            conn.commit()
+            report["before"] = measure(old_rerun, conn, args.reruns)
+            report["after"] = measure(lambda c, s: new_rerun(c, s, existing), conn, args.reruns)
+            report["schema_version"] = migrations.current_version(conn)
+        for path in (fresh, existing):
+            get_pool(path).close()
+    print(json.dumps(report, indent=2))
+    ok = report["after"]["statements_per_rerun"] < 0.01 and report["schema_version"] == migrations.LATEST
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
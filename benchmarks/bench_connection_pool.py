@@ -0,0 +1,142 @@
+# Concurrent read/write throughput: pooled WAL connections vs. one shared cursor.
+#
+# "shared" reproduces the old app.py model: a single check_same_thread=False
+# connection and cursor used by every thread. "pool" checks connections out of
+# db.ConnectionPool. Each thread runs a mix of train searches (reads) and seat
+# claim/release pairs (writes) against the same temp database.
+#
+#   python -m benchmarks.bench_connection_pool --threads 16 --ops 400 --write-ratio 0.2
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db import ConnectionPool
+from seat_allocator import claim_seat, release_seat
+from seat_inventory import create_seat_inventory, init_seats
+
+TRAINS = 200
+DATE = "2025-01-01"
+SEARCH_SQL = ("SELECT train_number, train_name, departure_date, starting_destination, ending_destination "
+              "FROM trains WHERE starting_destination LIKE ? AND ending_destination LIKE ?")
+
+
+def seed(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE trains
+                    (train_number TEXT, train_name TEXT, departure_date TEXT, starting_destination TEXT, ending_destination TEXT)''')
+    create_seat_inventory(conn)
+    for t in range(TRAINS):
+        conn.execute("INSERT INTO trains VALUES (?, ?, ?, ?, ?)",
+                     (f"T{t}", f"Express {t}", DATE, f"STN{t % 20}", f"STN{(t * 7) % 20}"))
+        init_seats(conn, f"T{t}", DATE, commit=False)
+    conn.commit()
+    conn.close()
+
+
+def _op(conn, rng, write_ratio):
+    if rng.random() < write_ratio:
+        train = f"T{rng.randrange(TRAINS)}"
+        seat = claim_seat(conn, train, DATE, rng.choice(["Window", "Aisle", "Middle"]), "Bench", 30, "Other")
+        if seat:
+            release_seat(conn, train, DATE, seat)
+        return "write"
+    conn.execute(SEARCH_SQL, (f"%STN{rng.randrange(20)}%", f"%STN{rng.randrange(20)}%")).fetchall()
+    return "read"
+
+
+def run(mode, db_path, threads, ops, write_ratio):
+    counts = {"read": 0, "write": 0}
+    counts_lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    if mode == "shared":
+        # the old app.py model: one connection + cursor for every thread. It has
+        # to be serialised with a lock - unguarded, concurrent threads trip
+        # "Recursive use of cursors not allowed" or crash the interpreter.
+        shared = sqlite3.connect(db_path, check_same_thread=False)
+        cursor = shared.cursor()
+        shared_lock = threading.Lock()
+
+        class SharedCursor:
+            def execute(self, *args):
+                return cursor.execute(*args)
+
+            def commit(self):
+                shared.commit()
+
+            def rollback(self):
+                shared.rollback()
+
+            @property
+            def in_transaction(self):
+                return shared.in_transaction
+
+        def checkout():
+            shared_lock.acquire()
+            return SharedCursor()
+
+        def checkin(conn):
+            shared_lock.release()
+    else:
+        pool = ConnectionPool(db_path, size=threads)
+        checkout = pool.acquire
+        checkin = pool.release
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        local = {"read": 0, "write": 0}
+        barrier.wait()
+        for _ in range(ops):
+            conn = checkout()
+            try:
+                local[_op(conn, rng, write_ratio)] += 1
+            finally:
+                checkin(conn)
+        with counts_lock:
+            for k, v in local.items():
+                counts[k] += v
+
+    pool_threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool_threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool_threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if mode == "shared":
+        shared.close()
+    else:
+        pool.close()
+    return {
+        "mode": mode,
+        "threads": threads,
+        "reads": counts["read"],
+        "writes": counts["write"],
+        "elapsed_s": elapsed,
+        "ops_per_s": (counts["read"] + counts["write"]) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled vs. shared-cursor SQLite throughput")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=400, help="operations per thread")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    reports = []
+    for mode in ("shared", "pool"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            seed(db_path)
+            reports.append(run(mode, db_path, args.threads, args.ops, args.write_ratio))
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
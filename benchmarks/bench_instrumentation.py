@@ -0,0 +1,94 @@
+# Overhead of instrumentation.py, disabled and enabled.
+#
+# Times a trivial function bare, under @timed() with metrics off and on, then
+# a seat-map style query on a plain and on a traced connection. Also checks
+# that the traced connection counted every statement and fetched row, and
+# that the Prometheus export has a histogram for the timed function.
+#
+#   python -m benchmarks.bench_instrumentation --calls 200000 --queries 5000
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import instrumentation
+
+QUERY = "SELECT seat_number, seat_type, is_booked FROM seats WHERE train_number=? AND departure_date=?"
+
+
+def per_call_ns(fn, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e9
+
+
+def seed(path, runs, seats):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE seats (train_number TEXT, departure_date TEXT, seat_number INTEGER, "
+                 "seat_type TEXT, is_booked INTEGER, PRIMARY KEY (train_number, departure_date, seat_number))")
+    conn.executemany("INSERT INTO seats VALUES (?, '2030-01-01', ?, 'Window', 0)",
+                     ((str(12000 + r), s) for r in range(runs) for s in range(1, seats + 1)))
+    conn.commit()
+    conn.close()
+
+
+def query_loop(conn, n, runs):
+    started = time.perf_counter()
+    fetched = 0
+    for i in range(n):
+        fetched += len(conn.execute(QUERY, (str(12000 + i % runs), "2030-01-01")).fetchall())
+    return (time.perf_counter() - started) / n * 1e6, fetched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the opt-in timing and SQL tracing")
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seats", type=int, default=50)
+    args = parser.parse_args()
+
+    def noop():
+        return None
+
+    wrapped = instrumentation.timed("noop")(noop)
+    instrumentation.configure(False)
+    report = {"function_ns": {"bare": per_call_ns(noop, args.calls),
+                              "timed_disabled": per_call_ns(wrapped, args.calls)}}
+    instrumentation.configure(True)
+    report["function_ns"]["timed_enabled"] = per_call_ns(wrapped, args.calls)
+    instrumentation.configure(False)
+    report["span_disabled_ns"] = per_call_ns(lambda: instrumentation.span("block").__enter__(), args.calls)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.runs, args.seats)
+        plain = sqlite3.connect(path, factory=instrumentation.connection_factory())
+        instrumentation.configure(True)
+        traced = sqlite3.connect(path, factory=instrumentation.connection_factory())
+        plain_us, plain_rows = query_loop(plain, args.queries, args.runs)
+        traced_us, traced_rows = query_loop(traced, args.queries, args.runs)
+        plain.close()
+        traced.close()
+    stats = {s["statement"]: s for s in instrumentation.sql_stats()}
+    query_stats = stats.get(instrumentation.statement_key(QUERY), {})
+    report["query_us"] = {"plain": plain_us, "traced": traced_us}
+    report["traced_rows"] = query_stats.get("rows")
+    text = instrumentation.prometheus_text()
+
+    checks = {
+        "plain_connection_untraced": type(plain) is sqlite3.Connection,
+        "statements_counted": query_stats.get("calls") == args.queries,
+        "rows_counted": query_stats.get("rows") == traced_rows == plain_rows,
+        "histogram_exported": f'erail_function_duration_seconds_count{{name="noop"}} {args.calls}' in text,
+    }
+    report["checks"] = checks
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
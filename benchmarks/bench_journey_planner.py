@@ -0,0 +1,93 @@
+# Journey planner on a synthetic network.
+#
+# Builds a timetable of --stations stations grouped into regional clusters
+# linked by trunk routes, with --trains runs per day over --days days, then
+# times the one-off planner build and random A->B queries with up to
+# --max-changes changes.
+#
+#   python -m benchmarks.bench_journey_planner --stations 3000 --trains 20000 --days 3
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import time
+from datetime import date, timedelta
+
+import journey_planner
+from train_search import create_search_schema
+
+
+def seed(conn, stations, trains_per_day, days, rng):
+    conn.execute('''CREATE TABLE trains
+                    (train_number TEXT, train_name TEXT, departure_date TEXT, starting_destination TEXT, ending_destination TEXT)''')
+    create_search_schema(conn)
+    journey_planner.create_planner_schema(conn)
+    names = [f"STN{i:05d}" for i in range(stations)]
+    cluster = max(10, stations // 100)
+    hubs = names[::cluster]
+    rows = []
+    start = date(2025, 1, 1)
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        for t in range(trains_per_day):
+            if rng.random() < 0.3:
+                src, dst = rng.sample(hubs, 2)                       # trunk route between hubs
+            else:
+                base = rng.randrange(0, stations - cluster, cluster)  # local route inside a cluster
+                local = names[base + 1:base + cluster]
+                if rng.random() < 0.5:
+                    src, dst = rng.sample([names[base], rng.choice(local)], 2)   # feeder to/from the hub
+                else:
+                    src, dst = rng.sample(local, 2)
+            dep = f"{rng.randrange(24):02d}:{rng.randrange(0, 60, 5):02d}"
+            rows.append((f"T{t}", f"Train {t}", day, src, dst, src, dst, dep, rng.randrange(30, 600)))
+    conn.executemany(
+        "INSERT INTO trains (train_number, train_name, departure_date, starting_destination, ending_destination, "
+        "from_code, to_code, departure_time, travel_minutes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journey planner build + query timings")
+    parser.add_argument("--stations", type=int, default=3000)
+    parser.add_argument("--trains", type=int, default=20000, help="train runs per day")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-changes", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    conn = sqlite3.connect(":memory:")
+    names = seed(conn, args.stations, args.trains, args.days, rng)
+
+    started = time.perf_counter()
+    planner = journey_planner.get_planner(conn)
+    build_s = time.perf_counter() - started
+
+    start = journey_planner.to_minutes("2025-01-01")
+    latencies = []
+    found = 0
+    for _ in range(args.queries):
+        origin, target = rng.sample(names, 2)
+        t0 = time.perf_counter()
+        journeys = planner.plan(origin, target, start, max_changes=args.max_changes)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found += bool(journeys)
+    latencies.sort()
+    print(json.dumps({
+        "stations": args.stations,
+        "connections": len(planner.connections),
+        "build_s": build_s,
+        "queries": args.queries,
+        "queries_with_journey": found,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "max_ms": latencies[-1],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Benchmark for the outbox mail worker against a local SMTP stand-in.
+#
+# Starts a minimal in-process SMTP sink (no TLS/AUTH, optional per-command
+# delay to mimic a remote server, optional dropped connections), queues
+# --messages emails and compares:
+#   per_message - the old send_email: connect, send, quit for every message
+#   worker      - MailWorker draining the outbox over one reused connection
+# and checks that every message was delivered exactly once.
+#
+#   python -m benchmarks.bench_mailer --messages 500 --latency-ms 2
+import argparse
+import json
+import os
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+from email.message import EmailMessage
+
+from db import connect
+from mailer import SENT, MailWorker, create_outbox_schema, enqueue_email, outbox_counts
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip().upper()
+            if cmd.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif cmd.startswith("DATA"):
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.delivered += 1
+                self.reply("250 queued")
+                if self.server.drop_every and self.server.delivered % self.server.drop_every == 0:
+                    return   # hang up without QUIT, like a server closing an idle session
+            elif cmd.startswith("QUIT"):
+                self.reply("221 bye")
+                return
+            else:   # MAIL, RCPT, RSET, NOOP
+                self.reply("250 ok")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency, drop_every):
+        super().__init__(("127.0.0.1", 0), SinkHandler)
+        self.latency = latency
+        self.drop_every = drop_every
+        self.connections = 0
+        self.delivered = 0
+
+
+def per_message(config, count):
+    started = time.perf_counter()
+    for n in range(count):
+        msg = EmailMessage()
+        msg["Subject"], msg["From"], msg["To"] = f"code {n}", config["sender"], f"user{n}@example.com"
+        msg.set_content("Your code is 123456")
+        server = smtplib.SMTP(config["host"], config["port"], timeout=10)
+        server.send_message(msg)
+        server.quit()
+    return time.perf_counter() - started
+
+
+def worker_run(config, count, db_path, batch_size):
+    conn = connect(db_path)
+    create_outbox_schema(conn)
+    for n in range(count):
+        enqueue_email(conn, f"user{n}@example.com", f"code {n}", "Your code is 123456")
+    conn.commit()
+    worker = MailWorker(config, db_path, batch_size=batch_size, poll_interval=0.05)
+    started = time.perf_counter()
+    worker.start()
+    while outbox_counts(conn).get(SENT, 0) < count and time.perf_counter() - started < 120:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    worker.stop()
+    counts = outbox_counts(conn)
+    conn.close()
+    return elapsed, counts, worker.stats()
+
+
+def run(messages, latency_ms, batch_size, drop_every):
+    report = {"messages": messages, "latency_ms": latency_ms, "batch_size": batch_size}
+    for mode in ("per_message", "worker"):
+        sink = SMTPSink(latency_ms / 1000, drop_every if mode == "worker" else 0)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        config = {"host": "127.0.0.1", "port": sink.server_address[1], "sender": "bench@example.com",
+                  "starttls": False}
+        if mode == "per_message":
+            elapsed = per_message(config, messages)
+            extra = {}
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                elapsed, counts, stats = worker_run(config, messages, os.path.join(tmp, "bench.db"), batch_size)
+            extra = {"outbox": counts, "worker": stats}
+        sink.shutdown()
+        sink.server_close()
+        report[mode] = {"elapsed_s": elapsed, "messages_per_s": messages / elapsed if elapsed else 0.0,
+                        "smtp_connections": sink.connections, "delivered": sink.delivered, **extra}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outbox mail worker benchmark")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="delay before each SMTP reply")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--drop-every", type=int, default=100,
+                        help="sink hangs up after every N messages to exercise reconnects (0 = never)")
+    args = parser.parse_args()
+    report = run(args.messages, args.latency_ms, args.batch_size, args.drop_every)
+    print(json.dumps(report, indent=2))
+    ok = report["worker"]["delivered"] == args.messages and report["worker"]["outbox"] == {SENT: args.messages}
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Password hash cost calibration.
+#
+# Times hash_password for a range of PBKDF2 iteration counts and scrypt
+# work factors on this machine and suggests the strongest setting of each
+# that fits --budget-ms per login. Put the result in the [passwords] section
+# of .streamlit/secrets.toml; older hashes are upgraded on their next login.
+#
+#   python -m benchmarks.bench_password_cost --budget-ms 100
+import argparse
+import json
+import statistics
+import time
+
+from passwords import PBKDF2, SCRYPT, hash_password
+
+PBKDF2_ITERATIONS = [100_000, 200_000, 300_000, 600_000, 1_000_000]
+SCRYPT_N = [2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16]
+
+
+def time_hash(scheme, params, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hash_password("correct horse battery staple", scheme, **params)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(budget_ms, rounds):
+    results = []
+    for iterations in PBKDF2_ITERATIONS:
+        results.append({"scheme": PBKDF2, "params": {"i": iterations},
+                        "ms": time_hash(PBKDF2, {"i": iterations}, rounds)})
+    for n in SCRYPT_N:
+        results.append({"scheme": SCRYPT, "params": {"n": n, "r": 8, "p": 1},
+                        "ms": time_hash(SCRYPT, {"n": n}, rounds)})
+    suggested = {}
+    for r in results:
+        if r["ms"] <= budget_ms:
+            suggested[r["scheme"]] = {"scheme": r["scheme"], **r["params"]}
+    return {"budget_ms": budget_ms, "results": results, "suggested": suggested}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hash cost calibration")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="hash time allowed per login")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.budget_ms, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Load test for password hashing under a login storm.
+#
+# Starts --logins simultaneous logins (one thread each, like Streamlit
+# sessions) and, alongside them, a "booking" probe that keeps running a small
+# SQLite query and timing it. Runs twice: hashing inline on every session
+# thread, then on passwords.HashingPool. Reports p50/p99 login latency, how
+# many logins were turned away, and the probe latency during each storm.
+#
+#   python -m benchmarks.bench_password_hashing --logins 200
+import argparse
+import json
+import sqlite3
+import statistics
+import threading
+import time
+
+from passwords import HashingBusy, HashingPool, hash_password, verify_password
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def probe(stop, latencies):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE seats (seat_number INTEGER PRIMARY KEY, booked INTEGER)")
+    conn.executemany("INSERT INTO seats VALUES (?, 0)", [(i,) for i in range(1, 2001)])
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("SELECT COUNT(*) FROM seats WHERE booked=0").fetchone()
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.002)
+    conn.close()
+
+
+def storm(logins, check):
+    latencies, rejected = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(logins + 1)
+
+    def login():
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            check()
+        except HashingBusy:
+            with lock:
+                rejected.append(1)
+            return
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    stop, probe_latencies = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(stop, probe_latencies))
+    prober.start()
+    threads = [threading.Thread(target=login) for _ in range(logins)]
+    for t in threads:
+        t.start()
+    started = time.perf_counter()
+    barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return {
+        "logins_ok": len(latencies),
+        "logins_rejected": len(rejected),
+        "elapsed_s": elapsed,
+        "login_ms_p50": percentile(latencies, 0.50),
+        "login_ms_p99": percentile(latencies, 0.99),
+        "probe_ms_p50": statistics.median(probe_latencies) if probe_latencies else 0.0,
+        "probe_ms_p99": percentile(probe_latencies, 0.99),
+    }
+
+
+def run(logins, workers, max_pending):
+    stored = hash_password("correct horse")
+    inline = storm(logins, lambda: verify_password(stored, "correct horse"))
+    pool = HashingPool(workers=workers, max_pending=max_pending)
+    pooled = storm(logins, lambda: pool.verify(stored, "correct horse"))
+    pooled["pool"] = pool.stats()
+    pool.shutdown()
+    return {"logins": logins, "inline": inline, "pooled": pooled}
+
+
+def main():
+    defaults = HashingPool.__init__.__defaults__
+    parser = argparse.ArgumentParser(description="Password hashing login-storm load test")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=defaults[0])
+    parser.add_argument("--max-pending", type=int, default=defaults[1])
+    args = parser.parse_args()
+    print(json.dumps(run(args.logins, args.workers, args.max_pending), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Credential-stuffing simulation for the login rate limiter.
+#
+# --attackers threads send wrong passwords as fast as they can for
+# --seconds, spread over --targets accounts from a handful of client
+# addresses, first with no limiter and then with the app's login limits
+# (per identity and per client, checked before hashing). Reports how many
+# PBKDF2 hashes actually ran, the process CPU time they cost, and the cost
+# of a single allow() check in memory and in SQLite.
+#
+#   python -m benchmarks.bench_rate_limit --attackers 16 --seconds 15
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+from passwords import hash_password, verify_password
+from rate_limit import RateLimiter, create_rate_limit_schema
+
+# same numbers as RATE_LIMITS["login"] in app.py
+USER_LIMIT = (5, 300)
+CLIENT_LIMIT = (30, 300)
+CLIENTS = 4
+RTT = 0.005           # seconds per request as seen by a remote client
+
+
+def attack(attackers, seconds, targets, limited):
+    stored = hash_password("the real password")
+    user_limiter = RateLimiter("login-user", *USER_LIMIT)
+    client_limiter = RateLimiter("login-client", *CLIENT_LIMIT)
+    counts = {"attempts": 0, "hashed": 0, "refused": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def attacker(n):
+        i = 0
+        while not stop.is_set():
+            identity, client = f"user{(n * 7919 + i) % targets}", f"10.0.0.{n % CLIENTS}"
+            i += 1
+            if limited and not (user_limiter.allow(identity) and client_limiter.allow(client)):
+                with lock:
+                    counts["attempts"] += 1
+                    counts["refused"] += 1
+                # the attacker still pays a round trip per refused request; without
+                # this the simulated clients' own loop would dominate the CPU figure
+                time.sleep(RTT)
+                continue
+            verify_password(stored, f"guess{i}")
+            with lock:
+                counts["attempts"] += 1
+                counts["hashed"] += 1
+
+    threads = [threading.Thread(target=attacker, args=(n,)) for n in range(attackers)]
+    cpu_started, started = time.process_time(), time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return {**counts, "wall_s": wall, "cpu_s": cpu, "cpu_cores_busy": cpu / wall}
+
+
+def check_cost(n):
+    memory = RateLimiter("bench", 10, 1)
+    started = time.perf_counter()
+    for i in range(n):
+        memory.allow(f"user{i % 1000}")
+    memory_us = (time.perf_counter() - started) / n * 1e6
+
+    conn = sqlite3.connect(":memory:")
+    create_rate_limit_schema(conn)
+    persistent = RateLimiter("bench", 10, 1, persistent=True)
+    started = time.perf_counter()
+    for i in range(n):
+        persistent.allow(f"user{i % 1000}", conn)
+    sqlite_us = (time.perf_counter() - started) / n * 1e6
+    conn.close()
+    return {"memory_allow_us": memory_us, "sqlite_allow_us": sqlite_us}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login rate limiter under a simulated attack")
+    parser.add_argument("--attackers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--targets", type=int, default=50, help="accounts being guessed")
+    parser.add_argument("--checks", type=int, default=100_000, help="allow() calls for the per-check timing")
+    args = parser.parse_args()
+    report = {
+        "attackers": args.attackers,
+        "targets": args.targets,
+        "unlimited": attack(args.attackers, args.seconds, args.targets, limited=False),
+        "limited": attack(args.attackers, args.seconds, args.targets, limited=True),
+        **check_cost(args.checks),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
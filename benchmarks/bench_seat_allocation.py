@@ -0,0 +1,99 @@
+# Stress benchmark for seat_allocator.claim_seat.
+#
+# Fires thousands of simultaneous bookings at one train from many threads,
+# each with its own SQLite connection, then checks that no seat was handed
+# out twice and every reported booking matches the stored passenger.
+#
+#   python -m benchmarks.bench_seat_allocation --threads 64 --bookings 5000 --seats 3000
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from seat_allocator import AllocationStats, SeatAllocationBusy, claim_seat
+from seat_inventory import create_seat_inventory, init_seats
+
+SEAT_TYPES = ["Window", "Aisle", "Middle"]
+DEPARTURE_DATE = "2025-01-01"
+
+
+def seed(db_path, train_number, departure_date, seats):
+    conn = sqlite3.connect(db_path)
+    create_seat_inventory(conn)
+    init_seats(conn, train_number, departure_date, seats)
+    conn.close()
+
+
+def run(threads, bookings, seats, busy_timeout):
+    train_number = "BENCH1"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, train_number, DEPARTURE_DATE, seats)
+        stats = AllocationStats()
+        results = {}
+        results_lock = threading.Lock()
+        errors = []
+        start = threading.Barrier(threads)
+
+        def worker(worker_id):
+            conn = sqlite3.connect(db_path, timeout=busy_timeout)
+            start.wait()
+            for n in range(worker_id, bookings, threads):
+                name = f"P{n}"
+                try:
+                    seat = claim_seat(conn, train_number, DEPARTURE_DATE, SEAT_TYPES[n % 3], name, 30, "Other", stats=stats)
+                except SeatAllocationBusy:
+                    continue
+                except Exception as e:  # pragma: no cover - reported below
+                    errors.append(repr(e))
+                    continue
+                if seat is not None:
+                    with results_lock:
+                        results[name] = seat
+            conn.close()
+
+        stats.started = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        report = stats.snapshot()
+
+        conn = sqlite3.connect(db_path)
+        stored = dict(conn.execute(
+            "SELECT passenger_name, seat_number FROM seat_inventory "
+            "WHERE train_number=? AND departure_date=? AND booked=1", (train_number, DEPARTURE_DATE)))
+        conn.close()
+
+    handed_out = list(results.values())
+    report.update({
+        "threads": threads,
+        "seats": seats,
+        "errors": len(errors),
+        "double_booked": len(handed_out) - len(set(handed_out)),
+        "mismatched": sum(1 for name, seat in results.items() if stored.get(name) != seat),
+        "booked_rows": len(stored),
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent seat allocation stress test")
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--seats", type=int, default=3000)
+    parser.add_argument("--busy-timeout", type=float, default=0.0,
+                        help="sqlite busy timeout in seconds (0 surfaces every conflict to the retry loop)")
+    args = parser.parse_args()
+    report = run(args.threads, args.bookings, args.seats, args.busy_timeout)
+    print(json.dumps(report, indent=2))
+    ok = report["double_booked"] == 0 and report["mismatched"] == 0 and report["booked_rows"] == report["booked"]
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
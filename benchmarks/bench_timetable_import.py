@@ -0,0 +1,123 @@
+# Bulk timetable import vs. add_train() one run at a time.
+#
+# Writes a --runs row CSV (trains x consecutive dates, a few bad and
+# duplicate rows mixed in) to a temp dir, imports it into a fresh database
+# with timetable_import, then times --sample more runs through add_train()
+# on the same, now full-size, database for comparison. Checks that every
+# good row became a run with its seats, that bad rows and duplicates were
+# reported, and that importing the file again adds nothing. Peak RSS is
+# reported to show that memory doesn't follow the file size.
+#
+#   python -m benchmarks.bench_timetable_import --runs 100000 --sample 500
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import date, timedelta
+
+import reservations
+import timetable_import
+from db import get_pool
+from seat_inventory import SEATS_PER_TRAIN
+
+STATIONS = ["New Delhi", "Mumbai Central", "Howrah", "Chennai Central", "Bengaluru", "Secunderabad",
+            "Ahmedabad", "Pune", "Jaipur", "Lucknow", "Patna", "Bhopal", "Agra Cantt", "Gwalior"]
+DATES_PER_TRAIN = 100
+BAD_EVERY = 997          # every Nth row has an unparseable date
+DUPLICATE_EVERY = 1009   # every Nth row repeats the previous run
+
+
+def write_csv(path, runs):
+    """Stream ``runs`` rows to path -> (good runs, bad rows, duplicate rows)."""
+    first = date.today() + timedelta(days=1)
+    bad = duplicates = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(timetable_import.REQUIRED + timetable_import.OPTIONAL)
+        previous = None
+        for i in range(runs):
+            train = 10000 + i // DATES_PER_TRAIN
+            src, dst = STATIONS[train % len(STATIONS)], STATIONS[(train * 5 + 3) % len(STATIONS)]
+            if src == dst:
+                dst = STATIONS[(train + 1) % len(STATIONS)]
+            day = (first + timedelta(days=i % DATES_PER_TRAIN)).isoformat()
+            stops = f"{STATIONS[(train + 7) % len(STATIONS)]}, 120" if train % 4 == 0 else ""
+            row = [str(train), f"Express {train}", day, src, dst, "06:30", 600, stops]
+            if i % BAD_EVERY == BAD_EVERY - 1:
+                row[2] = "31/02/2030"
+                bad += 1
+            elif i % DUPLICATE_EVERY == DUPLICATE_EVERY - 1 and previous:
+                row = previous
+                duplicates += 1
+            writer.writerow(row)
+            previous = row
+    return runs - bad - duplicates, bad, duplicates
+
+
+def one_by_one(conn, sample):
+    first = date.today() + timedelta(days=1)
+    started = time.perf_counter()
+    for i in range(sample):
+        src, dst = random.sample(STATIONS, 2)
+        # train numbers the generated file doesn't use
+        reservations.add_train(conn, f"A{i // 10}", f"Express A{i}", first + timedelta(days=i % 10),
+                               src, dst, travel_minutes=600)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk CSV timetable import throughput")
+    parser.add_argument("--runs", type=int, default=100_000, help="rows in the generated CSV")
+    parser.add_argument("--sample", type=int, default=500, help="runs added one at a time for comparison")
+    parser.add_argument("--chunk-rows", type=int, default=timetable_import.CHUNK_ROWS)
+    parser.add_argument("--commit-rows", type=int, default=timetable_import.COMMIT_ROWS)
+    args = parser.parse_args()
+    random.seed(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "timetable.csv")
+        good, bad, duplicates = write_csv(csv_path, args.runs)
+        db_path = os.path.join(tmp, "import.db")
+        reservations.init(db_path)
+        pool = get_pool(db_path)
+        with pool.connection() as conn:
+            report = timetable_import.import_timetable(conn, csv_path, chunk_rows=args.chunk_rows,
+                                                       commit_rows=args.commit_rows)
+            again = timetable_import.import_timetable(conn, csv_path, chunk_rows=args.chunk_rows,
+                                                      commit_rows=args.commit_rows)
+            trains = conn.execute("SELECT COUNT(*) FROM trains").fetchone()[0]
+            seats = conn.execute("SELECT COUNT(*) FROM seat_inventory").fetchone()[0]
+            found = reservations.search_route(conn, STATIONS[0], STATIONS[3])
+            single_s = one_by_one(conn, args.sample) if args.sample else 0.0
+        pool.close()
+        file_mb = os.path.getsize(csv_path) / 1e6
+
+    result = {
+        "csv_mb": file_mb,
+        "import": {"rows": report.rows, "imported": report.imported, "invalid": report.invalid,
+                   "duplicates": report.duplicates, "seconds": report.seconds,
+                   "rows_per_s": report.rows_per_second, "first_errors": report.errors[:3]},
+        "reimport": {"imported": again.imported, "duplicates": again.duplicates, "seconds": again.seconds},
+        "add_train": {"runs": args.sample, "seconds": single_s,
+                      "runs_per_s": args.sample / single_s if single_s else 0.0},
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    checks = {
+        "all_good_rows_imported": report.imported == good == trains,
+        "seats_created": seats == good * SEATS_PER_TRAIN,
+        "bad_rows_reported": report.invalid == bad,
+        "duplicates_skipped": report.duplicates == duplicates,
+        "reimport_adds_nothing": again.imported == 0 and again.duplicates == good + duplicates,
+        "searchable": bool(found) or good < 1000,
+    }
+    result["checks"] = checks
+    print(json.dumps(result, indent=2))
+    raise SystemExit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# View Trains cost per rerun over a synthetic timetable.
+#
+#   full   - what both tabs did on every rerun: read every train in order
+#   offset - one page via LIMIT/OFFSET, for comparison with keyset paging
+#   keyset - one page via train_listing.fetch_page (uncached)
+#   cached - one page via listing_cache, as a rerun on the same page sees it
+# Pages are timed at the start and deep in the table. Also checks that
+# walking every keyset page returns exactly the full ordered listing.
+#
+#   python -m benchmarks.bench_train_listing --rows 100000 --reps 50
+import argparse
+import json
+import sqlite3
+import statistics
+import time
+from datetime import date, timedelta
+
+from train_listing import PAGE_SIZE, ListingCache, create_listing_schema, fetch_page
+from train_search import TRAIN_COLUMNS
+
+FULL_SQL = f"SELECT {TRAIN_COLUMNS} FROM trains ORDER BY departure_date ASC, train_number ASC"
+
+
+def seed(conn, rows):
+    conn.execute('''CREATE TABLE trains
+                    (train_number TEXT, train_name TEXT, departure_date TEXT, starting_destination TEXT, ending_destination TEXT)''')
+    start = date(2025, 1, 1)
+    conn.executemany("INSERT INTO trains VALUES (?, ?, ?, ?, ?)",
+                     ((str(10000 + i % 5000), f"Express {i % 5000}", (start + timedelta(days=i // 5000)).isoformat(),
+                       "New Delhi", "Howrah") for i in range(rows)))
+    create_listing_schema(conn)
+
+
+def timed(fn, reps):
+    times = []
+    for _ in range(reps):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def walk(conn):
+    rows, after = fetch_page(conn)
+    out = list(rows)
+    while after is not None:
+        rows, after = fetch_page(conn, after=after)
+        out.extend(rows)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paged, cached train listings vs. full table reads")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--reps", type=int, default=50)
+    args = parser.parse_args()
+    conn = sqlite3.connect(":memory:")
+    seed(conn, args.rows)
+
+    deep = args.rows // PAGE_SIZE * PAGE_SIZE // 2
+    deep_after = conn.execute(
+        "SELECT departure_date, train_number, rowid FROM trains ORDER BY departure_date, train_number, rowid "
+        "LIMIT 1 OFFSET ?", (deep - 1,)).fetchone()
+    cache = ListingCache()
+    report = {"rows": args.rows, "page_size": PAGE_SIZE, "ms_median": {
+        "full": timed(lambda: conn.execute(FULL_SQL).fetchall(), max(1, args.reps // 10)),
+        "offset_first": timed(lambda: conn.execute(FULL_SQL + " LIMIT ?", (PAGE_SIZE,)).fetchall(), args.reps),
+        "offset_deep": timed(lambda: conn.execute(FULL_SQL + " LIMIT ? OFFSET ?", (PAGE_SIZE, deep)).fetchall(),
+                             args.reps),
+        "keyset_first": timed(lambda: fetch_page(conn), args.reps),
+        "keyset_deep": timed(lambda: fetch_page(conn, after=deep_after), args.reps),
+        "cached_deep": timed(lambda: cache.page(conn, after=deep_after), args.reps),
+        "keyset_date_range": timed(lambda: fetch_page(conn, "2025-01-10", "2025-01-12"), args.reps),
+    }}
+    full = conn.execute(f"SELECT {TRAIN_COLUMNS} FROM trains ORDER BY departure_date, train_number, rowid").fetchall()
+    report["walk_matches_full"] = walk(conn) == full
+    report["cache"] = cache.stats()
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["walk_matches_full"] else 1)
+
+
+if __name__ == "__main__":
+    main()
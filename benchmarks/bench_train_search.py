@@ -0,0 +1,88 @@
+# Train search over a synthetic timetable: legacy '%x%' LIKE scans vs. the
+# indexed exact/prefix path in train_search.
+#
+#   python -m benchmarks.bench_train_search --rows 100000 --queries 500
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from train_search import TRAIN_COLUMNS, create_search_schema, search_by_route, search_by_train_number
+
+CITIES = ["New Delhi", "Mumbai Central", "Howrah", "Chennai Central", "Bengaluru", "Secunderabad",
+          "Ahmedabad", "Pune", "Jaipur", "Lucknow", "Patna", "Bhopal", "Guwahati", "Kochi", "Amritsar"]
+
+
+def stations(n):
+    # CITIES plus numbered halts so the timetable has a realistic spread of stations
+    return CITIES + [f"{random.choice(CITIES).split()[0]} Halt {i}" for i in range(n - len(CITIES))]
+
+
+def seed(conn, rows, n_stations):
+    conn.execute('''CREATE TABLE trains
+                    (train_number TEXT, train_name TEXT, departure_date TEXT, starting_destination TEXT, ending_destination TEXT)''')
+    names = stations(n_stations)
+    start = date(2025, 1, 1)
+    batch = []
+    for i in range(rows):
+        src, dst = random.sample(names, 2)
+        batch.append((str(10000 + i % 20000), f"Express {i % 20000}",
+                      (start + timedelta(days=i // 20000 * 7 + i % 7)).isoformat(), src, dst))
+    conn.executemany("INSERT INTO trains VALUES (?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    return batch
+
+
+def legacy_route(conn, src, dst, dep_date):
+    return conn.execute(
+        f"SELECT {TRAIN_COLUMNS} FROM trains WHERE starting_destination LIKE ? AND ending_destination LIKE ? "
+        f"AND departure_date=?", (f"%{src}%", f"%{dst}%", dep_date)).fetchall()
+
+
+def legacy_number(conn, train_no):
+    return conn.execute(f"SELECT {TRAIN_COLUMNS} FROM trains WHERE train_number LIKE ?",
+                        (f"%{train_no}%",)).fetchall()
+
+
+def timed(fn, queries):
+    started = time.perf_counter()
+    found = sum(len(fn(*q)) for q in queries)
+    elapsed = time.perf_counter() - started
+    return {"queries": len(queries), "rows_found": found,
+            "total_s": elapsed, "per_query_ms": elapsed / len(queries) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed vs. LIKE train search")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        batch = seed(conn, args.rows, args.stations)
+        sample = random.sample(batch, args.queries)
+        route_queries = [(src, dst, d) for _, _, d, src, dst in sample]
+        number_queries = [(num,) for num, _, _, _, _ in sample]
+
+        report = {"rows": args.rows,
+                  "legacy_route": timed(lambda *q: legacy_route(conn, *q), route_queries),
+                  "legacy_number": timed(lambda *q: legacy_number(conn, *q), number_queries)}
+        started = time.perf_counter()
+        create_search_schema(conn)
+        report["index_build_s"] = time.perf_counter() - started
+        report["indexed_route"] = timed(lambda *q: search_by_route(conn, *q), route_queries)
+        report["indexed_number"] = timed(lambda *q: search_by_train_number(conn, *q), number_queries)
+        conn.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Benchmark for waitlist promotion on cancellation.
+#
+# Sells out one train run, queues --depth waiting passengers behind it, then
+# cancels tickets one transaction at a time and finally releases a whole
+# group PNR in a single transaction. Each release promotes the queue head
+# in the same transaction. Reports per-promotion latency and checks that
+# promotions happen strictly in request order with the RAC tier kept full.
+#
+#   python -m benchmarks.bench_waitlist --depth 10000 --seats 500
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from bookings import cancel_booking, create_bookings_schema, record_booking
+from seat_allocator import release_seat
+from seat_inventory import categorize_seat, create_seat_inventory, init_seats
+from waitlist import RAC, RAC_SLOTS, WAITING, create_waitlist_schema, join_waitlist, promote
+
+TRAIN = "BENCH1"
+DEPARTURE_DATE = "2025-01-01"
+GROUP_PNR = "GROUP"
+
+
+def seed(conn, seats, depth, group_size):
+    create_seat_inventory(conn)
+    create_bookings_schema(conn)
+    create_waitlist_schema(conn)
+    init_seats(conn, TRAIN, DEPARTURE_DATE, seats)
+    conn.execute("UPDATE seat_inventory SET booked=1, occupied_mask=-1, passenger_name='P' WHERE train_number=?", (TRAIN,))
+    for seat in range(1, seats + 1):
+        pnr = GROUP_PNR if seat > seats - group_size else f"S{seat}"
+        record_booking(conn, pnr, "bench", TRAIN, DEPARTURE_DATE, seat, categorize_seat(seat), ("P", 30, "Other"))
+    conn.commit()
+    started = time.perf_counter()
+    for n in range(depth):
+        join_waitlist(conn, f"W{n}", "bench", TRAIN, DEPARTURE_DATE, None, (f"W{n}", 30, "Other"))
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def release(conn, seat, promoted):
+    def on_release(conn, seat):
+        cancel_booking(conn, TRAIN, DEPARTURE_DATE, seat)
+        head = promote(conn, TRAIN, DEPARTURE_DATE, seat)
+        if head:
+            promoted.append(head[0])
+        return head is not None
+    return release_seat(conn, TRAIN, DEPARTURE_DATE, seat, on_release=on_release, commit=False)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def run(depth, seats, group_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        join_s = seed(conn, seats, depth, group_size)
+
+        promoted = []
+        single = []
+        for seat in range(1, seats - group_size + 1):
+            started = time.perf_counter()
+            release(conn, seat, promoted)
+            conn.commit()
+            single.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        for (seat,) in conn.execute("SELECT seat_number FROM bookings WHERE pnr=? AND status='CONFIRMED'",
+                                    (GROUP_PNR,)).fetchall():
+            release(conn, seat, promoted)
+        conn.commit()
+        bulk_ms = (time.perf_counter() - started) * 1000
+
+        rac_waiting = conn.execute("SELECT COUNT(*) FROM waitlist WHERE tier=? AND status=?", (RAC, WAITING)).fetchone()[0]
+        still_waiting = conn.execute("SELECT COUNT(*) FROM waitlist WHERE status=?", (WAITING,)).fetchone()[0]
+        booked_rows = conn.execute("SELECT COUNT(*) FROM bookings WHERE status='CONFIRMED'").fetchone()[0]
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM waitlist WHERE train_number=? AND departure_date=? AND tier=? "
+            "AND status='WAITING' ORDER BY id LIMIT 1", (TRAIN, DEPARTURE_DATE, RAC)).fetchall()
+        conn.close()
+
+    expected = min(seats, depth)
+    return {
+        "depth": depth,
+        "seats": seats,
+        "group_size": group_size,
+        "join_us_per_entry": join_s / depth * 1e6 if depth else 0.0,
+        "single_cancel_ms_p50": statistics.median(single) if single else 0.0,
+        "single_cancel_ms_p99": percentile(single, 0.99) if single else 0.0,
+        "bulk_cancel_ms": bulk_ms,
+        "bulk_cancel_ms_per_seat": bulk_ms / group_size if group_size else 0.0,
+        "promoted": len(promoted),
+        "in_request_order": promoted == [f"W{n}" for n in range(expected)],
+        "rac_waiting": rac_waiting,
+        "rac_full": rac_waiting == min(RAC_SLOTS, still_waiting),
+        "confirmed_tickets": booked_rows,
+        "head_lookup_plan": plan[0][-1] if plan else "",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Waitlist promotion benchmark")
+    parser.add_argument("--depth", type=int, default=10000, help="waiting passengers queued behind the sold-out run")
+    parser.add_argument("--seats", type=int, default=500)
+    parser.add_argument("--group-size", type=int, default=50, help="seats released together under one PNR")
+    args = parser.parse_args()
+    report = run(args.depth, args.seats, min(args.group_size, args.seats))
+    print(json.dumps(report, indent=2))
+    # every seat was released, so the only live tickets left are the promoted ones
+    ok = report["in_request_order"] and report["rac_full"] and report["confirmed_tickets"] == report["promoted"]
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# Load test for the HTTP API (api.py).
+#
+# --concurrency clients, each on one keep-alive connection, send a weighted
+# mix of requests for --seconds and the script reports requests per second,
+# status codes and latency percentiles per endpoint. Train runs are read from
+# --db. With --spawn the script seeds a temporary database, starts
+# "uvicorn api:app" on it and stops it afterwards; otherwise point --url at
+# a running server that uses --db.
+#
+#   python -m benchmarks.load_test_api --spawn --concurrency 64 --seconds 10
+#   python -m benchmarks.load_test_api --url http://127.0.0.1:8000 --db railway_system.db
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+API_KEY = "load-test"
+DEFAULT_MIX = "availability=70,search=15,seats=10,book=5"
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def seed(path, trains, dates):
+    import reservations
+    from db import get_pool
+    reservations.init(path)
+    start = date.today() + timedelta(days=1)
+    with get_pool(path).connection() as conn:
+        for t in range(trains):
+            for d in range(dates):
+                reservations.add_train(conn, str(12000 + t), f"Express {t}", start + timedelta(days=d),
+                                       f"Station {t % 20}", f"Station {(t + 7) % 20}")
+    get_pool(path).close()
+
+
+def load_runs(path, limit=2000):
+    conn = sqlite3.connect(path)
+    runs = conn.execute("SELECT train_number, departure_date, starting_destination, ending_destination "
+                        "FROM trains LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    if not runs:
+        raise SystemExit(f"No trains in {path}; seed it or use --spawn.")
+    return runs
+
+
+def make_request(kind, runs, n):
+    train, day, src, dst = random.choice(runs)
+    if kind == "availability":
+        return "GET", "/availability?" + urlencode({"train": train, "date": day}), b""
+    if kind == "seats":
+        return "GET", "/seats?" + urlencode({"train": train, "date": day}), b""
+    if kind == "search":
+        if n % 2:
+            return "GET", "/trains?" + urlencode({"number": train}), b""
+        return "GET", "/trains?" + urlencode({"from": src, "to": dst, "date": day}), b""
+    if kind == "book":
+        body = {"train_number": train, "departure_date": day, "name": f"Load {n}", "age": 30, "gender": "Female",
+                "seat_type": random.choice(["Window", "Aisle", "Middle"]), "waitlist": False}
+        return "POST", "/bookings", json.dumps(body).encode()
+    raise ValueError(f"unknown request kind {kind!r}")
+
+
+async def client(host, port, deadline, mix, runs, results):
+    kinds, weights = list(mix), list(mix.values())
+    reader = writer = None
+    n = 0
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        kind = random.choices(kinds, weights)[0]
+        method, target, body = make_request(kind, runs, n)
+        n += 1
+        request = (f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nX-API-Key: {API_KEY}\r\n"
+                   f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+        started = time.perf_counter()
+        try:
+            writer.write(request)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length, close = 0, False
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                elif name.lower() == "connection" and value.strip().lower() == "close":
+                    close = True
+            await reader.readexactly(length)
+        except (OSError, IndexError, ValueError, asyncio.IncompleteReadError):
+            results.append((kind, None, time.perf_counter() - started))
+            writer.close()
+            writer = None
+            continue
+        results.append((kind, status, time.perf_counter() - started))
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))] * 1000
+
+
+def summarize(results, elapsed):
+    report = {"requests": len(results), "elapsed_s": elapsed, "rps": len(results) / elapsed, "endpoints": {}}
+    for kind in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == kind]
+        latencies = sorted(r[2] for r in rows)
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        report["endpoints"][kind] = {"requests": len(rows), "rps": len(rows) / elapsed, "statuses": statuses,
+                                     "p50_ms": percentile(latencies, 0.50), "p90_ms": percentile(latencies, 0.90),
+                                     "p99_ms": percentile(latencies, 0.99)}
+    latencies = sorted(r[2] for r in results)
+    if latencies:
+        report.update(p50_ms=percentile(latencies, 0.50), p90_ms=percentile(latencies, 0.90),
+                      p99_ms=percentile(latencies, 0.99))
+    # a 400 means the script sent something the API rejects, so the numbers aren't booking numbers
+    report["errors"] = sum(1 for r in results if r[1] is None or r[1] >= 500 or r[1] == 400)
+    return report
+
+
+async def run(url, concurrency, seconds, mix, runs):
+    parts = urlsplit(url)
+    results = []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(client(parts.hostname, parts.port or 80, deadline, mix, runs, results)
+                           for _ in range(concurrency)))
+    return summarize(results, time.perf_counter() - started)
+
+
+def wait_for_server(url, proc, timeout=30):
+    parts = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"API server exited with code {proc.returncode}")
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port), 1))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("API server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RPS and latency of the booking HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--db", default=os.environ.get("ERAIL_DB", "railway_system.db"))
+    parser.add_argument("--spawn", action="store_true", help="seed a temp db and start uvicorn api:app on it")
+    parser.add_argument("--trains", type=int, default=50, help="trains to seed with --spawn")
+    parser.add_argument("--dates", type=int, default=10, help="departure dates per train with --spawn")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weights per request kind")
+    args = parser.parse_args()
+
+    proc = tmp = None
+    db_path = args.db
+    if args.spawn:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "load.db")
+        seed(db_path, args.trains, args.dates)
+        port = str(urlsplit(args.url).port)
+        env = {**os.environ, "ERAIL_DB": db_path, "ERAIL_API_KEYS": f"{API_KEY}=loadtest"}
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", port, "--log-level", "warning"],
+                                env=env)
+        wait_for_server(args.url, proc)
+    try:
+        report = asyncio.run(run(args.url, args.concurrency, args.seconds, parse_mix(args.mix), load_runs(db_path)))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if tmp is not None:
+            tmp.cleanup()
+    report.update(concurrency=args.concurrency, mix=args.mix)
+    print(json.dumps(report, indent=2))
+    raise SystemExit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# Benchmark suite for the reservation workflows.
+#
+# Seeds a temporary database with --trains x --dates runs (50 seats each) and
+# --users verified users, then measures search, seat map, booking,
+# cancellation, login and signup - first on one thread, then on --threads
+# threads - through the same reservations / accounts calls the app and the
+# HTTP API use. Everything runs offline: the database is a temp file and
+# verification emails go through the outbox to an in-process SMTP sink.
+# The JSON report is meant to be kept and diffed between releases.
+#
+#   python -m benchmarks.suite --trains 50 --dates 30 --users 200 --threads 8 --out bench.json
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import accounts
+import passwords
+import reservations
+from benchmarks.bench_mailer import SMTPSink
+from db import get_pool
+from mailer import SENT, MailWorker, outbox_counts
+from seat_inventory import SEATS_PER_TRAIN, seat_map_cache
+
+PASSWORD = "bench-password"
+STATIONS = ["New Delhi", "Mumbai Central", "Howrah", "Chennai Central", "Bengaluru", "Secunderabad",
+            "Ahmedabad", "Pune", "Jaipur", "Lucknow", "Patna", "Bhopal"]
+SCENARIOS = ("search", "seat_map", "book", "cancel", "login", "signup")
+# any other status from these is a failure: the run measured an error path, not the workflow
+EXPECTED = {"book": {reservations.BOOKED}, "cancel": {reservations.CANCELLED}}
+
+
+class Suite:
+    def __init__(self, path, trains, dates, users, ops, auth_ops):
+        self.path = path
+        self.pool = get_pool(path)
+        self.trains = trains
+        self.dates = dates
+        self.users = users
+        self.ops = ops
+        self.auth_ops = auth_ops
+        self.runs = []
+        self.pnrs = []
+        self._lock = threading.Lock()
+        self._signups = 0
+        self._logins = 0
+
+    # ---- data ----
+    def seed(self):
+        started = time.perf_counter()
+        reservations.init(self.path)
+        first = date.today() + timedelta(days=1)
+        with self.pool.connection() as conn:
+            for t in range(self.trains):
+                src, dst = random.sample(STATIONS, 2)
+                for d in range(self.dates):
+                    day = (first + timedelta(days=d)).isoformat()
+                    reservations.add_train(conn, str(12000 + t), f"Express {t}", day, src, dst)
+                    self.runs.append((str(12000 + t), day, src, dst))
+            # one hash for everyone: seeding shouldn't take users x hash time
+            hashed = passwords.hash_password(PASSWORD)
+            conn.executemany("INSERT INTO users (username, password, email, email_verified) VALUES (?, ?, ?, 1)",
+                             ((f"user{i}", hashed, f"user{i}@example.com") for i in range(self.users)))
+            conn.commit()
+        return {"elapsed_s": time.perf_counter() - started, "runs": len(self.runs),
+                "seats": len(self.runs) * SEATS_PER_TRAIN, "users": self.users}
+
+    # ---- one operation each; return a status for the report ----
+    def search(self, i):
+        train, day, src, dst = random.choice(self.runs)
+        with self.pool.connection() as conn:
+            if i % 2:
+                rows = reservations.search_train_number(conn, train)
+            else:
+                rows = reservations.search_route(conn, src, dst, day)
+        return "found" if rows else "empty"
+
+    def seat_map(self, i):
+        train, day, _, _ = random.choice(self.runs)
+        with self.pool.connection() as conn:
+            return "ok" if reservations.seat_map(conn, train, day) else "empty"
+
+    def book(self, i):
+        train, day, _, _ = random.choice(self.runs)
+        with self.pool.connection() as conn:
+            result = reservations.book(conn, "bench", train, day, (f"Passenger {i}", 30, "Female"),
+                                       random.choice(reservations.SEAT_TYPES), waitlist=False)
+        if result.pnr:
+            with self._lock:
+                self.pnrs.append(result.pnr)
+        return result.status
+
+    def cancel(self, i):
+        with self._lock:
+            pnr = self.pnrs.pop() if self.pnrs else None
+        if pnr is None:
+            return "nothing-booked"
+        with self.pool.connection() as conn:
+            return reservations.cancel_pnr(conn, "bench", pnr).status
+
+    def login(self, i):
+        # each user at most once per phase pair, so the per-user limit (5) is not what is measured
+        with self._lock:
+            n = self._logins
+            self._logins += 1
+        # and each from its own address, so the per-client limit isn't either
+        ok, role, _ = accounts.login(f"user{n % self.users}", PASSWORD, client=f"10.1.{n // 250}.{n % 250}",
+                                     connect=self.pool.connection)
+        return role if ok else "refused"
+
+    def signup(self, i):
+        with self._lock:
+            n = self._signups
+            self._signups += 1
+        ok, _ = accounts.signup(f"new{n}", PASSWORD, f"new{n}@example.com", connect=self.pool.connection)
+        return "created" if ok else "refused"
+
+    # ---- measuring ----
+    def measure(self, scenario, threads):
+        op = getattr(self, scenario)
+        n = self.auth_ops if scenario in ("login", "signup") else self.ops
+        latencies, statuses = [], {}
+
+        def work(i):
+            started = time.perf_counter()
+            try:
+                status = op(i)
+            except Exception as e:
+                status = f"error: {type(e).__name__}"
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        if threads == 1:
+            for i in range(n):
+                work(i)
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(work, range(n)))
+        wall = time.perf_counter() - started
+        latencies.sort()
+        return {"ops": n, "threads": threads, "elapsed_s": wall, "ops_per_s": n / wall if wall else 0.0,
+                "p50_ms": statistics.median(latencies) * 1000,
+                "p90_ms": latencies[int(len(latencies) * 0.90)] * 1000,
+                "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+                "statuses": statuses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reservation workflow benchmarks (offline, temp database)")
+    parser.add_argument("--trains", type=int, default=50)
+    parser.add_argument("--dates", type=int, default=30, help="departure dates per train")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=2000, help="operations per scenario and phase")
+    parser.add_argument("--auth-ops", type=int, default=40, help="logins / signups per phase (each hashes)")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pbkdf2-iterations", type=int, default=None,
+                        help="hash cost for this run (default: the app's policy)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    if args.pbkdf2_iterations:
+        passwords.configure(passwords.PBKDF2, i=args.pbkdf2_iterations)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    sink = SMTPSink(latency=0, drop_every=0)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        suite = Suite(path, args.trains, args.dates, args.users, args.ops, args.auth_ops)
+        report = {
+            "params": {k: v for k, v in vars(args).items() if k != "out"},
+            "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                            "cpus": os.cpu_count(), "password_policy": passwords.current_policy()},
+            "seed": suite.seed(),
+        }
+        mailer = MailWorker({"host": "127.0.0.1", "port": sink.server_address[1], "sender": "bench@example.com",
+                             "starttls": False}, path, poll_interval=0.05)
+        mailer.start()
+        for phase, threads in (("single", 1), ("concurrent", args.threads)):
+            report[phase] = {scenario: suite.measure(scenario, threads) for scenario in scenarios}
+        with suite.pool.connection() as conn:
+            deadline = time.perf_counter() + 30
+            while outbox_counts(conn).get(SENT, 0) < suite._signups and time.perf_counter() < deadline:
+                time.sleep(0.05)
+            report["mail"] = {"outbox": outbox_counts(conn), "delivered": sink.delivered,
+                              "smtp_connections": sink.connections}
+        mailer.stop()
+        report["caches"] = {"seat_map": seat_map_cache.stats(), "hashing": passwords.hashing_pool.stats()}
+        suite.pool.close()
+    sink.shutdown()
+    sink.server_close()
+
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    errors = sum(n for phase in ("single", "concurrent") for scenario, s in report[phase].items()
+                 for status, n in s["statuses"].items()
+                 if status.startswith("error") or status not in EXPECTED.get(scenario, {status}))
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
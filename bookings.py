@@ -0,0 +1,101 @@
+# bookings.py
+# One row per ticket, grouped under a PNR.
+#
+# seat_inventory only says who sits in a seat right now; bookings keeps the
+# ticket itself (owner, run, seat, stops, status, timestamps) so "my bookings"
+# and PNR status are single index lookups. Rows are written by the seat
+# allocator's on_claim / on_release callbacks, i.e. in the same transaction
+# as the seat change. Cancelled tickets stay in the table with status
+# CANCELLED.
+import secrets
+import time
+
+CONFIRMED = "CONFIRMED"
+CANCELLED = "CANCELLED"
+
+PNR_DIGITS = 10
+
+BOOKING_COLUMNS = ("pnr, train_number, departure_date, seat_number, seat_type, passenger_name, passenger_age, "
+                   "passenger_gender, from_station, to_station, status, created_ts, updated_ts")
+
+
+def create_bookings_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS bookings (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        pnr TEXT NOT NULL,
+                        username TEXT,
+                        train_number TEXT NOT NULL,
+                        departure_date TEXT NOT NULL,
+                        seat_number INTEGER NOT NULL,
+                        seat_type TEXT,
+                        passenger_name TEXT,
+                        passenger_age INTEGER,
+                        passenger_gender TEXT,
+                        from_stop INTEGER,
+                        to_stop INTEGER,
+                        from_station TEXT,
+                        to_station TEXT,
+                        status TEXT NOT NULL DEFAULT 'CONFIRMED',
+                        created_ts INTEGER NOT NULL,
+                        updated_ts INTEGER NOT NULL
+                    )''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_bookings_pnr ON bookings (pnr)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (username, created_ts)''')
+    # finds the live ticket on a seat when it is cancelled
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_bookings_seat
+                    ON bookings (train_number, departure_date, seat_number, status)''')
+    conn.commit()
+
+
+def new_pnr(conn) -> str:
+    while True:
+        pnr = str(secrets.randbelow(9 * 10 ** (PNR_DIGITS - 1)) + 10 ** (PNR_DIGITS - 1))
+        if not conn.execute("SELECT 1 FROM bookings WHERE pnr=? LIMIT 1", (pnr,)).fetchone():
+            return pnr
+
+
+def record_booking(conn, pnr, username, train_number, departure_date, seat_number, seat_type, passenger,
+                   from_stop=None, to_stop=None, from_station=None, to_station=None):
+    """Insert one CONFIRMED ticket (no commit). ``passenger`` is (name, age, gender)."""
+    now = int(time.time())
+    name, age, gender = passenger[:3]
+    conn.execute(
+        "INSERT INTO bookings (pnr, username, train_number, departure_date, seat_number, seat_type, passenger_name, "
+        "passenger_age, passenger_gender, from_stop, to_stop, from_station, to_station, status, created_ts, updated_ts) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (pnr, username, train_number, departure_date, int(seat_number), seat_type, name, int(age), gender,
+         from_stop, to_stop, from_station, to_station, CONFIRMED, now, now))
+
+
+def cancel_booking(conn, train_number, departure_date, seat_number, from_stop=None):
+    """Mark the live ticket on a seat CANCELLED (no commit). Returns its PNR, or None.
+
+    ``from_stop`` picks the part-route ticket boarding there; None means the
+    full-route ticket.
+    """
+    row = conn.execute(
+        "UPDATE bookings SET status=?, updated_ts=? WHERE id = ("
+        "SELECT id FROM bookings WHERE train_number=? AND departure_date=? AND seat_number=? AND status=? "
+        "AND from_stop IS ? ORDER BY id LIMIT 1) RETURNING pnr",
+        (CANCELLED, int(time.time()), train_number, departure_date, int(seat_number), CONFIRMED, from_stop)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def cancel_run_bookings(conn, train_number, departure_date) -> int:
+    """Cancel every live ticket on a train run that is being removed (no commit)."""
+    cur = conn.execute(
+        "UPDATE bookings SET status=?, updated_ts=? WHERE train_number=? AND departure_date=? AND status=?",
+        (CANCELLED, int(time.time()), train_number, departure_date, CONFIRMED))
+    return cur.rowcount
+
+
+def bookings_for_pnr(conn, pnr: str):
+    return conn.execute(
+        f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE pnr=? ORDER BY id", (pnr.strip(),)).fetchall()
+
+
+def bookings_for_user(conn, username: str, limit: int = 200):
+    return conn.execute(
+        f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE username=? ORDER BY created_ts DESC, id DESC LIMIT ?",
+        (username, limit)).fetchall()
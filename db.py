@@ -0,0 +1,110 @@
+# db.py
+# SQLite connection pool shared by every Streamlit session.
+#
+# Instead of one module-global connection/cursor used by all session threads,
+# each data-access call checks a connection out of a small bounded pool and
+# returns it afterwards. Connections run in WAL mode so readers don't block
+# the writer, and wait on busy locks instead of failing immediately.
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from instrumentation import connection_factory
+
+DB_PATH = "railway_system.db"
+POOL_SIZE = 8
+CHECKOUT_TIMEOUT = 10  # seconds to wait for a free connection
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # safe with WAL, one fsync per checkpoint instead of per commit
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",    # ~16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    # traced connections (instrumentation.py) only while metrics are enabled
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=5, factory=connection_factory())
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection was returned to the pool in time."""
+
+
+class ConnectionPool:
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = CHECKOUT_TIMEOUT) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                make_new = True
+            else:
+                make_new = False
+        if make_new:
+            try:
+                return connect(self.path)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"No database connection available after {timeout}s.")
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            # never hand a half-finished transaction to the next caller
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str = DB_PATH) -> ConnectionPool:
+    """Process-wide pool for ``path`` (survives Streamlit reruns)."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+def get_conn():
+    """``with get_conn() as conn:`` checks a connection out of the default pool."""
+    return get_pool().connection()
@@ -0,0 +1,262 @@
+# instrumentation.py
+# Opt-in timing of hot paths and SQL statements, exported as Prometheus text.
+#
+# Off by default. Turn it on with ERAIL_METRICS=1 in the environment or
+# "[metrics] enabled = true" in secrets.toml (app.py calls configure()).
+#
+#   @timed()                      per-function wall time histogram
+#   def book_ticket(...): ...
+#
+#   with span("tab Book Ticket"):  the same for a block
+#       ...
+#
+# While disabled, a timed() function costs one flag check per call and span()
+# hands back a shared no-op context manager. SQL is traced only on connections
+# opened while enabled: db.connect() asks connection_factory() for the class,
+# and TracedConnection times every execute and counts the rows written or
+# fetched. Statements are keyed by their parameterised text (whitespace folded,
+# repeated "(?, ?)" groups collapsed), never by bound values, so passwords and
+# names don't end up in metrics. (sqlite3's set_trace_callback only reports the
+# expanded SQL text, with no duration or row count, which is why the cursor is
+# wrapped instead.)
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_STATEMENTS = 500      # distinct SQL texts tracked; the rest are counted as "other"
+STATEMENT_CHARS = 200
+
+_enabled = os.environ.get("ERAIL_METRICS", "").strip().lower() in ("1", "true", "yes", "on")
+_lock = threading.Lock()
+_timings = {}             # name -> [calls, seconds, max seconds, errors, per-bucket counts]
+_statements = {}          # statement key -> [calls, seconds, rows]
+_keys = {}                # raw sql -> statement key
+_NOOP = nullcontext()
+
+
+def configure(enabled: bool):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _statements.clear()
+
+
+# ---- functions and blocks ----
+def record(name: str, seconds: float, error: bool = False):
+    with _lock:
+        entry = _timings.get(name)
+        if entry is None:
+            entry = _timings[name] = [0, 0.0, 0.0, 0, [0] * (len(BUCKETS) + 1)]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3] += error
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[4][i] += 1
+                break
+        else:
+            entry[4][-1] += 1
+
+
+def timed(name: str = None):
+    """Decorator recording each call's wall time under ``name`` (default: the function name)."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                record(label, time.perf_counter() - started, error)
+        return wrapper
+    return decorate
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # control-flow exceptions (Streamlit's stop/rerun) derive from BaseException, not errors
+        record(self.name, time.perf_counter() - self.started,
+               exc_type is not None and issubclass(exc_type, Exception))
+        return False
+
+
+def span(name: str):
+    """``with span("name"):`` times the block; a no-op while disabled."""
+    return _Span(name) if _enabled else _NOOP
+
+
+# ---- SQL ----
+def statement_key(sql: str) -> str:
+    key = _keys.get(sql)
+    if key is None:
+        key = " ".join(sql.split())
+        key = re.sub(r"\?(?:\s*,\s*\?)+", "?, …", key)
+        key = re.sub(r"(\([^()]*\))(?:\s*,\s*\1)+", r"\1, …", key)
+        key = key[:STATEMENT_CHARS]
+        if len(_keys) < MAX_STATEMENTS * 4:
+            _keys[sql] = key
+    return key
+
+
+def record_sql(key: str, seconds: float, rows: int = 0, calls: int = 1):
+    with _lock:
+        entry = _statements.get(key)
+        if entry is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                key = "other"
+                entry = _statements.get(key)
+            if entry is None:
+                entry = _statements[key] = [0, 0.0, 0]
+        entry[0] += calls
+        entry[1] += seconds
+        entry[2] += rows
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Times execute and fetch calls; fetch time and rows go to the statement that produced them."""
+    _key = None
+
+    def execute(self, sql, parameters=()):
+        self._key = statement_key(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_sql(self._key, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        self._key = statement_key(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_sql(self._key, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def _fetched(self, started, rows):
+        if self._key is not None:
+            record_sql(self._key, time.perf_counter() - started, rows, calls=0)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._fetched(started, 1)
+        return row
+
+
+class TracedConnection(sqlite3.Connection):
+    # Connection.execute() builds its cursor in C, so route the shortcuts through cursor() explicitly
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """The sqlite3.connect(factory=...) for new connections: traced only while enabled."""
+    return TracedConnection if _enabled else sqlite3.Connection
+
+
+# ---- reading ----
+def function_stats() -> list:
+    with _lock:
+        items = [(name, list(entry)) for name, entry in _timings.items()]
+    return sorted(({"name": name, "calls": calls, "total_ms": seconds * 1000,
+                    "mean_ms": seconds * 1000 / calls if calls else 0.0, "max_ms": peak * 1000, "errors": errors}
+                   for name, (calls, seconds, peak, errors, _) in items),
+                  key=lambda s: s["total_ms"], reverse=True)
+
+
+def sql_stats(limit: int = None) -> list:
+    with _lock:
+        items = [(key, list(entry)) for key, entry in _statements.items()]
+    stats = sorted(({"statement": key, "calls": calls, "total_ms": seconds * 1000,
+                     "mean_ms": seconds * 1000 / calls if calls else 0.0, "rows": rows}
+                    for key, (calls, seconds, rows) in items),
+                   key=lambda s: s["total_ms"], reverse=True)
+    return stats[:limit] if limit else stats
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    """Everything recorded so far in the Prometheus text exposition format."""
+    with _lock:
+        timings = {name: (entry[0], entry[1], entry[3], list(entry[4])) for name, entry in _timings.items()}
+        statements = {key: tuple(entry) for key, entry in _statements.items()}
+    lines = ["# HELP erail_function_duration_seconds Wall time of instrumented functions and blocks.",
+             "# TYPE erail_function_duration_seconds histogram"]
+    for name in sorted(timings):
+        calls, seconds, _, buckets = timings[name]
+        label = _label(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, buckets):
+            cumulative += count
+            lines.append(f'erail_function_duration_seconds_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'erail_function_duration_seconds_bucket{{name="{label}",le="+Inf"}} {calls}')
+        lines.append(f'erail_function_duration_seconds_sum{{name="{label}"}} {seconds:.6f}')
+        lines.append(f'erail_function_duration_seconds_count{{name="{label}"}} {calls}')
+    lines += ["# HELP erail_function_errors_total Instrumented calls that raised.",
+              "# TYPE erail_function_errors_total counter"]
+    lines += [f'erail_function_errors_total{{name="{_label(name)}"}} {timings[name][2]}' for name in sorted(timings)]
+    for metric, index, help_text, fmt in (
+            ("erail_sql_statements_total", 0, "SQL statements executed.", "{}"),
+            ("erail_sql_duration_seconds_total", 1, "Time spent executing and fetching SQL statements.", "{:.6f}"),
+            ("erail_sql_rows_total", 2, "Rows written or fetched by SQL statements.", "{}")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{statement="{_label(key)}"}} {fmt.format(statements[key][index])}'
+                  for key in sorted(statements)]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,183 @@
+# invalidation.py
+# Change events for cached query results.
+#
+# Writers call publish(conn, *topics) instead of conn.commit(): the topics'
+# generation numbers are bumped in cache_generations inside the same
+# transaction, the transaction commits, and only then are the new numbers
+# applied in this process and handed to subscribers. A cache stamps what it
+# stores with version(topic) and reloads once the number moves, or subscribes
+# and drops whole structures (journey planner, train listings). Writers whose
+# commit happens elsewhere (the seat allocator's on_claim / on_release hooks)
+# call bump() inside that transaction and announce() once it has committed.
+#
+# Topics are TRAINS (the trains table / timetable), BOOKINGS (tickets and
+# waitlist entries of any account) and run_topic(train, date) for one run's
+# seats. Generations come from one sequence shared by all
+# topics, so sync(conn) - called at most every SYNC_INTERVAL seconds - asks
+# for everything numbered above the last one it saw and so learns about
+# writes made by other server processes with a single indexed query.
+import threading
+import time
+from collections import OrderedDict
+
+TRAINS = "trains"
+BOOKINGS = "bookings"
+SYNC_INTERVAL = 1.0     # seconds; how stale another process's writes may look
+CACHE_ENTRIES = 1024
+
+BUMP_SQL = (
+    "INSERT INTO cache_generations (topic, generation) "
+    "VALUES (?, (SELECT COALESCE(MAX(generation), 0) + 1 FROM cache_generations)) "
+    "ON CONFLICT(topic) DO UPDATE SET generation = excluded.generation "
+    "RETURNING generation"
+)
+
+
+def run_topic(train_number: str, departure_date: str) -> str:
+    return f"run:{train_number}:{departure_date}"
+
+
+def parse_run_topic(topic: str):
+    """(train_number, departure_date) for a run topic, else None."""
+    if not topic.startswith("run:"):
+        return None
+    # dates never contain ':'; train numbers might
+    train_number, _, departure_date = topic[4:].rpartition(":")
+    return train_number, departure_date
+
+
+def create_invalidation_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS cache_generations (
+                        topic TEXT PRIMARY KEY,
+                        generation INTEGER NOT NULL
+                    ) WITHOUT ROWID''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_cache_generations_generation
+                    ON cache_generations (generation)''')
+    conn.commit()
+
+
+_versions = {}          # topic -> newest generation known in this process
+_subscribers = []
+_lock = threading.Lock()
+_seen = None            # highest generation read by sync(); None until the first one
+_last_sync = 0.0
+_events = {"published": 0, "synced": 0}
+
+
+def version(topic: str) -> int:
+    return _versions.get(topic, 0)
+
+
+def subscribe(callback, remote_only: bool = False):
+    """Call ``callback(topics, remote)`` after each batch of changes.
+
+    ``remote`` is True for changes another process made, picked up by
+    sync(). With remote_only, local publishes are not passed on (for caches
+    that the writer already updates in place).
+    """
+    with _lock:
+        _subscribers.append((callback, remote_only))
+
+
+def _apply(changes: dict, remote: bool):
+    with _lock:
+        fresh = {topic: gen for topic, gen in changes.items() if gen > _versions.get(topic, 0)}
+        _versions.update(fresh)
+        subscribers = list(_subscribers)
+    if not fresh:
+        return
+    topics = set(fresh)
+    for callback, remote_only in subscribers:
+        if remote or not remote_only:
+            callback(topics, remote)
+
+
+def bump(conn, *topics) -> dict:
+    """Bump ``topics`` in the caller's transaction (no commit) -> changes for announce()."""
+    return {topic: conn.execute(BUMP_SQL, (topic,)).fetchone()[0] for topic in set(topics)}
+
+
+def announce(changes: dict):
+    """Apply bump()ed generations in this process once their transaction has committed."""
+    with _lock:
+        _events["published"] += len(changes)
+    _apply(changes, remote=False)
+
+
+def publish(conn, *topics):
+    """Bump ``topics`` and commit the caller's transaction with them."""
+    changes = bump(conn, *topics)
+    conn.commit()
+    announce(changes)
+
+
+def sync_due() -> bool:
+    return time.monotonic() - _last_sync >= SYNC_INTERVAL
+
+
+def sync(conn, force: bool = False) -> int:
+    """Apply generations written since the last sync (by any process). Returns how many.
+
+    The first call only records where the sequence stands: whatever this
+    process caches afterwards is newer than that.
+    """
+    global _seen, _last_sync
+    if not force and not sync_due():
+        return 0
+    with _lock:
+        _last_sync = time.monotonic()
+        seen = _seen
+    if seen is None:
+        newest = conn.execute("SELECT COALESCE(MAX(generation), 0) FROM cache_generations").fetchone()[0]
+        with _lock:
+            if _seen is None:
+                _seen = newest
+        return 0
+    rows = conn.execute("SELECT topic, generation FROM cache_generations WHERE generation > ?",
+                        (seen,)).fetchall()
+    if not rows:
+        return 0
+    with _lock:
+        _seen = max(_seen or 0, max(gen for _, gen in rows))
+        _events["synced"] += len(rows)
+    _apply(dict(rows), remote=True)
+    return len(rows)
+
+
+def stats() -> dict:
+    with _lock:
+        return {"topics": len(_versions), "seen_generation": _seen, **_events}
+
+
+class VersionedCache:
+    """key -> value stamped with its topic's version; a stale stamp means reload."""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, topic: str, load):
+        current = version(topic)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] == current:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+        value = load()
+        with self._lock:
+            # published while we were reading: don't keep what may be the old state
+            if version(topic) == current:
+                self._entries[key] = (current, value)
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,219 @@
+# journey_planner.py
+# Multi-hop journey planner over the trains table.
+#
+# Every train run becomes a timetabled connection (from station, to station,
+# departure minute, arrival minute). The connections are indexed once - by
+# departure station and by trip - and kept in memory. A query runs in rounds
+# (as in RAPTOR): round k finds the earliest arrival at every station using at
+# most k trains, and only looks at departures from stations whose arrival
+# improved in round k-1. Each round that reaches the target earlier than the
+# last yields one journey (fewest changes vs. earliest arrival).
+import bisect
+import threading
+from datetime import date, datetime, timedelta
+
+from invalidation import TRAINS, subscribe
+from train_stops import create_stops_schema, interpolate_offsets
+
+DEFAULT_DEPARTURE = "00:00"
+MIN_TRANSFER_MINUTES = 30
+SEARCH_HORIZON_DAYS = 2
+INF = float("inf")
+
+
+def create_planner_schema(conn):
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(trains)")]
+    if "departure_time" not in cols:
+        conn.execute("ALTER TABLE trains ADD COLUMN departure_time TEXT")
+    if "travel_minutes" not in cols:
+        conn.execute("ALTER TABLE trains ADD COLUMN travel_minutes INTEGER")
+    create_stops_schema(conn)
+    conn.commit()
+
+
+def to_minutes(day: str, hhmm: str = None) -> int:
+    """Minutes since 0001-01-01 for an ISO date and an 'HH:MM' time."""
+    hours, minutes = (hhmm or DEFAULT_DEPARTURE).split(":")[:2]
+    return date.fromisoformat(day).toordinal() * 1440 + int(hours) * 60 + int(minutes)
+
+
+def from_minutes(total: int) -> datetime:
+    day, minute = divmod(int(total), 1440)
+    return datetime.combine(date.fromordinal(day), datetime.min.time()) + timedelta(minutes=minute)
+
+
+class Connection:
+    __slots__ = ("trip", "train_number", "train_name", "from_code", "to_code", "dep", "arr")
+
+    def __init__(self, trip, train_number, train_name, from_code, to_code, dep, arr):
+        self.trip = trip
+        self.train_number = train_number
+        self.train_name = train_name
+        self.from_code = from_code
+        self.to_code = to_code
+        self.dep = dep
+        self.arr = arr
+
+
+def load_connections(conn):
+    """One connection per segment of every train run, sorted by departure.
+
+    Runs with a stop list (train_stops) contribute one connection per pair of
+    consecutive stops, all sharing the run's trip id so riding through a stop
+    is not a change.
+    """
+    stops_by_run = {}
+    for number, day, code, name, minutes in conn.execute(
+            "SELECT train_number, departure_date, station_code, station_name, minutes_from_start "
+            "FROM train_stops ORDER BY train_number, departure_date, stop_sequence"):
+        stops_by_run.setdefault((number, day), []).append((code, name, minutes))
+
+    connections = []
+    for rowid, number, name, day, from_code, to_code, dep_time, travel in conn.execute(
+            "SELECT rowid, train_number, train_name, departure_date, from_code, to_code, "
+            "departure_time, travel_minutes FROM trains"):
+        if not (from_code and to_code and day):
+            continue
+        try:
+            dep = to_minutes(day, dep_time)
+        except ValueError:
+            continue
+        # runs without a timetable are assumed to arrive at the end of their day
+        total = travel if travel else to_minutes(day, "23:59") - dep
+        stops = stops_by_run.get((number, day)) or [(from_code, None, 0), (to_code, None, total)]
+        offsets = interpolate_offsets(stops, total)
+        trip = (number, day, rowid)
+        for i in range(len(stops) - 1):
+            a, b = stops[i][0], stops[i + 1][0]
+            if a == b:
+                continue
+            leg_dep = dep + offsets[i]
+            connections.append(Connection(trip, number, name, a, b, leg_dep, max(dep + offsets[i + 1], leg_dep + 1)))
+    connections.sort(key=lambda c: (c.dep, c.arr))
+    return connections
+
+
+class JourneyPlanner:
+    def __init__(self, connections, min_transfer: int = MIN_TRANSFER_MINUTES):
+        self.connections = connections
+        self.min_transfer = min_transfer
+        # per station: departure minutes and connection indexes, both sorted by departure
+        self._dep_times = {}
+        self._dep_index = {}
+        # per trip: its connections in running order; per connection: (trip, position)
+        trips = {}
+        for i, c in enumerate(connections):
+            self._dep_times.setdefault(c.from_code, []).append(c.dep)
+            self._dep_index.setdefault(c.from_code, []).append(i)
+            trips.setdefault(c.trip, []).append(i)
+        self._trip_of = [None] * len(connections)
+        self._trips = {}
+        for trip, idxs in trips.items():
+            idxs.sort(key=lambda i: connections[i].dep)
+            self._trips[trip] = idxs
+            for pos, i in enumerate(idxs):
+                self._trip_of[i] = (trip, pos)
+
+    def plan(self, origin: str, target: str, start: int, max_changes: int = 2,
+             horizon_days: int = SEARCH_HORIZON_DAYS):
+        """Journeys from ``origin`` to ``target`` leaving at or after minute ``start``.
+
+        Returns a list of journeys (each a list of (board, alight) Connection
+        pairs), one per number of changes that arrives strictly earlier than
+        any journey with fewer changes.
+        """
+        if origin == target or origin not in self._dep_times:
+            return []
+        conns = self.connections
+        horizon = start + horizon_days * 1440
+
+        arrival = {origin: start}            # best arrival using <= k-1 trains
+        ready = {origin: start}              # stations improved last round -> earliest boarding minute
+        journeys = []
+        parents = []                         # per round: station -> (board index, alight index)
+        best_at_target = INF
+        for _ in range(max_changes + 1):
+            new_arrival = dict(arrival)
+            parent = {}
+            scanned = {}                     # trip -> first position already ridden this round
+            for station, earliest in ready.items():
+                times = self._dep_times.get(station)
+                if not times:
+                    continue
+                idxs = self._dep_index[station]
+                for j in range(bisect.bisect_left(times, earliest), len(times)):
+                    dep = times[j]
+                    if dep > horizon or dep >= best_at_target:
+                        break
+                    board = idxs[j]
+                    trip, pos = self._trip_of[board]
+                    stop_at = scanned.get(trip, INF)
+                    if pos >= stop_at:
+                        continue
+                    scanned[trip] = pos
+                    ride = self._trips[trip]
+                    for k in range(pos, min(len(ride), stop_at)):
+                        c = conns[ride[k]]
+                        if c.arr < new_arrival.get(c.to_code, INF):
+                            new_arrival[c.to_code] = c.arr
+                            parent[c.to_code] = (board, ride[k])
+            parents.append(parent)
+            if new_arrival.get(target, INF) < best_at_target:
+                best_at_target = new_arrival[target]
+                journeys.append(self._legs(parents, target))
+            ready = {st: t + self.min_transfer for st, t in new_arrival.items()
+                     if t < arrival.get(st, INF) and st != target}
+            if not ready:
+                break
+            arrival = new_arrival
+        return journeys
+
+    def _legs(self, parents, target):
+        legs = []
+        station = target
+        for parent in reversed(parents):
+            if station not in parent:
+                continue
+            board, alight = parent[station]
+            legs.append((self.connections[board], self.connections[alight]))
+            station = self.connections[board].from_code
+        return list(reversed(legs))
+
+
+# ---- process-wide cache ----
+_lock = threading.Lock()
+_planner = None
+
+
+def get_planner(conn) -> JourneyPlanner:
+    """Cached planner; built from the trains table on first use or after invalidate()."""
+    global _planner
+    with _lock:
+        if _planner is None:
+            _planner = JourneyPlanner(load_connections(conn))
+        return _planner
+
+
+def invalidate():
+    global _planner
+    with _lock:
+        _planner = None
+
+
+# the timetable changes only with TRAINS (stops are written together with the train)
+subscribe(lambda topics, remote: invalidate() if TRAINS in topics else None)
+
+
+def journey_rows(journey):
+    """Flatten one journey into display rows."""
+    rows = []
+    for board, alight in journey:
+        rows.append({
+            "Train Number": board.train_number,
+            "Train Name": board.train_name,
+            "From": board.from_code,
+            "Departs": from_minutes(board.dep).strftime("%Y-%m-%d %H:%M"),
+            "To": alight.to_code,
+            "Arrives": from_minutes(alight.arr).strftime("%Y-%m-%d %H:%M"),
+        })
+    return rows
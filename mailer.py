@@ -0,0 +1,288 @@
+# mailer.py
+# Durable outbound email queue and its background sender.
+#
+# send_email() used to connect, STARTTLS, log in, send and quit inside the
+# user's rerun. Now the app only inserts a row into the outbox table and
+# wakes the MailWorker thread. The worker sends due messages in batches over
+# one authenticated SMTP connection, kept open across batches until it has
+# been idle for IDLE_DISCONNECT seconds. Failures are retried with
+# exponential backoff up to MAX_ATTEMPTS, and each row records its status
+# (PENDING / SENDING / SENT / FAILED), attempts and last error.
+#
+# Every app process runs its own worker against the same outbox, so a claim
+# is a lease: a SENDING row records the worker that took it (claimed_by) and
+# when (claimed_ts). Only rows whose lease is older than CLAIM_LEASE go back
+# to PENDING, which is how mail stranded by a crashed worker is picked up
+# (at-least-once delivery) without a starting worker resending what a live
+# one is in the middle of.
+#
+# Any other error in a pass (the database locked past busy_timeout, a bad
+# row) is logged and the worker backs off and carries on. Outcomes it could
+# not write are kept and written first next time, and claimed rows it never
+# got to go straight back to PENDING instead of waiting out the lease.
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+
+from db import DB_PATH, connect
+
+PENDING = "PENDING"
+SENDING = "SENDING"
+SENT = "SENT"
+FAILED = "FAILED"
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 5          # seconds; 5, 10, 20, 40, ...
+BACKOFF_CAP = 600
+POLL_INTERVAL = 30        # seconds between outbox checks when nobody calls notify()
+IDLE_DISCONNECT = 60      # close the SMTP connection after this long without mail
+SMTP_TIMEOUT = 10
+CLAIM_LEASE = 900         # seconds; must outlast a whole batch of slow sends (BATCH_SIZE x timeouts)
+ERROR_BACKOFF = 1         # seconds after a failed pass, doubling up to POLL_INTERVAL
+
+log = logging.getLogger(__name__)
+
+
+def create_outbox_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        to_email TEXT NOT NULL,
+                        subject TEXT NOT NULL,
+                        body TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'PENDING',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_ts REAL NOT NULL,
+                        last_error TEXT,
+                        created_ts REAL NOT NULL,
+                        sent_ts REAL,
+                        claimed_by TEXT,
+                        claimed_ts REAL
+                    )''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_outbox_due
+                    ON outbox (next_attempt_ts, id) WHERE status='PENDING' ''')
+    conn.commit()
+
+
+def create_outbox_leases(conn):
+    # outbox tables from before claim leases lack these two columns
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(outbox)")]
+    for column, ddl in (("claimed_by", "claimed_by TEXT"), ("claimed_ts", "claimed_ts REAL")):
+        if column not in cols:
+            try:
+                conn.execute(f"ALTER TABLE outbox ADD COLUMN {ddl}")
+            except sqlite3.OperationalError:
+                pass   # another process added it first
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_outbox_claimed
+                    ON outbox (claimed_ts) WHERE status='SENDING' ''')
+    conn.commit()
+
+
+def enqueue_email(conn, to_email: str, subject: str, body: str) -> int:
+    """Queue one message (no commit). Returns its outbox id."""
+    now = time.time()
+    cur = conn.execute(
+        "INSERT INTO outbox (to_email, subject, body, status, next_attempt_ts, created_ts) VALUES (?, ?, ?, ?, ?, ?)",
+        (to_email, subject, body, PENDING, now, now))
+    return cur.lastrowid
+
+
+def outbox_counts(conn) -> dict:
+    return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+
+def _backoff(attempts: int) -> float:
+    return min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempts - 1)))
+
+
+class MailWorker(threading.Thread):
+    """Sends outbox rows for one database over a reused SMTP connection.
+
+    ``config`` has host, port, sender and optionally user, password and
+    starttls (default True).
+    """
+
+    def __init__(self, config: dict, db_path: str = DB_PATH, batch_size: int = BATCH_SIZE,
+                 poll_interval: float = POLL_INTERVAL, idle_disconnect: float = IDLE_DISCONNECT):
+        super().__init__(name="mail-worker", daemon=True)
+        self.config = dict(config)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle_disconnect = idle_disconnect
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._smtp = None
+        self._last_used = 0.0
+        self._outcomes = ([], [], [])   # (sent, retry, failed) updates not written yet
+        self._unsent = set()            # ids claimed in the current batch and not yet tried
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors = 0
+        self.connections = 0
+
+    # ---- control ----
+    def notify(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = None):
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried, "errors": self.errors,
+                "smtp_connections": self.connections, "connected": self._smtp is not None}
+
+    # ---- SMTP connection ----
+    def _connect(self):
+        cfg = self.config
+        smtp = smtplib.SMTP(cfg["host"], int(cfg["port"]), timeout=SMTP_TIMEOUT)
+        if cfg.get("starttls", True):
+            smtp.starttls()
+        if cfg.get("user"):
+            smtp.login(cfg["user"], cfg["password"])
+        self.connections += 1
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _send(self, to_email, subject, body):
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = self.config["sender"]
+        msg["To"] = to_email
+        msg.set_content(body)
+        for reconnect in (False, True):
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # server dropped the idle connection; open a new one once
+                self._smtp = None
+                if reconnect:
+                    raise
+
+    # ---- outbox ----
+    def _claim_batch(self, conn):
+        now = time.time()
+        # leases left behind by a worker that died (rows from before leases have no claimed_ts)
+        conn.execute("UPDATE outbox SET status=?, claimed_by=NULL, claimed_ts=NULL "
+                     "WHERE status=? AND (claimed_ts IS NULL OR claimed_ts < ?)",
+                     (PENDING, SENDING, now - CLAIM_LEASE))
+        rows = conn.execute(
+            "UPDATE outbox SET status=?, claimed_by=?, claimed_ts=? WHERE id IN (SELECT id FROM outbox "
+            "WHERE status=? AND next_attempt_ts<=? ORDER BY next_attempt_ts, id LIMIT ?) "
+            "RETURNING id, to_email, subject, body, attempts",
+            (SENDING, self.worker_id, now, PENDING, now, self.batch_size)).fetchall()
+        conn.commit()
+        return sorted(rows)
+
+    def _record(self, conn):
+        done, retry, dead = self._outcomes
+        conn.executemany("UPDATE outbox SET status=?, attempts=?, sent_ts=?, last_error=NULL WHERE id=?", done)
+        conn.executemany("UPDATE outbox SET status=?, attempts=?, next_attempt_ts=?, last_error=? WHERE id=?", retry)
+        conn.executemany("UPDATE outbox SET status=?, attempts=?, last_error=? WHERE id=?", dead)
+        conn.commit()
+        self.sent += len(done)
+        self.retried += len(retry)
+        self.failed += len(dead)
+        self._outcomes = ([], [], [])
+
+    def _recover(self, conn):
+        """Write what a failed pass left behind and give back the rows it never tried."""
+        self._record(conn)
+        if self._unsent:
+            conn.executemany("UPDATE outbox SET status=?, claimed_by=NULL, claimed_ts=NULL "
+                             "WHERE id=? AND status=? AND claimed_by=?",
+                             [(PENDING, outbox_id, SENDING, self.worker_id) for outbox_id in self._unsent])
+            conn.commit()
+            self._unsent = set()
+
+    def process_batch(self, conn) -> int:
+        """Send one batch of due messages. Returns how many rows were handled."""
+        rows = self._claim_batch(conn)
+        if not rows:
+            return 0
+        self._unsent = {row[0] for row in rows}
+        done, retry, dead = self._outcomes
+        for outbox_id, to_email, subject, body, attempts in rows:
+            self._unsent.discard(outbox_id)
+            try:
+                self._send(to_email, subject, body)
+            except (smtplib.SMTPException, OSError) as e:
+                self._disconnect()
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS or isinstance(e, smtplib.SMTPRecipientsRefused):
+                    dead.append((FAILED, attempts, repr(e), outbox_id))
+                else:
+                    retry.append((PENDING, attempts, time.time() + _backoff(attempts), repr(e), outbox_id))
+            else:
+                done.append((SENT, attempts + 1, time.time(), outbox_id))
+        self._record(conn)
+        return len(rows)
+
+    def run(self):
+        conn = connect(self.db_path)
+        backoff = ERROR_BACKOFF
+        try:
+            while not self._stopping.is_set():
+                try:
+                    if any(self._outcomes) or self._unsent:
+                        self._recover(conn)
+                    if self.process_batch(conn):
+                        backoff = ERROR_BACKOFF
+                        continue
+                except Exception:
+                    # a dead thread would stop mail for the rest of the process
+                    log.exception("Mail worker pass failed; retrying in %.0f s", backoff)
+                    self.errors += 1
+                    if conn.in_transaction:
+                        conn.rollback()
+                    self._disconnect()
+                    self._wake.wait(backoff)
+                    self._wake.clear()
+                    backoff = min(backoff * 2, self.poll_interval)
+                    continue
+                backoff = ERROR_BACKOFF
+                if self._smtp is not None and time.monotonic() - self._last_used > self.idle_disconnect:
+                    self._disconnect()
+                self._wake.wait(self.poll_interval if self._smtp is None else
+                                min(self.poll_interval, self.idle_disconnect))
+                self._wake.clear()
+        finally:
+            self._disconnect()
+            conn.close()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_mailer(config: dict, db_path: str = DB_PATH) -> MailWorker:
+    """Process-wide running MailWorker for ``db_path`` (survives Streamlit reruns)."""
+    with _workers_lock:
+        worker = _workers.get(db_path)
+        if worker is None or not worker.is_alive():
+            worker = _workers[db_path] = MailWorker(config, db_path)
+            worker.start()
+        elif worker.config != dict(config):
+            # picked up on the next connect
+            worker.config = dict(config)
+        return worker
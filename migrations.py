@@ -0,0 +1,140 @@
+# migrations.py
+# Versioned schema migrations, applied once per process.
+#
+# app.py used to run every CREATE TABLE / CREATE INDEX / PRAGMA table_info
+# step at module top level, i.e. on every Streamlit rerun of every session.
+# Now each step is a numbered migration; schema_version records which ones a
+# database has had. ensure_schema() applies the pending ones the first time it
+# is called for a database path in this process and afterwards is a set
+# lookup, so steady-state reruns send no DDL or schema queries at all.
+#
+# Migrations must stay idempotent (IF NOT EXISTS, PRAGMA checks): databases
+# created before schema_version existed start at version 0 and replay every
+# step, and two processes starting together may both run the same one.
+# New schema goes at the end of MIGRATIONS with the next number; never
+# renumber or edit one that has shipped.
+import sqlite3
+import threading
+import time
+
+import journey_planner
+import otp_codes
+from bookings import create_bookings_schema
+from db import DB_PATH, get_pool
+from invalidation import create_invalidation_schema
+from mailer import create_outbox_leases, create_outbox_schema
+from rate_limit import create_rate_limit_schema
+from seat_inventory import create_seat_inventory, migrate_legacy_seat_tables
+from train_listing import create_listing_schema
+from train_search import create_search_schema
+from train_stops import create_stops_schema
+from waitlist import create_waitlist_schema, create_waitlist_type_index
+
+
+def _base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+                (username TEXT PRIMARY KEY, password TEXT, email TEXT, email_verified INTEGER DEFAULT 0)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS employees
+                (employee_id TEXT PRIMARY KEY, password TEXT, designation TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS trains
+                (train_number TEXT, train_name TEXT, departure_date TEXT, starting_destination TEXT, ending_destination TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS email_codes
+                (username TEXT, code TEXT, purpose TEXT, expiry_ts INTEGER)''')
+    conn.commit()
+
+
+def _users_email_columns(conn):
+    # users tables from before email verification lack these two columns
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(users)")]
+    for column, ddl in (("email", "email TEXT"), ("email_verified", "email_verified INTEGER DEFAULT 0")):
+        if column not in cols:
+            try:
+                conn.execute(f"ALTER TABLE users ADD COLUMN {ddl}")
+            except sqlite3.OperationalError:
+                pass   # another process added it first
+    conn.commit()
+
+
+def _seat_inventory(conn):
+    create_seat_inventory(conn)
+    migrate_legacy_seat_tables(conn)
+
+
+MIGRATIONS = (
+    (1, "base tables", _base_tables),
+    (2, "users email columns", _users_email_columns),
+    (3, "seat inventory", _seat_inventory),
+    (4, "train search", create_search_schema),
+    (5, "journey planner", journey_planner.create_planner_schema),
+    (6, "train stops", create_stops_schema),
+    (7, "bookings", create_bookings_schema),
+    (8, "waitlist", create_waitlist_schema),
+    (9, "email outbox", create_outbox_schema),
+    (10, "email code attempts", otp_codes.create_codes_schema),
+    (11, "rate limits", create_rate_limit_schema),
+    (12, "train listing index", create_listing_schema),
+    (13, "cache generations", create_invalidation_schema),
+    (14, "email outbox leases", create_outbox_leases),
+    (15, "waitlist seat type index", create_waitlist_type_index),
+)
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def create_version_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_ts REAL NOT NULL
+                    )''')
+    conn.commit()
+
+
+def current_version(conn) -> int:
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:   # no schema_version yet
+        return 0
+    return row[0] or 0
+
+
+def migrate(conn, migrations=MIGRATIONS) -> list:
+    """Apply every migration newer than the database's version, in order.
+
+    Returns the (version, name) pairs that were applied.
+    """
+    create_version_table(conn)
+    version = current_version(conn)
+    applied = []
+    for number, name, step in migrations:
+        if number <= version:
+            continue
+        step(conn)
+        conn.execute("INSERT OR IGNORE INTO schema_version (version, name, applied_ts) VALUES (?, ?, ?)",
+                     (number, name, time.time()))
+        conn.commit()
+        applied.append((number, name))
+    return applied
+
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def ensure_schema(path: str = DB_PATH) -> list:
+    """Bring ``path`` up to date once per process; later calls return [] without touching the db."""
+    if path in _ready:
+        return []
+    with _ready_lock:
+        if path in _ready:
+            return []
+        with get_pool(path).connection() as conn:
+            applied = migrate(conn)
+        _ready.add(path)
+        return applied
+
+
+def forget(path: str = DB_PATH):
+    """Make the next ensure_schema(path) check the database again."""
+    with _ready_lock:
+        _ready.discard(path)
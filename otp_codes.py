@@ -0,0 +1,87 @@
+# otp_codes.py
+# One-time email codes (verification, password reset).
+#
+# Lookups go through idx_email_codes_lookup (username, purpose, expiry_ts)
+# instead of scanning email_codes. Issuing a code replaces older codes for the
+# same username + purpose, and expired rows are purged at most every
+# PURGE_INTERVAL seconds, so the table stays small. Each code allows
+# MAX_ATTEMPTS checks before it is dead.
+#
+# Every check is answered by the email_codes row itself, never by a copy in
+# this process: with several server processes a cached code would outlive
+# clear_codes() / store_code() elsewhere and could be replayed, and
+# per-process attempt counters would multiply the cap. One UPDATE ...
+# RETURNING both spends the attempt and reads the code, so concurrent
+# guesses from any number of processes cannot get past MAX_ATTEMPTS.
+import secrets
+import threading
+import time
+from datetime import datetime
+
+MAX_ATTEMPTS = 5
+PURGE_INTERVAL = 600      # seconds
+
+
+def now_ts() -> int:
+    # the clock email_codes.expiry_ts has always been stamped with
+    return int(datetime.utcnow().timestamp())
+
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def create_codes_schema(conn):
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(email_codes)")]
+    if "attempts" not in cols:
+        conn.execute("ALTER TABLE email_codes ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_email_codes_lookup
+                    ON email_codes (username, purpose, expiry_ts)''')
+    purge_expired(conn)
+    conn.commit()
+
+
+def purge_expired(conn, now: int = None) -> int:
+    """Delete expired codes (no commit). Returns how many went."""
+    global _last_purge
+    with _purge_lock:
+        _last_purge = time.monotonic()
+    cur = conn.execute("DELETE FROM email_codes WHERE expiry_ts < ?", (now if now is not None else now_ts(),))
+    return cur.rowcount
+
+
+def _maybe_purge(conn):
+    if time.monotonic() - _last_purge > PURGE_INTERVAL:
+        purge_expired(conn)
+
+
+def store_code(conn, username: str, purpose: str, code: str, ttl_minutes: int):
+    expiry = now_ts() + ttl_minutes * 60
+    # only the newest code was ever accepted; don't keep the others around
+    conn.execute("DELETE FROM email_codes WHERE username=? AND purpose=?", (username, purpose))
+    conn.execute("INSERT INTO email_codes (username, code, purpose, expiry_ts, attempts) VALUES (?, ?, ?, ?, 0)",
+                 (username, code, purpose, expiry))
+    _maybe_purge(conn)
+    conn.commit()
+
+
+def check_code(conn, username: str, purpose: str, code: str) -> bool:
+    """True if ``code`` is the live code for username + purpose.
+
+    Every check uses up one of MAX_ATTEMPTS, right or wrong; after that the
+    code is rejected even if correct.
+    """
+    row = conn.execute(
+        "UPDATE email_codes SET attempts = attempts + 1 "
+        "WHERE username=? AND purpose=? AND expiry_ts >= ? AND attempts < ? "
+        # only the newest code counts (databases from before store_code() replaced them may hold several)
+        "AND expiry_ts = (SELECT MAX(expiry_ts) FROM email_codes WHERE username=? AND purpose=?) "
+        "RETURNING code",
+        (username, purpose, now_ts(), MAX_ATTEMPTS, username, purpose)).fetchone()
+    conn.commit()
+    return row is not None and secrets.compare_digest(str(row[0]), code)
+
+
+def clear_codes(conn, username: str, purpose: str):
+    conn.execute("DELETE FROM email_codes WHERE username=? AND purpose=?", (username, purpose))
+    conn.commit()
@@ -0,0 +1,230 @@
+# passwords.py
+# Password hashing, run on a small bounded worker pool.
+#
+# Stored hashes describe themselves:
+#     $pbkdf2-sha256$i=100000$<salt hex>$<digest hex>
+#     $scrypt$n=16384,r=8,p=1$<salt hex>$<digest hex>
+# verify_password() dispatches on the scheme, so the cost (or the KDF) can be
+# changed with configure() without breaking existing accounts; needs_rehash()
+# tells login to upgrade a hash that doesn't match the current policy. The
+# original "salt$digest" format is read as PBKDF2-SHA256 at 100k iterations.
+#
+# A 100k-iteration PBKDF2 takes ~50-100 ms of CPU. Done inline on the
+# Streamlit script thread, a burst of logins takes every core and bookings
+# stall behind them. Here hashing runs on at most `workers` threads
+# (hashlib releases the GIL inside pbkdf2_hmac and scrypt, so these run in
+# parallel), with at most `max_pending` requests admitted at once. Past that
+# a request fails fast with HashingBusy instead of queueing without bound.
+# Queue wait and hash time are recorded per request for p50/p99 reporting.
+import binascii
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+ITERATIONS = 100_000
+LEGACY_ITERATIONS = 100_000   # what the old "salt$digest" hashes were made with
+SALT_BYTES = 16
+WORKERS = max(1, (os.cpu_count() or 2) // 2)   # leave the other half of the cores to bookings
+MAX_PENDING = WORKERS * 16
+WAIT_TIMEOUT = 10        # seconds a caller waits for its result
+LATENCY_SAMPLES = 2048
+
+PBKDF2 = "pbkdf2-sha256"
+SCRYPT = "scrypt"
+DEFAULT_PARAMS = {
+    PBKDF2: {"i": ITERATIONS},
+    SCRYPT: {"n": 2 ** 14, "r": 8, "p": 1},
+}
+
+
+def _pbkdf2(password: bytes, salt: bytes, params: dict) -> bytes:
+    return hashlib.pbkdf2_hmac('sha256', password, salt, params["i"])
+
+
+def _scrypt(password: bytes, salt: bytes, params: dict) -> bytes:
+    n, r, p = params["n"], params["r"], params["p"]
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=32)
+
+
+KDFS = {PBKDF2: _pbkdf2, SCRYPT: _scrypt}
+
+# current policy for new hashes; see configure()
+_policy = {"scheme": PBKDF2, "params": dict(DEFAULT_PARAMS[PBKDF2])}
+
+
+def configure(scheme: str = PBKDF2, **params):
+    """Set the scheme and cost used for new hashes (e.g. configure("pbkdf2-sha256", i=300_000))."""
+    if scheme not in KDFS:
+        raise ValueError(f"Unknown password hash scheme: {scheme}")
+    merged = dict(DEFAULT_PARAMS[scheme])
+    unknown = set(params) - set(merged)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {scheme}: {', '.join(sorted(unknown))}")
+    merged.update({k: int(v) for k, v in params.items()})
+    _policy["scheme"], _policy["params"] = scheme, merged
+
+
+def current_policy():
+    return _policy["scheme"], dict(_policy["params"])
+
+
+def _format_params(params: dict) -> str:
+    return ",".join(f"{k}={v}" for k, v in params.items())
+
+
+def parse_hash(stored: str):
+    """(scheme, params, salt, digest) for a stored hash; raises ValueError if unreadable."""
+    if not stored.startswith("$"):
+        salt_hex, digest_hex = stored.split("$")
+        return PBKDF2, {"i": LEGACY_ITERATIONS}, binascii.unhexlify(salt_hex), binascii.unhexlify(digest_hex)
+    _, scheme, params_text, salt_hex, digest_hex = stored.split("$")
+    if scheme not in KDFS:
+        raise ValueError(f"Unknown password hash scheme: {scheme}")
+    params = dict(DEFAULT_PARAMS[scheme])
+    for item in params_text.split(","):
+        key, _, value = item.partition("=")
+        if key not in params:
+            raise ValueError(f"Unknown parameter {key} for {scheme}")
+        params[key] = int(value)
+    return scheme, params, binascii.unhexlify(salt_hex), binascii.unhexlify(digest_hex)
+
+
+def hash_password(password: str, scheme: str = None, **params) -> str:
+    """Hash with the current policy, or with ``scheme`` / ``params`` when given."""
+    if scheme is None:
+        scheme, policy_params = current_policy()
+        params = {**policy_params, **params}
+    else:
+        params = {**DEFAULT_PARAMS[scheme], **params}
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = KDFS[scheme](password.encode(), salt, params)
+    return f"${scheme}${_format_params(params)}${binascii.hexlify(salt).decode()}${binascii.hexlify(digest).decode()}"
+
+
+def verify_password(stored: str, provided_password: str) -> bool:
+    try:
+        scheme, params, salt, digest = parse_hash(stored)
+        test = KDFS[scheme](provided_password.encode(), salt, params)
+        return secrets.compare_digest(digest, test)
+    except Exception:
+        return False
+
+
+def needs_rehash(stored: str) -> bool:
+    """True if ``stored`` wasn't made with the current scheme and cost."""
+    try:
+        scheme, params, _, _ = parse_hash(stored)
+    except Exception:
+        return True
+    return not stored.startswith("$") or (scheme, params) != current_policy()
+
+
+def verify_and_rehash(stored: str, provided_password: str):
+    """(valid, new_hash) - new_hash is set when the password is right but the hash is outdated."""
+    if not verify_password(stored, provided_password):
+        return False, None
+    return True, (hash_password(provided_password) if needs_rehash(stored) else None)
+
+
+class HashingBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class HashingPool:
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._waits = deque(maxlen=LATENCY_SAMPLES)
+        self._runs = deque(maxlen=LATENCY_SAMPLES)
+        self._totals = deque(maxlen=LATENCY_SAMPLES)
+        self.completed = 0
+        self.rejected = 0
+
+    def _timed(self, submitted, fn, args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+                self._waits.append((started - submitted) * 1000)
+                self._runs.append((finished - started) * 1000)
+                self._totals.append((finished - submitted) * 1000)
+
+    def _done(self, future):
+        # runs for finished and cancelled requests alike
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run(self, fn, *args, timeout: float = WAIT_TIMEOUT):
+        """Run ``fn(*args)`` on the pool and wait for the result."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy("Too many sign-ins in progress, please try again in a moment.")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), fn, args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeout:
+            # nobody is waiting for it any more; drop it if it hasn't started
+            future.cancel()
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy("Sign-in is taking too long right now, please try again in a moment.")
+
+    def hash(self, password: str) -> str:
+        return self.run(hash_password, password)
+
+    def verify(self, stored: str, provided_password: str) -> bool:
+        return self.run(verify_password, stored, provided_password)
+
+    def verify_and_rehash(self, stored: str, provided_password: str):
+        # one trip through the queue for both the check and the upgrade
+        return self.run(verify_and_rehash, stored, provided_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits, runs, totals = list(self._waits), list(self._runs), list(self._totals)
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_ms_p50": _percentile(waits, 0.50),
+                "wait_ms_p99": _percentile(waits, 0.99),
+                "hash_ms_p50": _percentile(runs, 0.50),
+                "hash_ms_p99": _percentile(runs, 0.99),
+                "total_ms_p50": _percentile(totals, 0.50),
+                "total_ms_p99": _percentile(totals, 0.99),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,135 @@
+# rate_limit.py
+# Token-bucket rate limiting for login, password reset and code checks.
+#
+# Every failed login used to cost a full PBKDF2 run, so a credential-stuffing
+# burst could pin the CPU. A RateLimiter is checked before any hashing: each
+# key ("user:alice", "client:10.0.0.7") has a bucket of `capacity` tokens
+# refilled at `capacity / per_seconds` tokens per second, and a request
+# spends one. A check is one dict lookup and a little arithmetic under a lock.
+#
+# By default buckets live in memory (per process). With persistent=True and
+# a connection passed to allow(), the bucket lives in the rate_limits table
+# and is updated by a single UPSERT, so limits hold across processes and
+# restarts.
+import threading
+import time
+
+MAX_KEYS = 100_000      # in-memory buckets kept before idle (full) ones are dropped
+
+UPSERT_SQL = (
+    "INSERT INTO rate_limits (key, tokens, updated_ts, allowed) VALUES (:key, :cap - :cost, :now, 1) "
+    "ON CONFLICT(key) DO UPDATE SET "
+    # SET expressions all see the old row, so tokens and allowed agree on the refilled amount
+    "tokens = MIN(:cap, tokens + (:now - updated_ts) * :rate) "
+    "        - CASE WHEN MIN(:cap, tokens + (:now - updated_ts) * :rate) >= :cost THEN :cost ELSE 0 END, "
+    "allowed = MIN(:cap, tokens + (:now - updated_ts) * :rate) >= :cost, "
+    "updated_ts = :now "
+    "RETURNING allowed"
+)
+
+
+def create_rate_limit_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS rate_limits (
+                        key TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        updated_ts REAL NOT NULL,
+                        allowed INTEGER NOT NULL DEFAULT 1
+                    ) WITHOUT ROWID''')
+    conn.commit()
+
+
+class RateLimiter:
+    def __init__(self, name: str, capacity: float, per_seconds: float, persistent: bool = False,
+                 max_keys: int = MAX_KEYS):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds     # tokens per second
+        self.persistent = persistent
+        self.max_keys = max_keys
+        self._buckets = {}                          # key -> [tokens, updated_ts]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.denied = 0
+
+    def allow(self, key: str, conn=None, cost: float = 1.0) -> bool:
+        """Spend ``cost`` tokens from ``key``'s bucket; False if there aren't enough."""
+        key = f"{self.name}:{key}"
+        if self.persistent and conn is not None:
+            ok = bool(conn.execute(UPSERT_SQL, {"key": key, "cap": self.capacity, "cost": cost,
+                                                "now": time.time(), "rate": self.rate}).fetchone()[0])
+            conn.commit()
+        else:
+            ok = self._allow_memory(key, cost)
+        with self._lock:
+            if ok:
+                self.allowed += 1
+            else:
+                self.denied += 1
+        return ok
+
+    def _allow_memory(self, key, cost):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [self.capacity, now]
+            else:
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True
+            return False
+
+    def _prune(self, now):
+        # a bucket that has refilled completely is the same as no bucket
+        full = [k for k, (tokens, ts) in self._buckets.items()
+                if tokens + (now - ts) * self.rate >= self.capacity]
+        for k in full:
+            del self._buckets[k]
+        if len(self._buckets) >= self.max_keys:
+            # under attack from many keys: forget the oldest half
+            for k in list(self._buckets)[: len(self._buckets) // 2]:
+                del self._buckets[k]
+
+    def retry_after(self, key: str, cost: float = 1.0) -> float:
+        """Seconds until ``key`` could spend ``cost`` tokens (in-memory buckets only)."""
+        with self._lock:
+            bucket = self._buckets.get(f"{self.name}:{key}")
+            if bucket is None:
+                return 0.0
+            tokens = min(self.capacity, bucket[0] + (time.monotonic() - bucket[1]) * self.rate)
+            return max(0.0, (cost - tokens) / self.rate)
+
+    def reset(self, key: str, conn=None):
+        key = f"{self.name}:{key}"
+        with self._lock:
+            self._buckets.pop(key, None)
+        if self.persistent and conn is not None:
+            conn.execute("DELETE FROM rate_limits WHERE key=?", (key,))
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "allowed": self.allowed, "denied": self.denied, "buckets": len(self._buckets)}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, capacity: float, per_seconds: float, persistent: bool = False) -> RateLimiter:
+    """Process-wide limiter called ``name`` (survives Streamlit reruns)."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = RateLimiter(name, capacity, per_seconds, persistent)
+        limiter.persistent = persistent
+        return limiter
+
+
+def all_limiters():
+    with _limiters_lock:
+        return list(_limiters.values())
@@ -0,0 +1,419 @@
+# reservations.py
+# The reservation core without any UI: trains, bookings, cancellations,
+# seat maps and search.
+#
+# Every function takes a connection and returns plain data or one of the
+# result classes below; nothing here renders, reads session state or touches
+# Streamlit, so the same calls serve app.py, the HTTP API and the benchmarks.
+# app.py only turns results into st.success / st.error messages.
+# Writes end in invalidation.publish(), which commits and tells the caches;
+# writes committed by the seat allocator bump the topics from its on_claim /
+# on_release hook and announce them after that commit.
+import sqlite3
+from dataclasses import dataclass
+from datetime import date
+
+import journey_planner
+from bookings import bookings_for_user, cancel_booking, cancel_run_bookings, new_pnr, record_booking
+from db import DB_PATH, get_pool
+from invalidation import BOOKINGS, TRAINS, VersionedCache, announce, bump, publish, run_topic, sync
+from migrations import ensure_schema
+from seat_allocator import (SeatAllocationBusy, claim_group, claim_seat, claim_segment_seat, is_busy,
+                            release_seat, release_segment)
+from seat_index import availability_index
+from seat_inventory import cached_seat_rows, categorize_seat, delete_seats, init_seats
+from train_search import (fuzzy_search_route, fuzzy_search_trains, register_station, resolve_station,
+                          search_by_route, search_by_train_number)
+from train_stops import get_stops, set_stops, stop_index
+from waitlist import cancel_run_waitlist, join_waitlist, leave_waitlist, promote, waitlist_for_user
+
+# result statuses
+BOOKED = "BOOKED"
+WAITLISTED = "WAITLISTED"
+SOLD_OUT = "SOLD_OUT"
+CANCELLED = "CANCELLED"
+NO_RUN = "NO_RUN"              # no such train on that date
+NOT_FOUND = "NOT_FOUND"        # no such ticket / PNR
+INVALID = "INVALID"            # bad input, see .error
+BUSY = "BUSY"                  # seat allocation lock contention; safe to retry
+
+SEAT_TYPES = ("Aisle", "Middle", "Window")
+GENDERS = ("Male", "Female", "Other")
+MIN_AGE, MAX_AGE = 1, 120
+SEAT_HEADERS = ["Seat", "Type", "Booked", "Name", "Age", "Gender"]
+
+
+@dataclass(frozen=True)
+class BookingResult:
+    status: str
+    pnr: str = None
+    seat_number: int = None
+    seat_type: str = None
+    from_station: str = None     # set for part-route tickets
+    to_station: str = None
+    tier: str = None             # RAC / WL when WAITLISTED
+    queue_no: int = None
+    error: str = None
+
+
+@dataclass(frozen=True)
+class GroupBookingResult:
+    status: str
+    pnr: str = None
+    seats: tuple = ()            # ((passenger name, seat number), ...)
+    error: str = None
+
+
+@dataclass(frozen=True)
+class CancelResult:
+    status: str
+    promoted: tuple = ()         # ((pnr, name), ...) moved up from the waitlist
+    released: int = 0
+    left_waitlist: int = 0
+    error: str = None
+
+
+def to_date_text(d) -> str:
+    if isinstance(d, date):
+        return d.isoformat()
+    return str(d)
+
+
+def init(path: str = DB_PATH):
+    """Migrate ``path`` and warm the process-wide caches (once per process)."""
+    ensure_schema(path)
+    if not availability_index.warmed:
+        with get_pool(path).connection() as conn:
+            # caches built from here on only need changes newer than this
+            sync(conn, force=True)
+            availability_index.warm(conn)
+
+
+# ---- trains ----
+def run_exists(conn, train_number: str, departure_date) -> bool:
+    return conn.execute("SELECT 1 FROM trains WHERE train_number = ? AND departure_date = ?",
+                        (train_number, to_date_text(departure_date))).fetchone() is not None
+
+
+def add_train(conn, train_number, train_name, departure_date, starting_destination, ending_destination,
+              departure_time=None, travel_minutes=None, stops=()):
+    """Insert a run with its seats (and stops). Raises sqlite3.IntegrityError / ValueError."""
+    departure_text = to_date_text(departure_date)
+    time_text = departure_time.strftime("%H:%M") if departure_time else None
+    from_code = register_station(conn, starting_destination)
+    to_code = register_station(conn, ending_destination)
+    conn.execute("INSERT INTO trains (train_number, train_name, departure_date, starting_destination, ending_destination, from_code, to_code, departure_time, travel_minutes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 (train_number, train_name, departure_text, starting_destination, ending_destination, from_code, to_code,
+                  time_text, int(travel_minutes) if travel_minutes else None))
+    if stops:
+        set_stops(conn, train_number, departure_text, starting_destination, ending_destination, stops, travel_minutes)
+    init_seats(conn, train_number, departure_text, commit=False)
+    publish(conn, TRAINS, run_topic(train_number, departure_text))
+
+
+def delete_train(conn, train_number, departure_date) -> bool:
+    """Remove one run with its seats, stops, bookings and waitlist. False if there was no such run."""
+    departure_text = to_date_text(departure_date)
+    if not run_exists(conn, train_number, departure_text):
+        return False
+    conn.execute("DELETE FROM trains WHERE train_number = ? AND departure_date = ?",
+                 (train_number, departure_text))
+    # only this run's seats go; other dates of the same train are untouched
+    delete_seats(conn, train_number, departure_text, commit=False)
+    cancel_run_bookings(conn, train_number, departure_text)
+    cancel_run_waitlist(conn, train_number, departure_text)
+    conn.execute("DELETE FROM train_stops WHERE train_number = ? AND departure_date = ?",
+                 (train_number, departure_text))
+    publish(conn, TRAINS, BOOKINGS, run_topic(train_number, departure_text))
+    availability_index.invalidate(train_number, departure_text)
+    return True
+
+
+def bumping(changes: dict, topics, write):
+    """Wrap an on_claim / on_release callback so ``topics`` are bumped in its transaction.
+
+    ``changes`` ends up holding the generations of the attempt that
+    committed; announce() them once the claim or release has returned.
+    """
+    def callback(conn, *args):
+        result = write(conn, *args)
+        changes.update(bump(conn, *topics))
+        return result
+    return callback
+
+
+# ---- booking ----
+def passenger_error(passenger):
+    """The Book Ticket form's rules for (name, age, gender): a message, or None if they hold."""
+    name, age, gender = passenger
+    if not isinstance(name, str) or not name.strip():
+        return "Passenger name is required."
+    if not isinstance(age, int) or isinstance(age, bool) or not MIN_AGE <= age <= MAX_AGE:
+        return f"Age must be a whole number from {MIN_AGE} to {MAX_AGE}."
+    if gender not in GENDERS:
+        return f"Gender must be one of {', '.join(GENDERS)}."
+    return None
+
+
+def book(conn, username, train_number, departure_date, passenger, seat_type,
+         board_at="", alight_at="", waitlist=True) -> BookingResult:
+    """Book one seat for ``passenger`` = (name, age, gender).
+
+    With board_at / alight_at only the segments travelled are taken. A
+    full-route booking on a run with no free seat of any type joins the
+    waitlist for ``seat_type`` unless waitlist=False.
+    """
+    departure_text = to_date_text(departure_date)
+    if seat_type not in SEAT_TYPES:
+        return BookingResult(INVALID, error=f"Seat type must be one of {', '.join(SEAT_TYPES)}.")
+    problem = passenger_error(passenger)
+    if problem:
+        return BookingResult(INVALID, error=problem)
+    if not run_exists(conn, train_number, departure_text):
+        return BookingResult(NO_RUN, error=f"No such Train {train_number} on {departure_text}.")
+    from_station = to_station = None
+    pnr = new_pnr(conn)
+    changes, topics = {}, (BOOKINGS, run_topic(train_number, departure_text))
+    # pick + mark the seat in one atomic statement (no select-then-update race);
+    # the ticket row is written in the same transaction
+    try:
+        if board_at or alight_at:
+            stops = get_stops(conn, train_number, departure_text)
+            from_stop = stop_index(stops, board_at, 0)
+            to_stop = stop_index(stops, alight_at, len(stops) - 1)
+            from_station, to_station = stops[from_stop][1], stops[to_stop][1]
+            seat_number = claim_segment_seat(
+                conn, train_number, departure_text, seat_type, from_stop, to_stop, *passenger,
+                index=availability_index,
+                on_claim=bumping(changes, topics, lambda conn, seat: record_booking(
+                    conn, pnr, username, train_number, departure_text, seat, seat_type, passenger,
+                    from_stop, to_stop, from_station, to_station)))
+        else:
+            seat_number = claim_seat(
+                conn, train_number, departure_text, seat_type, *passenger,
+                index=availability_index,
+                on_claim=bumping(changes, topics, lambda conn, seat: record_booking(
+                    conn, pnr, username, train_number, departure_text, seat, seat_type, passenger)))
+    except ValueError as e:
+        return BookingResult(INVALID, error=str(e))
+    except SeatAllocationBusy:
+        return BookingResult(BUSY, error="Booking system is busy right now. Please try again in a moment.")
+    if seat_number:
+        announce(changes)
+        return BookingResult(BOOKED, pnr, seat_number, seat_type, from_station, to_station)
+    other_types = free_seat_types(conn, train_number, departure_text)
+    if other_types:
+        # a seat of another type is still free: offer that rather than queueing
+        return BookingResult(SOLD_OUT, seat_type=seat_type,
+                             error=f"No {seat_type} seats left; {', '.join(other_types)} seats are still free.")
+    if waitlist and from_station is None:
+        # the whole run is sold out: queue for the next full-route cancellation of this seat type
+        try:
+            tier, queue_no = join_waitlist(conn, pnr, username, train_number, departure_text, seat_type, passenger)
+            publish(conn, BOOKINGS)
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy(e):
+                raise
+            return BookingResult(BUSY, error="Booking system is busy right now. Please try again in a moment.")
+        return BookingResult(WAITLISTED, pnr, seat_type=seat_type, tier=tier, queue_no=queue_no)
+    return BookingResult(SOLD_OUT, seat_type=seat_type)
+
+
+def free_seat_types(conn, train_number, departure_text) -> list:
+    """Seat types that still have a seat free end to end on one run."""
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT seat_type FROM seat_inventory WHERE train_number=? AND departure_date=? AND booked=0 "
+        "ORDER BY seat_type", (train_number, departure_text))]
+
+
+def parse_passengers(text: str):
+    """'Name, Age, Gender[, Seat Type]' per line -> [(name, age, gender, seat_type or None)]."""
+    passengers = []
+    for n, line in enumerate((text or "").splitlines(), start=1):
+        parts = [p.strip() for p in line.split(",")]
+        if not parts[0]:
+            continue
+        if len(parts) < 3 or not parts[1].isdigit():
+            raise ValueError(f"Line {n}: expected 'Name, Age, Gender[, Seat Type]'.")
+        seat_type = parts[3].title() if len(parts) > 3 and parts[3] else None
+        if seat_type and seat_type not in SEAT_TYPES:
+            raise ValueError(f"Line {n}: seat type must be Aisle, Middle or Window.")
+        passengers.append((parts[0], int(parts[1]), parts[2].title(), seat_type))
+    return passengers
+
+
+def group_passenger_error(passenger):
+    """passenger_error() for a (name, age, gender[, seat type or None]) group entry."""
+    if not isinstance(passenger, (tuple, list)) or len(passenger) not in (3, 4):
+        return "expected (name, age, gender[, seat type])."
+    seat_type = passenger[3] if len(passenger) == 4 else None
+    if seat_type is not None and seat_type not in SEAT_TYPES:
+        return f"Seat type must be one of {', '.join(SEAT_TYPES)}."
+    return passenger_error(tuple(passenger[:3]))
+
+
+def book_group(conn, username, train_number, departure_date, passengers, keep_together=True) -> GroupBookingResult:
+    """Seats for every passenger in one transaction: all of them or none."""
+    departure_text = to_date_text(departure_date)
+    if not run_exists(conn, train_number, departure_text):
+        return GroupBookingResult(NO_RUN, error=f"No such Train {train_number} on {departure_text}.")
+    if not passengers:
+        return GroupBookingResult(INVALID, error="Please add at least one passenger.")
+    for n, passenger in enumerate(passengers, start=1):
+        problem = group_passenger_error(passenger)
+        if problem:
+            return GroupBookingResult(INVALID, error=f"Passenger {n}: {problem}")
+    pnr = new_pnr(conn)
+    changes = {}
+    try:
+        booked = claim_group(conn, train_number, departure_text, passengers, keep_together=keep_together,
+                             index=availability_index,
+                             on_claim=bumping(changes, (BOOKINGS, run_topic(train_number, departure_text)),
+                                              lambda conn, seat, passenger: record_booking(
+                                                  conn, pnr, username, train_number, departure_text, seat,
+                                                  categorize_seat(seat), passenger)))
+    except SeatAllocationBusy:
+        return GroupBookingResult(BUSY, error="Booking system is busy right now. Please try again in a moment.")
+    if not booked:
+        return GroupBookingResult(SOLD_OUT)
+    announce(changes)
+    return GroupBookingResult(BOOKED, pnr, tuple(booked))
+
+
+# ---- cancellation ----
+def release_ticket(conn, train_number, departure_text, seat_number, from_stop=None, promoted=None, commit=True,
+                   freed=None, changes=None):
+    """Cancel one ticket and, in the same transaction, hand the seat to the waitlist head.
+
+    With commit=False the seat index isn't touched; seats left free are
+    appended to ``freed`` for the caller to mark after its commit. With
+    ``changes`` the cache topics are bumped in the release's transaction.
+    """
+    def on_release(conn, seat):
+        cancel_booking(conn, train_number, departure_text, seat, from_stop)
+        head = promote(conn, train_number, departure_text, seat)
+        if head and promoted is not None:
+            promoted.append(head)
+        return head is not None
+
+    if changes is not None:
+        on_release = bumping(changes, (BOOKINGS, run_topic(train_number, departure_text)), on_release)
+    if from_stop is None:
+        return release_seat(conn, train_number, departure_text, seat_number, index=availability_index,
+                            on_release=on_release, commit=commit, freed=freed)
+    return release_segment(conn, train_number, departure_text, seat_number, from_stop, index=availability_index,
+                           on_release=on_release, commit=commit, freed=freed)
+
+
+def cancel(conn, train_number, departure_date, seat_number, board_at="") -> CancelResult:
+    """Cancel the ticket on one seat (the part-route one boarding at ``board_at``, if given)."""
+    departure_text = to_date_text(departure_date)
+    if not run_exists(conn, train_number, departure_text):
+        return CancelResult(NO_RUN, error=f"No such Train {train_number} on {departure_text}.")
+    from_stop = None
+    if board_at:
+        try:
+            from_stop = stop_index(get_stops(conn, train_number, departure_text), board_at, 0)
+        except ValueError as e:
+            return CancelResult(INVALID, error=str(e))
+    promoted, changes = [], {}
+    if not release_ticket(conn, train_number, departure_text, seat_number, from_stop, promoted, changes=changes):
+        return CancelResult(NOT_FOUND, error=f"Seat {seat_number} on Train {train_number} ({departure_text}) has no such booking.")
+    announce(changes)
+    return CancelResult(CANCELLED, tuple(promoted), released=1)
+
+
+def cancel_pnr(conn, username, pnr: str) -> CancelResult:
+    """Cancel every ticket and waitlist entry of ``username``'s PNR in one transaction."""
+    pnr = pnr.strip()
+    promoted, freed = [], []
+    tickets = conn.execute(
+        "SELECT train_number, departure_date, seat_number, from_stop FROM bookings "
+        "WHERE pnr=? AND username=? AND status='CONFIRMED' ORDER BY id", (pnr, username)).fetchall()
+    owns_waitlist = conn.execute("SELECT 1 FROM waitlist WHERE pnr=? AND username=? LIMIT 1",
+                                 (pnr, username)).fetchone()
+    for train_number, departure_text, seat_number, from_stop in tickets:
+        release_ticket(conn, train_number, departure_text, seat_number, from_stop, promoted, commit=False,
+                       freed=freed)
+    left = leave_waitlist(conn, pnr) if owns_waitlist else 0
+    runs = {run_topic(train_number, departure_text) for train_number, departure_text, _, _ in tickets}
+    publish(conn, *runs, *((BOOKINGS,) if tickets or left else ()))
+    # publish() committed the releases; only now can other sessions be offered the seats
+    for run_seat in freed:
+        availability_index.mark_free(*run_seat)
+    if not tickets and not left:
+        return CancelResult(NOT_FOUND, error=f"No active tickets under PNR {pnr} in your account.")
+    return CancelResult(CANCELLED, tuple(promoted), released=len(tickets), left_waitlist=left)
+
+
+# ---- my bookings ----
+user_bookings_cache = VersionedCache(max_entries=256)   # up to 400 rows per account
+
+
+def user_bookings(conn, username):
+    """(tickets, waitlist entries) of one account, kept until a booking change is published."""
+    return user_bookings_cache.get(username, BOOKINGS, lambda: (
+        bookings_for_user(conn, username), waitlist_for_user(conn, username)))
+
+
+# ---- seats & search ----
+def seat_map(conn, train_number, departure_date):
+    """Rows of SEAT_HEADERS for one run; [] if it has no seats."""
+    rows = cached_seat_rows(conn, train_number, to_date_text(departure_date))
+    # seats carrying only part-route passengers are still free on other segments
+    return [(seat, seat_type, ("Yes" if mask == -1 else "Partly") if booked else "No", name, age, gender)
+            for seat, seat_type, booked, name, age, gender, mask in rows]
+
+
+def free_seats(conn, train_number, departure_date) -> dict:
+    """{seat type: free full-route seats} for one run."""
+    counts = {seat_type: 0 for seat_type in SEAT_TYPES}
+    for seat, seat_type, booked, *_ in cached_seat_rows(conn, train_number, to_date_text(departure_date)):
+        if not booked:
+            counts[seat_type] = counts.get(seat_type, 0) + 1
+    return counts
+
+
+def free_seats_many(conn, runs) -> dict:
+    """{(train_number, departure_date): {seat type: free seats}} for many runs in one query.
+
+    Runs with no seats are left out.
+    """
+    runs = list(dict.fromkeys((train, to_date_text(day)) for train, day in runs))
+    result = {}
+    # 400 runs = 800 parameters, well inside SQLite's limit
+    for start in range(0, len(runs), 400):
+        chunk = runs[start:start + 400]
+        values = ", ".join("(?, ?)" for _ in chunk)
+        # CROSS JOIN keeps the wanted runs as the outer loop: one primary-key
+        # range per run instead of a scan of seat_inventory
+        for train_number, departure_text, seat_type, free in conn.execute(
+                f"WITH wanted (train_number, departure_date) AS (VALUES {values}) "
+                "SELECT s.train_number, s.departure_date, s.seat_type, SUM(s.booked = 0) "
+                "FROM wanted w CROSS JOIN seat_inventory s "
+                "ON s.train_number = w.train_number AND s.departure_date = w.departure_date "
+                "GROUP BY s.train_number, s.departure_date, s.seat_type",
+                [value for run in chunk for value in run]):
+            result.setdefault((train_number, departure_text), {t: 0 for t in SEAT_TYPES})[seat_type] = free
+    return result
+
+
+def search_train_number(conn, train_no: str, substring: bool = False):
+    # exact / prefix on the index first, then ranked fuzzy match on number + name
+    return search_by_train_number(conn, train_no, substring=substring) or fuzzy_search_trains(conn, train_no)
+
+
+def search_route(conn, src: str, dest: str, dep_date=None, substring: bool = False):
+    dep_text = to_date_text(dep_date) if dep_date else None
+    return (search_by_route(conn, src, dest, dep_text)
+            or fuzzy_search_route(conn, src, dest, dep_text)
+            or (search_by_route(conn, src, dest, dep_text, substring=True) if substring else []))
+
+
+def plan_journeys(conn, src: str, dest: str, dep_date, max_changes: int = 2):
+    planner = journey_planner.get_planner(conn)
+    origin, target = resolve_station(conn, src), resolve_station(conn, dest)
+    start = journey_planner.to_minutes(to_date_text(dep_date))
+    return planner.plan(origin, target, start, max_changes=max_changes)
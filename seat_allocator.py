@@ -0,0 +1,392 @@
+# seat_allocator.py
+# Atomic seat allocation for ERailTicket.
+#
+# A seat is claimed with a single conditional UPDATE ... RETURNING, so picking
+# the next free seat and marking it booked happen in one statement under
+# SQLite's write lock. Two sessions can never walk away with the same seat.
+# When another writer holds the lock we back off and retry a bounded number
+# of times instead of failing the booking outright.
+#
+# on_claim / on_release callbacks run inside the claim's transaction, just
+# before the commit, so callers can write related rows (bookings, waitlist)
+# atomically with the seat. An on_release that hands the seat straight to
+# someone else (waitlist promotion) returns True so the index keeps it booked.
+# Releases with commit=False leave the index alone (the caller's transaction
+# may still fail); they append the freed seats to ``freed`` so the caller can
+# mark them free after its own commit.
+import random
+import sqlite3
+import threading
+import time
+
+from train_stops import segment_mask
+
+MAX_RETRIES = 8
+BACKOFF_BASE = 0.002   # seconds
+BACKOFF_CAP = 0.050    # seconds
+
+
+class SeatAllocationBusy(Exception):
+    """Raised when the seat table stayed locked for every retry."""
+
+
+class AllocationStats:
+    """Thread-safe counters for throughput and conflict-rate reporting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.conflicts = 0
+        self.booked = 0
+        self.sold_out = 0
+        self.gave_up = 0
+
+    def record(self, attempts: int, conflicts: int, outcome: str):
+        with self._lock:
+            self.attempts += attempts
+            self.conflicts += conflicts
+            if outcome == "booked":
+                self.booked += 1
+            elif outcome == "sold_out":
+                self.sold_out += 1
+            else:
+                self.gave_up += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            requests = self.booked + self.sold_out + self.gave_up
+            return {
+                "requests": requests,
+                "booked": self.booked,
+                "sold_out": self.sold_out,
+                "gave_up": self.gave_up,
+                "attempts": self.attempts,
+                "conflicts": self.conflicts,
+                "conflict_rate": (self.conflicts / self.attempts) if self.attempts else 0.0,
+                "elapsed_s": elapsed,
+                "throughput_rps": (requests / elapsed) if elapsed > 0 else 0.0,
+            }
+
+
+def is_busy(exc: sqlite3.OperationalError) -> bool:
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def _backoff(attempt: int):
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))
+    time.sleep(random.uniform(0, delay))
+
+
+CLAIM_NEXT_SQL = (
+    "UPDATE seat_inventory SET booked=1, occupied_mask=-1, passenger_name=?, passenger_age=?, passenger_gender=? "
+    "WHERE train_number=? AND departure_date=? AND seat_number = ("
+    "SELECT seat_number FROM seat_inventory WHERE train_number=? AND departure_date=? "
+    "AND booked=0 AND seat_type=? ORDER BY seat_number ASC LIMIT 1) "
+    "AND booked=0 RETURNING seat_number"
+)
+
+CLAIM_SEAT_SQL = (
+    "UPDATE seat_inventory SET booked=1, occupied_mask=-1, passenger_name=?, passenger_age=?, passenger_gender=? "
+    "WHERE train_number=? AND departure_date=? AND seat_number=? AND seat_type=? AND booked=0 "
+    "RETURNING seat_number"
+)
+
+
+def _claim_once(conn, train_number, departure_date, seat_type, passenger, index, on_claim):
+    if index is not None:
+        while True:
+            seat = index.next_free(conn, train_number, departure_date, seat_type)
+            if seat is None:
+                break
+            row = conn.execute(CLAIM_SEAT_SQL, (*passenger, train_number, departure_date, seat, seat_type)).fetchone()
+            # either we got it or the bit was stale (taken elsewhere) - it's not free any more
+            index.mark_booked(train_number, departure_date, seat_type, seat)
+            if row:
+                if on_claim is not None:
+                    on_claim(conn, seat)
+                conn.commit()
+                return seat
+    # index empty or not in use: ask the database directly
+    row = conn.execute(CLAIM_NEXT_SQL, (*passenger, train_number, departure_date,
+                                        train_number, departure_date, seat_type)).fetchone()
+    if row and on_claim is not None:
+        on_claim(conn, row[0])
+    conn.commit()
+    if row and index is not None:
+        # the DB had a seat the index didn't know about; rebuild this run next time
+        index.invalidate(train_number, departure_date)
+    return row[0] if row else None
+
+
+def claim_seat(conn, train_number, departure_date, seat_type, passenger_name, passenger_age, passenger_gender,
+               max_retries: int = MAX_RETRIES, stats: AllocationStats = None, index=None, on_claim=None):
+    """Atomically book the lowest free seat of ``seat_type`` on one train run.
+
+    With a SeatAvailabilityIndex the candidate seat comes from its bitset and
+    is claimed with a conditional UPDATE on that seat number; otherwise the
+    UPDATE picks the seat itself. Returns the seat number, or None when no
+    seat of that type is left. Raises SeatAllocationBusy if the database
+    stayed locked for every retry.
+    """
+    passenger = (passenger_name, int(passenger_age), passenger_gender)
+    conflicts = 0
+    for attempt in range(max_retries + 1):
+        try:
+            seat = _claim_once(conn, train_number, departure_date, seat_type, passenger, index, on_claim)
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if index is not None:
+                # bits cleared before the rollback may be wrong now
+                index.invalidate(train_number, departure_date)
+            if not is_busy(e):
+                raise
+            conflicts += 1
+            if attempt < max_retries:
+                _backoff(attempt)
+            continue
+        if stats is not None:
+            stats.record(attempt + 1, conflicts, "booked" if seat else "sold_out")
+        return seat
+    if stats is not None:
+        stats.record(max_retries + 1, conflicts, "gave_up")
+    raise SeatAllocationBusy(f"Seats for train {train_number} on {departure_date} are busy, try again.")
+
+
+def _freed(index, committed, freed, train_number, departure_date, seat_type, seat_number):
+    if committed:
+        if index is not None:
+            index.mark_free(train_number, departure_date, seat_type, seat_number)
+    elif freed is not None:
+        freed.append((train_number, departure_date, seat_type, seat_number))
+
+
+def release_seat(conn, train_number, departure_date, seat_number, index=None, on_release=None,
+                 commit: bool = True, freed: list = None) -> bool:
+    """Free a full-route booking. Returns False if the seat wasn't booked end to end."""
+    row = conn.execute(
+        "UPDATE seat_inventory SET booked=0, occupied_mask=0, passenger_name='', passenger_age=NULL, passenger_gender='' "
+        "WHERE train_number=? AND departure_date=? AND seat_number=? AND occupied_mask=-1 RETURNING seat_type",
+        (train_number, departure_date, int(seat_number))
+    ).fetchone()
+    retaken = bool(row and on_release is not None and on_release(conn, int(seat_number)))
+    if commit:
+        conn.commit()
+    if row and not retaken:
+        _freed(index, commit, freed, train_number, departure_date, row[0], int(seat_number))
+    return row is not None
+
+
+# ---- part-route (segment) bookings ----
+CLAIM_SEGMENT_SQL = (
+    "UPDATE seat_inventory SET booked=1, occupied_mask = occupied_mask | :mask "
+    "WHERE train_number=:train AND departure_date=:date AND seat_number = ("
+    "SELECT seat_number FROM seat_inventory WHERE train_number=:train AND departure_date=:date "
+    "AND seat_type=:type AND (occupied_mask & :mask) = 0 "
+    # best fit: reuse seats that already carry part-route passengers and keep
+    # fully free seats for end-to-end bookings
+    "ORDER BY booked DESC, seat_number ASC LIMIT 1) "
+    "AND (occupied_mask & :mask) = 0 RETURNING seat_number, occupied_mask"
+)
+
+
+def _claim_segment_once(conn, train_number, departure_date, seat_type, from_stop, to_stop, mask, passenger, index,
+                        on_claim):
+    row = conn.execute(CLAIM_SEGMENT_SQL, {"mask": mask, "train": train_number,
+                                           "date": departure_date, "type": seat_type}).fetchone()
+    if not row:
+        conn.commit()
+        return None
+    seat, new_mask = row
+    conn.execute(
+        "INSERT INTO seat_segments (train_number, departure_date, seat_number, from_stop, to_stop, segment_mask, "
+        "passenger_name, passenger_age, passenger_gender) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (train_number, departure_date, seat, from_stop, to_stop, mask, *passenger))
+    if on_claim is not None:
+        on_claim(conn, seat)
+    conn.commit()
+    if index is not None and new_mask == mask:
+        # seat was completely free until now
+        index.mark_booked(train_number, departure_date, seat_type, seat)
+    return seat
+
+
+def claim_segment_seat(conn, train_number, departure_date, seat_type, from_stop, to_stop,
+                       passenger_name, passenger_age, passenger_gender,
+                       max_retries: int = MAX_RETRIES, stats: AllocationStats = None, index=None, on_claim=None):
+    """Book a seat of ``seat_type`` from stop ``from_stop`` to stop ``to_stop``.
+
+    A seat qualifies when its occupied_mask has none of the ticket's segment
+    bits set, so a seat sold A->C can be sold again C->E. Same retry and
+    return conventions as claim_seat.
+    """
+    mask = segment_mask(from_stop, to_stop)
+    passenger = (passenger_name, int(passenger_age), passenger_gender)
+    conflicts = 0
+    for attempt in range(max_retries + 1):
+        try:
+            seat = _claim_segment_once(conn, train_number, departure_date, seat_type,
+                                       from_stop, to_stop, mask, passenger, index, on_claim)
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy(e):
+                raise
+            conflicts += 1
+            if attempt < max_retries:
+                _backoff(attempt)
+            continue
+        if stats is not None:
+            stats.record(attempt + 1, conflicts, "booked" if seat else "sold_out")
+        return seat
+    if stats is not None:
+        stats.record(max_retries + 1, conflicts, "gave_up")
+    raise SeatAllocationBusy(f"Seats for train {train_number} on {departure_date} are busy, try again.")
+
+
+def release_segment(conn, train_number, departure_date, seat_number, from_stop, index=None, on_release=None,
+                    commit: bool = True, freed: list = None) -> bool:
+    """Cancel the part-route booking on a seat that boards at ``from_stop``."""
+    row = conn.execute(
+        "DELETE FROM seat_segments WHERE id = (SELECT id FROM seat_segments WHERE train_number=? "
+        "AND departure_date=? AND seat_number=? AND from_stop=? LIMIT 1) RETURNING segment_mask",
+        (train_number, departure_date, int(seat_number), from_stop)).fetchone()
+    if not row:
+        if commit:
+            conn.commit()
+        return False
+    # SET expressions all see the old row, so booked is computed from the old mask too
+    now_free = conn.execute(
+        "UPDATE seat_inventory SET occupied_mask = occupied_mask & ~:mask, "
+        "booked = ((occupied_mask & ~:mask) != 0) "
+        "WHERE train_number=:train AND departure_date=:date AND seat_number=:seat "
+        "RETURNING seat_type, occupied_mask",
+        {"mask": row[0], "train": train_number, "date": departure_date, "seat": int(seat_number)}).fetchone()
+    retaken = on_release is not None and bool(on_release(conn, int(seat_number)))
+    if commit:
+        conn.commit()
+    if now_free and now_free[1] == 0 and not retaken:
+        _freed(index, commit, freed, train_number, departure_date, now_free[0], int(seat_number))
+    return True
+
+
+# ---- group bookings ----
+BAY_SIZE = 10   # seats 1-10, 11-20, ... sit together in one bay
+
+
+def _bay(seat: int) -> int:
+    return (seat - 1) // BAY_SIZE
+
+
+def _pick_group_seats(free, passengers, keep_together: bool):
+    """Choose one seat per passenger from ``free`` [(seat_number, seat_type)].
+
+    With keep_together, picks the k free seats with the smallest spread
+    (a window that fits in one bay wins, then the one that satisfies most
+    seat-type preferences); otherwise each passenger gets the lowest free
+    seat of the preferred type. Returns seat numbers in passenger order,
+    or None if there aren't enough free seats.
+    """
+    k = len(passengers)
+    if k == 0 or len(free) < k:
+        return None
+    wanted = [p[3] for p in passengers]
+    if keep_together:
+        best = None
+        for i in range(len(free) - k + 1):
+            window = free[i:i + k]
+            span = window[-1][0] - window[0][0]
+            split = _bay(window[-1][0]) != _bay(window[0][0])
+            types = [t for _, t in window]
+            matched = 0
+            for t in wanted:
+                if t and t in types:
+                    types.remove(t)
+                    matched += 1
+            key = (split, span, -matched)
+            if best is None or key < best[0]:
+                best = (key, window)
+        pool = list(best[1])
+    else:
+        pool = list(free)
+    chosen = [None] * k
+    # passengers with a preference first, then everybody else takes what's left
+    for i, t in enumerate(wanted):
+        if t:
+            for seat in pool:
+                if seat[1] == t:
+                    chosen[i] = seat[0]
+                    pool.remove(seat)
+                    break
+    for i in range(k):
+        if chosen[i] is None:
+            if not pool:
+                return None
+            chosen[i] = pool.pop(0)[0]
+    return chosen
+
+
+def _claim_group_once(conn, train_number, departure_date, passengers, keep_together, index, on_claim):
+    # take the write lock first so the free list can't change under us
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        free = conn.execute(
+            "SELECT seat_number, seat_type FROM seat_inventory WHERE train_number=? AND departure_date=? "
+            "AND booked=0 ORDER BY seat_number", (train_number, departure_date)).fetchall()
+        seats = _pick_group_seats(free, passengers, keep_together)
+        if seats is None:
+            conn.rollback()
+            return None
+        cur = conn.executemany(
+            "UPDATE seat_inventory SET booked=1, occupied_mask=-1, passenger_name=?, passenger_age=?, passenger_gender=? "
+            "WHERE train_number=? AND departure_date=? AND seat_number=? AND booked=0",
+            [(name, int(age), gender, train_number, departure_date, seat)
+             for (name, age, gender, _), seat in zip(passengers, seats)])
+        if cur.rowcount != len(seats):
+            conn.rollback()
+            return None
+        if on_claim is not None:
+            for passenger, seat in zip(passengers, seats):
+                on_claim(conn, seat, passenger)
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    if index is not None:
+        types = dict(free)
+        for seat in seats:
+            index.mark_booked(train_number, departure_date, types[seat], seat)
+    return list(zip((p[0] for p in passengers), seats))
+
+
+def claim_group(conn, train_number, departure_date, passengers, keep_together: bool = True,
+                max_retries: int = MAX_RETRIES, stats: AllocationStats = None, index=None, on_claim=None):
+    """Book seats for a whole group in one transaction.
+
+    ``passengers`` is a list of (name, age, gender, seat_type or None). Either
+    every passenger gets a seat or none does. Returns [(name, seat_number)]
+    in passenger order, or None when the run hasn't enough free seats.
+    ``on_claim`` is called as on_claim(conn, seat_number, passenger) per seat.
+    """
+    passengers = [tuple(p) + (None,) * (4 - len(p)) for p in passengers]
+    conflicts = 0
+    for attempt in range(max_retries + 1):
+        try:
+            booked = _claim_group_once(conn, train_number, departure_date, passengers, keep_together, index, on_claim)
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            conflicts += 1
+            if attempt < max_retries:
+                _backoff(attempt)
+            continue
+        if stats is not None:
+            stats.record(attempt + 1, conflicts, "booked" if booked else "sold_out")
+        return booked
+    if stats is not None:
+        stats.record(max_retries + 1, conflicts, "gave_up")
+    raise SeatAllocationBusy(f"Seats for train {train_number} on {departure_date} are busy, try again.")
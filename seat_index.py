@@ -0,0 +1,137 @@
+# seat_index.py
+# In-memory seat availability index.
+#
+# Each train run keeps one Python int per seat type used as a bitset: bit n is
+# set while seat n is free. "Next free Window seat" is then a lowest-set-bit
+# lookup instead of an SQL scan. The database stays the source of truth:
+# claims are still conditional UPDATEs, a stale bit just costs one extra
+# attempt, and runs that are not cached are loaded from seat_inventory.
+import threading
+
+from invalidation import parse_run_topic, subscribe
+
+
+def lowest_set_bit(bits: int) -> int:
+    return (bits & -bits).bit_length() - 1
+
+
+def _bitsets(rows):
+    runs = {}
+    for train_number, departure_date, seat_number, seat_type, booked in rows:
+        by_type = runs.setdefault((train_number, departure_date), {})
+        by_type[seat_type] = by_type.get(seat_type, 0) | (0 if booked else 1 << seat_number)
+    return runs
+
+
+class SeatAvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}   # (train_number, departure_date) -> {seat_type: bitset of free seats}
+        self.warmed = False
+        self.hits = 0
+        self.misses = 0
+
+    # ---- building ----
+    def warm(self, conn):
+        """Build bitsets for every run in seat_inventory (once per process)."""
+        if self.warmed:
+            return
+        runs = _bitsets(conn.execute(
+            "SELECT train_number, departure_date, seat_number, seat_type, booked FROM seat_inventory"))
+        with self._lock:
+            self._runs = runs
+            self.warmed = True
+
+    def load_run(self, conn, train_number: str, departure_date: str) -> bool:
+        runs = _bitsets(conn.execute(
+            "SELECT train_number, departure_date, seat_number, seat_type, booked FROM seat_inventory "
+            "WHERE train_number=? AND departure_date=?",
+            (train_number, departure_date)))
+        with self._lock:
+            self._runs.pop((train_number, departure_date), None)
+            self._runs.update(runs)
+        return bool(runs)
+
+    def invalidate(self, train_number: str, departure_date: str):
+        with self._lock:
+            self._runs.pop((train_number, departure_date), None)
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+            self.warmed = False
+
+    # ---- lookups / updates ----
+    def next_free(self, conn, train_number: str, departure_date: str, seat_type: str):
+        """Lowest free seat of ``seat_type`` according to the index, or None."""
+        run = (train_number, departure_date)
+        with self._lock:
+            by_type = self._runs.get(run)
+        if by_type is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if not self.load_run(conn, train_number, departure_date):
+                return None
+        with self._lock:
+            bits = self._runs.get(run, {}).get(seat_type, 0)
+        return lowest_set_bit(bits) if bits else None
+
+    def mark_booked(self, train_number: str, departure_date: str, seat_type: str, seat_number: int):
+        with self._lock:
+            by_type = self._runs.get((train_number, departure_date))
+            if by_type is not None and seat_type in by_type:
+                by_type[seat_type] &= ~(1 << seat_number)
+
+    def mark_free(self, train_number: str, departure_date: str, seat_type: str, seat_number: int):
+        with self._lock:
+            by_type = self._runs.get((train_number, departure_date))
+            if by_type is not None:
+                by_type[seat_type] = by_type.get(seat_type, 0) | (1 << seat_number)
+
+    def free_count(self, train_number: str, departure_date: str, seat_type: str) -> int:
+        with self._lock:
+            bits = self._runs.get((train_number, departure_date), {}).get(seat_type, 0)
+        return bin(bits).count("1")
+
+    # ---- verification ----
+    def check_consistency(self, conn):
+        """Compare every cached bitset with seat_inventory.
+
+        Returns a list of (train_number, departure_date, seat_type, missing, extra)
+        where ``missing`` are seats free in the DB but not in the index and
+        ``extra`` are seats the index thinks are free but the DB has booked.
+        An empty list means the index matches the database.
+        """
+        with self._lock:
+            cached = {run: dict(by_type) for run, by_type in self._runs.items()}
+        problems = []
+        for train_number, departure_date in sorted(cached):
+            actual = _bitsets(conn.execute(
+                "SELECT train_number, departure_date, seat_number, seat_type, booked FROM seat_inventory "
+                "WHERE train_number=? AND departure_date=?",
+                (train_number, departure_date))).get((train_number, departure_date), {})
+            have_by_type = cached[(train_number, departure_date)]
+            for seat_type in sorted(set(actual) | set(have_by_type)):
+                want, have = actual.get(seat_type, 0), have_by_type.get(seat_type, 0)
+                if want != have:
+                    missing = [n for n in range(want.bit_length()) if (want & ~have) >> n & 1]
+                    extra = [n for n in range(have.bit_length()) if (have & ~want) >> n & 1]
+                    problems.append((train_number, departure_date, seat_type, missing, extra))
+        return problems
+
+
+# process-wide index shared by every Streamlit session
+availability_index = SeatAvailabilityIndex()
+
+
+def _drop_remote_runs(topics, remote):
+    # local claims/releases already keep the bits right; runs another process
+    # wrote to are reloaded from seat_inventory on next use
+    for topic in topics:
+        run = parse_run_topic(topic)
+        if run:
+            availability_index.invalidate(*run)
+
+
+subscribe(_drop_remote_runs, remote_only=True)
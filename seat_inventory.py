@@ -0,0 +1,158 @@
+# seat_inventory.py
+# One seat table for every train run, keyed by (train_number, departure_date, seat_number).
+#
+# Older databases kept a separate seats_<train> table per train number that
+# ignored the departure date; migrate_legacy_seat_tables() folds those in.
+#
+# occupied_mask has one bit per segment of the run (see train_stops); a
+# full-route ticket sets every bit (-1). booked is 1 whenever any bit is set,
+# so "booked=0" still means the seat is free for the whole journey.
+# Passengers riding part of the route are listed in seat_segments.
+import sqlite3
+
+from invalidation import VersionedCache, run_topic
+
+SEATS_PER_TRAIN = 50
+
+
+def categorize_seat(seat_number: int) -> str:
+    if (seat_number % 10) in [0, 4, 5, 9]:
+        return "Window"
+    elif (seat_number % 10) in [2, 3, 6, 7]:
+        return "Aisle"
+    else:
+        return "Middle"
+
+
+def legacy_seat_table_name(train_number: str) -> str:
+    # safe table name: remove spaces / dangerous chars
+    tname = "".join(ch for ch in train_number if ch.isalnum() or ch in ("_", "-"))
+    return f"seats_{tname}"
+
+
+def create_seat_inventory(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS seat_inventory (
+                        train_number TEXT NOT NULL,
+                        departure_date TEXT NOT NULL,
+                        seat_number INTEGER NOT NULL,
+                        seat_type TEXT NOT NULL,
+                        booked INTEGER NOT NULL DEFAULT 0,
+                        passenger_name TEXT DEFAULT '',
+                        passenger_age INTEGER,
+                        passenger_gender TEXT DEFAULT '',
+                        occupied_mask INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (train_number, departure_date, seat_number)
+                    ) WITHOUT ROWID''')
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(seat_inventory)")]
+    if "occupied_mask" not in cols:
+        conn.execute("ALTER TABLE seat_inventory ADD COLUMN occupied_mask INTEGER NOT NULL DEFAULT 0")
+        conn.execute("UPDATE seat_inventory SET occupied_mask=-1 WHERE booked=1")
+    conn.execute('''CREATE TABLE IF NOT EXISTS seat_segments (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        train_number TEXT NOT NULL,
+                        departure_date TEXT NOT NULL,
+                        seat_number INTEGER NOT NULL,
+                        from_stop INTEGER NOT NULL,
+                        to_stop INTEGER NOT NULL,
+                        segment_mask INTEGER NOT NULL,
+                        passenger_name TEXT,
+                        passenger_age INTEGER,
+                        passenger_gender TEXT
+                    )''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_seat_segments_seat
+                    ON seat_segments (train_number, departure_date, seat_number, from_stop)''')
+    # covers "next free seat of type X on this run" without touching the table
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_seat_inventory_free
+                    ON seat_inventory (train_number, departure_date, booked, seat_type, seat_number)''')
+    # covers cross-train availability for a date
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_seat_inventory_date_free
+                    ON seat_inventory (departure_date, booked, train_number)''')
+    conn.commit()
+
+
+def init_seats(conn, train_number: str, departure_date: str, seats: int = SEATS_PER_TRAIN, commit: bool = True):
+    conn.executemany(
+        "INSERT OR IGNORE INTO seat_inventory (train_number, departure_date, seat_number, seat_type) VALUES (?, ?, ?, ?)",
+        [(train_number, departure_date, i, categorize_seat(i)) for i in range(1, seats + 1)]
+    )
+    if commit:
+        conn.commit()
+
+
+def delete_seats(conn, train_number: str, departure_date: str, commit: bool = True):
+    conn.execute("DELETE FROM seat_inventory WHERE train_number=? AND departure_date=?",
+                 (train_number, departure_date))
+    conn.execute("DELETE FROM seat_segments WHERE train_number=? AND departure_date=?",
+                 (train_number, departure_date))
+    if commit:
+        conn.commit()
+
+
+def seat_rows(conn, train_number: str, departure_date: str):
+    return conn.execute(
+        "SELECT seat_number, seat_type, booked, passenger_name, passenger_age, passenger_gender, occupied_mask "
+        "FROM seat_inventory WHERE train_number=? AND departure_date=? ORDER BY seat_number ASC",
+        (train_number, departure_date)
+    ).fetchall()
+
+
+seat_map_cache = VersionedCache()
+
+
+def cached_seat_rows(conn, train_number: str, departure_date: str):
+    """seat_rows() kept until a change to the run is published."""
+    return seat_map_cache.get((train_number, departure_date), run_topic(train_number, departure_date),
+                              lambda: seat_rows(conn, train_number, departure_date))
+
+
+def availability(conn, departure_date: str):
+    # free seats per train run on a date, straight off idx_seat_inventory_date_free
+    return conn.execute(
+        "SELECT train_number, COUNT(*) FROM seat_inventory WHERE departure_date=? AND booked=0 "
+        "GROUP BY train_number ORDER BY train_number",
+        (departure_date,)
+    ).fetchall()
+
+
+def migrate_legacy_seat_tables(conn) -> int:
+    """Fold every seats_<train> table into seat_inventory and drop it.
+
+    The legacy tables were shared by all runs of a train, so existing
+    bookings are attached to the earliest run; every run gets a full
+    seat map. Tables with no matching train are left untouched.
+    Returns the number of tables migrated.
+    """
+    legacy = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'seats\\_%' ESCAPE '\\'")]
+    if not legacy:
+        return 0
+    runs = {}
+    for train_number, departure_date in conn.execute(
+            "SELECT train_number, departure_date FROM trains ORDER BY departure_date ASC"):
+        runs.setdefault(legacy_seat_table_name(train_number), []).append((train_number, departure_date))
+
+    migrated = 0
+    try:
+        for table in legacy:
+            table_runs = runs.get(table)
+            if not table_runs:
+                continue
+            for train_number, departure_date in table_runs:
+                init_seats(conn, train_number, departure_date, commit=False)
+            train_number, departure_date = table_runs[0]
+            conn.execute(
+                f"""UPDATE seat_inventory SET booked=1, occupied_mask=-1, passenger_name=l.passenger_name,
+                           passenger_age=l.passenger_age, passenger_gender=l.passenger_gender
+                    FROM (SELECT seat_number, passenger_name, passenger_age, passenger_gender
+                          FROM "{table}" WHERE booked=1) AS l
+                    WHERE seat_inventory.train_number=? AND seat_inventory.departure_date=?
+                      AND seat_inventory.seat_number=l.seat_number""",
+                (train_number, departure_date)
+            )
+            conn.execute(f'DROP TABLE "{table}"')
+            migrated += 1
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return migrated
@@ -0,0 +1,112 @@
+# train_listing.py
+# Cached, keyset-paginated train listings for the View Trains tabs.
+#
+# Both View Trains tabs used to read the whole trains table into a DataFrame
+# on every rerun, whichever tab was open. A listing is now one page of
+# PAGE_SIZE rows in (departure_date, train_number) order, optionally limited to
+# a date range, read through idx_trains_listing. The next page starts after the
+# last row's key instead of at an OFFSET, so page 500 costs the same as page 1.
+# Pages and counts are cached per process and dropped whenever a TRAINS change
+# is published (see invalidation.py).
+import threading
+from collections import OrderedDict
+
+from invalidation import TRAINS, subscribe
+from train_search import TRAIN_COLUMNS
+
+PAGE_SIZE = 50
+CACHE_ENTRIES = 512
+
+
+def create_listing_schema(conn):
+    # rowid rides along in every index entry, so it also serves the tie-break
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_trains_listing
+                    ON trains (departure_date, train_number)''')
+    conn.commit()
+
+
+def _range_clause(date_from, date_to):
+    clauses, params = [], []
+    if date_from:
+        clauses.append("departure_date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("departure_date <= ?")
+        params.append(date_to)
+    return clauses, params
+
+
+def fetch_page(conn, date_from: str = None, date_to: str = None, after=None, limit: int = PAGE_SIZE):
+    """One page of trains, uncached.
+
+    ``after`` is the key returned with the previous page (None for the
+    first). Returns (rows, next_after); next_after is None on the last page.
+    """
+    clauses, params = _range_clause(date_from, date_to)
+    if after is not None:
+        clauses.append("(departure_date, train_number, rowid) > (?, ?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"SELECT rowid, {TRAIN_COLUMNS} FROM trains {where} "
+        f"ORDER BY departure_date, train_number, rowid LIMIT ?", (*params, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_after = (rows[-1][3], rows[-1][1], rows[-1][0]) if more else None
+    return [row[1:] for row in rows], next_after
+
+
+def count_trains(conn, date_from: str = None, date_to: str = None) -> int:
+    clauses, params = _range_clause(date_from, date_to)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return conn.execute(f"SELECT COUNT(*) FROM trains {where}", params).fetchone()[0]
+
+
+class ListingCache:
+    """Pages and counts keyed by their arguments, cleared whenever trains change."""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, load):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            version = self.version
+        value = load()
+        with self._lock:
+            # a write that landed while we were reading makes this result stale
+            if version == self.version:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def page(self, conn, date_from=None, date_to=None, after=None, limit=PAGE_SIZE):
+        return self._get(("page", date_from, date_to, after, limit),
+                         lambda: fetch_page(conn, date_from, date_to, after, limit))
+
+    def count(self, conn, date_from=None, date_to=None):
+        return self._get(("count", date_from, date_to), lambda: count_trains(conn, date_from, date_to))
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "version": self.version}
+
+
+listing_cache = ListingCache()
+subscribe(lambda topics, remote: listing_cache.invalidate() if TRAINS in topics else None)
@@ -0,0 +1,186 @@
+# train_search.py
+# Indexed train search.
+#
+# Station names are normalised to codes ("New Delhi", "new  delhi" -> "NEWDELHI")
+# and stored next to the free-text names on trains, so From/To searches are
+# exact or prefix lookups on an index instead of '%x%' scans. Anything those
+# miss ("delhi", "rajdhani exp") goes through the trains_fts trigram index,
+# which is kept in sync with trains by triggers. A raw '%x%' scan is still
+# available, but only when the caller asks for it.
+import re
+
+TRAIN_COLUMNS = "train_number, train_name, departure_date, starting_destination, ending_destination"
+
+FTS_COLUMNS = "train_number, train_name, starting_destination, ending_destination"
+_JOINED_COLUMNS = ", ".join("t." + col.strip() for col in TRAIN_COLUMNS.split(","))
+
+_NON_CODE = re.compile(r"[^A-Z0-9]")
+_WORDS = re.compile(r"\w+")
+
+
+def station_key(text) -> str:
+    return _NON_CODE.sub("", str(text or "").upper())
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    # smallest string greater than every string starting with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def create_search_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS stations
+                    (code TEXT PRIMARY KEY, name TEXT NOT NULL)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_stations_name ON stations (name COLLATE NOCASE)''')
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(trains)")]
+    if "from_code" not in cols:
+        conn.execute("ALTER TABLE trains ADD COLUMN from_code TEXT")
+    if "to_code" not in cols:
+        conn.execute("ALTER TABLE trains ADD COLUMN to_code TEXT")
+    backfill_station_codes(conn)
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_trains_route
+                    ON trains (from_code, to_code, departure_date)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_trains_number
+                    ON trains (train_number, departure_date)''')
+    create_fts(conn)
+    conn.commit()
+
+
+def create_fts(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='trains_fts'").fetchone()
+    conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS trains_fts USING fts5(
+                        {FTS_COLUMNS}, content='trains', content_rowid='rowid', tokenize='trigram')''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trains_fts_ai AFTER INSERT ON trains BEGIN
+                        INSERT INTO trains_fts (rowid, {FTS_COLUMNS})
+                        VALUES (new.rowid, new.train_number, new.train_name, new.starting_destination, new.ending_destination);
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trains_fts_ad AFTER DELETE ON trains BEGIN
+                        INSERT INTO trains_fts (trains_fts, rowid, {FTS_COLUMNS})
+                        VALUES ('delete', old.rowid, old.train_number, old.train_name, old.starting_destination, old.ending_destination);
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trains_fts_au AFTER UPDATE ON trains BEGIN
+                        INSERT INTO trains_fts (trains_fts, rowid, {FTS_COLUMNS})
+                        VALUES ('delete', old.rowid, old.train_number, old.train_name, old.starting_destination, old.ending_destination);
+                        INSERT INTO trains_fts (rowid, {FTS_COLUMNS})
+                        VALUES (new.rowid, new.train_number, new.train_name, new.starting_destination, new.ending_destination);
+                    END''')
+    if not exists:
+        rebuild_fts(conn)
+
+
+def rebuild_fts(conn):
+    # also needed after a VACUUM, which may renumber the rowids of trains
+    conn.execute("INSERT INTO trains_fts (trains_fts) VALUES ('rebuild')")
+
+
+def register_station(conn, name: str) -> str:
+    code = station_key(name)
+    if code:
+        conn.execute("INSERT OR IGNORE INTO stations (code, name) VALUES (?, ?)", (code, name.strip()))
+    return code
+
+
+def backfill_station_codes(conn):
+    rows = conn.execute(
+        "SELECT rowid, starting_destination, ending_destination FROM trains "
+        "WHERE from_code IS NULL OR to_code IS NULL").fetchall()
+    if not rows:
+        return 0
+    updates = []
+    for rowid, start, end in rows:
+        updates.append((register_station(conn, start or ""), register_station(conn, end or ""), rowid))
+    conn.executemany("UPDATE trains SET from_code=?, to_code=? WHERE rowid=?", updates)
+    return len(updates)
+
+
+def resolve_station(conn, text: str) -> str:
+    """Map user input (code or station name, any case/spacing) to a station code."""
+    key = station_key(text)
+    if not key:
+        return ""
+    row = conn.execute("SELECT code FROM stations WHERE code=?", (key,)).fetchone()
+    if row:
+        return row[0]
+    row = conn.execute("SELECT code FROM stations WHERE name=? COLLATE NOCASE", (text.strip(),)).fetchone()
+    return row[0] if row else key
+
+
+def search_by_train_number(conn, train_no: str, substring: bool = False):
+    train_no = train_no.strip()
+    if not train_no:
+        return []
+    rows = conn.execute(
+        f"SELECT {TRAIN_COLUMNS} FROM trains WHERE train_number=? ORDER BY departure_date",
+        (train_no,)).fetchall()
+    if not rows:
+        rows = conn.execute(
+            f"SELECT {TRAIN_COLUMNS} FROM trains WHERE train_number >= ? AND train_number < ? "
+            f"ORDER BY train_number, departure_date",
+            (train_no, _prefix_upper_bound(train_no))).fetchall()
+    if not rows and substring:
+        rows = conn.execute(
+            f"SELECT {TRAIN_COLUMNS} FROM trains WHERE train_number LIKE ? ORDER BY train_number, departure_date",
+            (f"%{train_no}%",)).fetchall()
+    return rows
+
+
+def search_by_route(conn, src: str, dest: str, dep_date=None, substring: bool = False):
+    """Trains from ``src`` to ``dest`` (optionally on ``dep_date``, an ISO date string).
+
+    Tries an exact station-code match, then a code prefix match, both served
+    by idx_trains_route. ``substring=True`` adds a last-resort '%x%' scan over
+    the free-text station names.
+    """
+    src_code, dest_code = resolve_station(conn, src), resolve_station(conn, dest)
+    if not src_code or not dest_code:
+        return []
+    date_sql, date_args = ("AND departure_date=? ", (dep_date,)) if dep_date else ("", ())
+    rows = conn.execute(
+        f"SELECT {TRAIN_COLUMNS} FROM trains WHERE from_code=? AND to_code=? {date_sql}"
+        f"ORDER BY departure_date, train_number",
+        (src_code, dest_code, *date_args)).fetchall()
+    if not rows:
+        rows = conn.execute(
+            f"SELECT {TRAIN_COLUMNS} FROM trains WHERE from_code >= ? AND from_code < ? "
+            f"AND to_code >= ? AND to_code < ? {date_sql}"
+            f"ORDER BY departure_date, train_number",
+            (src_code, _prefix_upper_bound(src_code), dest_code, _prefix_upper_bound(dest_code), *date_args)).fetchall()
+    if not rows and substring:
+        rows = conn.execute(
+            f"SELECT {TRAIN_COLUMNS} FROM trains WHERE starting_destination LIKE ? AND ending_destination LIKE ? "
+            f"{date_sql}ORDER BY departure_date, train_number",
+            (f"%{src.strip()}%", f"%{dest.strip()}%", *date_args)).fetchall()
+    return rows
+
+
+# ---- fuzzy (FTS5 trigram) search ----
+def _fts_terms(text: str) -> str:
+    # trigram needs 3+ characters per term; quote each one so user input is
+    # never parsed as FTS syntax
+    words = [w for w in _WORDS.findall(str(text or "")) if len(w) >= 3]
+    return " AND ".join(f'"{w}"' for w in words)
+
+
+def fuzzy_search_trains(conn, text: str, limit: int = 100):
+    """Best matches for ``text`` in train numbers and names, ranked by bm25."""
+    terms = _fts_terms(text)
+    if not terms:
+        return []
+    return conn.execute(
+        f"SELECT {_JOINED_COLUMNS} "
+        f"FROM trains_fts JOIN trains t ON t.rowid = trains_fts.rowid "
+        f"WHERE trains_fts MATCH ? ORDER BY bm25(trains_fts), t.departure_date LIMIT ?",
+        (f"{{train_number train_name}} : ({terms})", limit)).fetchall()
+
+
+def fuzzy_search_route(conn, src: str, dest: str, dep_date=None, limit: int = 100):
+    """Trains whose origin matches ``src`` and destination matches ``dest`` anywhere in the name."""
+    src_terms, dest_terms = _fts_terms(src), _fts_terms(dest)
+    if not src_terms or not dest_terms:
+        return []
+    date_sql, date_args = ("AND t.departure_date=? ", (dep_date,)) if dep_date else ("", ())
+    return conn.execute(
+        f"SELECT {_JOINED_COLUMNS} "
+        f"FROM trains_fts JOIN trains t ON t.rowid = trains_fts.rowid "
+        f"WHERE trains_fts MATCH ? {date_sql}"
+        f"ORDER BY bm25(trains_fts), t.departure_date, t.train_number LIMIT ?",
+        (f"starting_destination : ({src_terms}) AND ending_destination : ({dest_terms})", *date_args, limit)).fetchall()
@@ -0,0 +1,101 @@
+# train_stops.py
+# Per-run stop lists and segment masks.
+#
+# A run with stops S0..Sn has n segments; segment i is Si -> Si+1. A ticket
+# from stop a to stop b occupies segments a..b-1, i.e. the bitmask
+# (1 << b) - (1 << a). Runs without a stop list are a single segment from
+# origin to destination.
+from train_search import register_station, station_key
+
+MAX_STOPS = 63          # masks must fit a signed 64-bit SQLite INTEGER
+FULL_ROUTE = -1         # every bit set: occupies all segments whatever their count
+
+
+def create_stops_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS train_stops (
+                        train_number TEXT NOT NULL,
+                        departure_date TEXT NOT NULL,
+                        stop_sequence INTEGER NOT NULL,
+                        station_code TEXT NOT NULL,
+                        station_name TEXT NOT NULL,
+                        minutes_from_start INTEGER,
+                        PRIMARY KEY (train_number, departure_date, stop_sequence)
+                    ) WITHOUT ROWID''')
+    conn.commit()
+
+
+def segment_mask(from_stop: int, to_stop: int) -> int:
+    if not 0 <= from_stop < to_stop < MAX_STOPS:
+        raise ValueError("Boarding stop must come before the alighting stop.")
+    return (1 << to_stop) - (1 << from_stop)
+
+
+def parse_stops(text: str):
+    """Parse 'Station' or 'Station, minutes' lines from the Add Train form."""
+    stops = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        name, _, minutes = line.partition(",")
+        minutes = minutes.strip()
+        stops.append((name.strip(), int(minutes) if minutes.isdigit() else None))
+    return stops
+
+
+def set_stops(conn, train_number, departure_date, origin, destination, intermediate=(), travel_minutes=None):
+    """Store origin + intermediate stops + destination for one run (no commit)."""
+    if len(intermediate) + 2 > MAX_STOPS:
+        raise ValueError(f"A train can have at most {MAX_STOPS - 2} intermediate stops.")
+    stops = [(origin, 0)] + list(intermediate) + [(destination, travel_minutes or None)]
+    conn.execute("DELETE FROM train_stops WHERE train_number=? AND departure_date=?",
+                 (train_number, departure_date))
+    conn.executemany(
+        "INSERT INTO train_stops (train_number, departure_date, stop_sequence, station_code, station_name, minutes_from_start) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(train_number, departure_date, seq, register_station(conn, name), name, minutes)
+         for seq, (name, minutes) in enumerate(stops)]
+    )
+
+
+def get_stops(conn, train_number, departure_date):
+    """[(station_code, station_name, minutes_from_start)] in running order.
+
+    Falls back to origin -> destination for runs stored before stop lists existed.
+    """
+    rows = conn.execute(
+        "SELECT station_code, station_name, minutes_from_start FROM train_stops "
+        "WHERE train_number=? AND departure_date=? ORDER BY stop_sequence",
+        (train_number, departure_date)).fetchall()
+    if rows:
+        return rows
+    row = conn.execute(
+        "SELECT from_code, starting_destination, to_code, ending_destination, travel_minutes FROM trains "
+        "WHERE train_number=? AND departure_date=?", (train_number, departure_date)).fetchone()
+    if not row:
+        return []
+    return [(row[0], row[1], 0), (row[2], row[3], row[4])]
+
+
+def interpolate_offsets(stops, total_minutes):
+    """Fill missing minutes_from_start linearly between the known ones."""
+    offsets = [m for _, _, m in stops]
+    offsets[0] = 0
+    if offsets[-1] is None:
+        offsets[-1] = total_minutes
+    known = [i for i, m in enumerate(offsets) if m is not None]
+    for a, b in zip(known, known[1:]):
+        for i in range(a + 1, b):
+            offsets[i] = offsets[a] + (offsets[b] - offsets[a]) * (i - a) // (b - a)
+    return offsets
+
+
+def stop_index(stops, station: str, default: int) -> int:
+    """Position of ``station`` (code or name, any case) in ``stops``; ``default`` if blank."""
+    key = station_key(station)
+    if not key:
+        return default
+    for i, (code, name, _) in enumerate(stops):
+        if key == code or key == station_key(name):
+            return i
+    raise ValueError(f"This train does not stop at {station}.")
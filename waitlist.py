@@ -0,0 +1,176 @@
+# waitlist.py
+# Per-run RAC / waiting-list queue with promotion on cancellation.
+#
+# Requests that find a run sold out are queued in request order (the
+# AUTOINCREMENT id). The first RAC_SLOTS waiting passengers of a run are
+# RAC, the rest WL. When a seat comes free, promote() hands it to the first
+# passenger in the queue who asked for that seat type, inside the caller's
+# transaction: RAC before WL, each in request order. The head is two seeks on
+# the partial index idx_waitlist_queue_type (that seat type, and entries with
+# none), and moving the next WL up to RAC is one on idx_waitlist_queue, so a
+# promotion is O(log n) however deep the queue is.
+import time
+
+from bookings import record_booking
+
+RAC_SLOTS = 10
+
+RAC = "RAC"
+WL = "WL"
+
+WAITING = "WAITING"
+PROMOTED = "PROMOTED"
+CANCELLED = "CANCELLED"
+
+WAITLIST_COLUMNS = ("pnr, train_number, departure_date, tier, queue_no, passenger_name, passenger_age, "
+                    "passenger_gender, status, seat_number, requested_ts, updated_ts")
+
+
+def create_waitlist_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS waitlist (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        pnr TEXT NOT NULL,
+                        username TEXT,
+                        train_number TEXT NOT NULL,
+                        departure_date TEXT NOT NULL,
+                        seat_type TEXT,
+                        passenger_name TEXT,
+                        passenger_age INTEGER,
+                        passenger_gender TEXT,
+                        tier TEXT NOT NULL,
+                        queue_no INTEGER NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'WAITING',
+                        seat_number INTEGER,
+                        requested_ts INTEGER NOT NULL,
+                        updated_ts INTEGER NOT NULL
+                    )''')
+    # only live entries are indexed, so promoted / cancelled history doesn't slow the queue down
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_waitlist_queue
+                    ON waitlist (train_number, departure_date, tier, id) WHERE status='WAITING' ''')
+    create_waitlist_type_index(conn)
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_waitlist_number
+                    ON waitlist (train_number, departure_date, queue_no)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_waitlist_pnr ON waitlist (pnr)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_waitlist_user ON waitlist (username, requested_ts)''')
+    conn.commit()
+
+
+def create_waitlist_type_index(conn):
+    # promotion seeks the head per seat type; idx_waitlist_queue still serves the untyped head
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_waitlist_queue_type
+                    ON waitlist (train_number, departure_date, tier, seat_type, id) WHERE status='WAITING' ''')
+    conn.commit()
+
+
+def join_waitlist(conn, pnr, username, train_number, departure_date, seat_type, passenger):
+    """Queue a passenger on a sold-out run (no commit). Returns (tier, queue_no).
+
+    The write lock is taken before the RAC count and the next queue number
+    are read, so concurrent joiners can't share a number or overfill RAC. A
+    caller that already has a transaction open must hold the write lock.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    rac_taken = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM waitlist WHERE train_number=? AND departure_date=? "
+        "AND tier=? AND status=? LIMIT ?)",
+        (train_number, departure_date, RAC, WAITING, RAC_SLOTS)).fetchone()[0]
+    tier = RAC if rac_taken < RAC_SLOTS else WL
+    queue_no = conn.execute(
+        "SELECT COALESCE(MAX(queue_no), 0) + 1 FROM waitlist WHERE train_number=? AND departure_date=?",
+        (train_number, departure_date)).fetchone()[0]
+    name, age, gender = passenger[:3]
+    now = int(time.time())
+    conn.execute(
+        "INSERT INTO waitlist (pnr, username, train_number, departure_date, seat_type, passenger_name, passenger_age, "
+        "passenger_gender, tier, queue_no, status, requested_ts, updated_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (pnr, username, train_number, departure_date, seat_type, name, int(age), gender, tier, queue_no,
+         WAITING, now, now))
+    return tier, queue_no
+
+
+HEAD_SQL = ("SELECT id, pnr, username, passenger_name, passenger_age, passenger_gender FROM waitlist "
+            "WHERE train_number=? AND departure_date=? AND tier=? AND status=?")
+
+
+def _head(conn, train_number, departure_date, tier, seat_type=None):
+    params = (train_number, departure_date, tier, WAITING)
+    if not seat_type:
+        return conn.execute(HEAD_SQL + " ORDER BY id LIMIT 1", params).fetchone()
+    # one seek each for that seat type and for entries without one (older rows take any seat)
+    heads = [conn.execute(HEAD_SQL + " AND seat_type=? ORDER BY id LIMIT 1", params + (seat_type,)).fetchone(),
+             conn.execute(HEAD_SQL + " AND seat_type IS NULL ORDER BY id LIMIT 1", params).fetchone()]
+    return min((head for head in heads if head), default=None)
+
+
+def _move_up_to_rac(conn, train_number, departure_date, now):
+    head = _head(conn, train_number, departure_date, WL)
+    if head:
+        conn.execute("UPDATE waitlist SET tier=?, updated_ts=? WHERE id=?", (RAC, now, head[0]))
+
+
+def promote(conn, train_number, departure_date, seat_number):
+    """Give a just-freed seat to the first passenger waiting for its seat type (no commit).
+
+    RAC passengers go first, then WL; each tier is served in request order.
+    The seat must be free end to end. Returns (pnr, passenger_name) of the
+    promoted passenger, or None if nobody is waiting for this seat type or
+    the seat is still partly occupied.
+    """
+    row = conn.execute(
+        "SELECT seat_type FROM seat_inventory WHERE train_number=? AND departure_date=? AND seat_number=? "
+        "AND occupied_mask=0", (train_number, departure_date, int(seat_number))).fetchone()
+    if not row:
+        return None
+    seat_type = row[0]
+    head = _head(conn, train_number, departure_date, RAC, seat_type)
+    tier = RAC
+    if head is None:
+        head = _head(conn, train_number, departure_date, WL, seat_type)
+        tier = WL
+    if head is None:
+        return None
+    entry_id, pnr, username, name, age, gender = head
+    # still inside the caller's write transaction, so the seat can't have changed since the SELECT
+    conn.execute(
+        "UPDATE seat_inventory SET booked=1, occupied_mask=-1, passenger_name=?, passenger_age=?, passenger_gender=? "
+        "WHERE train_number=? AND departure_date=? AND seat_number=?",
+        (name, age, gender, train_number, departure_date, int(seat_number)))
+    now = int(time.time())
+    conn.execute("UPDATE waitlist SET status=?, seat_number=?, updated_ts=? WHERE id=?",
+                 (PROMOTED, int(seat_number), now, entry_id))
+    record_booking(conn, pnr, username, train_number, departure_date, seat_number, seat_type, (name, age, gender))
+    if tier == RAC:
+        _move_up_to_rac(conn, train_number, departure_date, now)
+    return pnr, name
+
+
+def leave_waitlist(conn, pnr) -> int:
+    """Cancel every waiting entry of a PNR (no commit). Returns how many were removed."""
+    now = int(time.time())
+    left = conn.execute(
+        "UPDATE waitlist SET status=?, updated_ts=? WHERE pnr=? AND status=? RETURNING train_number, departure_date, tier",
+        (CANCELLED, now, pnr, WAITING)).fetchall()
+    for train_number, departure_date, tier in left:
+        if tier == RAC:
+            _move_up_to_rac(conn, train_number, departure_date, now)
+    return len(left)
+
+
+def waitlist_for_pnr(conn, pnr: str):
+    return conn.execute(
+        f"SELECT {WAITLIST_COLUMNS} FROM waitlist WHERE pnr=? ORDER BY id", (pnr.strip(),)).fetchall()
+
+
+def waitlist_for_user(conn, username: str, limit: int = 200):
+    return conn.execute(
+        f"SELECT {WAITLIST_COLUMNS} FROM waitlist WHERE username=? ORDER BY requested_ts DESC, id DESC LIMIT ?",
+        (username, limit)).fetchall()
+
+
+def cancel_run_waitlist(conn, train_number, departure_date) -> int:
+    """Cancel the whole queue of a train run that is being removed (no commit)."""
+    cur = conn.execute(
+        "UPDATE waitlist SET status=?, updated_ts=? WHERE train_number=? AND departure_date=? AND status=?",
+        (CANCELLED, int(time.time()), train_number, departure_date, WAITING))
+    return cur.rowcount